@@ -3,7 +3,6 @@
 
 # Librairies importee
 import numpy as np
-import pandas
 from scipy.stats import linregress
 from scipy.spatial.transform import Rotation as R
 from scipy.optimize import curve_fit
@@ -11,15 +10,15 @@ from scipy.optimize import least_squares
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import glob
-import os
 import datetime as dt
 import gdal
 import rasterio
 from rasterio.plot import show
 import shapely.geometry
-from shapely.geometry import Point, Polygon
 # Autres codes python
 from colormap import custom_cm
+from ea400_survey import Survey
+from ea400_zones import add_zone
 
 
 # --------------------------------------------------------------------------------#
@@ -36,19 +35,9 @@ from colormap import custom_cm
 
 def load_data(files):
     ''' Cette fonction permet de charger les donnees h5 de l'ensemble des fichiers dans une unqique base de donnees d
+        Les tables de chaque ligne ne sont lues qu'au premier acces (cf. ea400_survey.Survey).
     '''
-    d = {}  # ce dictionnaire contiendra l'ensemble de la base de donnée contenue dans les differents fichiers .h5
-    for f in files:
-        line = os.path.basename(f)[:5]
-
-        if line not in d:
-            d[line] = {}
-        # - Sauvegarde des 3 DataFrame dans le dictionnaire d - #
-        d[line]['data'] = pandas.read_hdf(f, key='data')
-        d[line]['trajectoire'] = pandas.read_hdf(f, key='trajectoire')
-        d[line]['param'] = pandas.read_hdf(f, key='param')
-
-    return d
+    return Survey(files)
 
 
 # ------------- CALCUL DU BS -------------
@@ -114,28 +103,8 @@ def addZone(d,line):
     # Chargement des données
     data = d[line]['data']
 
-    # Création dun tableaux pour les positions des zones
-    data['Zone'] = np.zeros((data.shape[0]))
-
-    zone1 = Polygon([[147909, 6831018], [147970, 6831058], [148045, 6830968], [147981, 6830911]])
-    zone2 = Polygon([[148097, 6830111], [148039, 6830173], [148119, 6830245], [148173, 6830177]])
-    zone3 = Polygon([[147665, 6829667], [147586, 6829740], [147663, 6829810], [147727, 6829746]])
-    zone4 = Polygon([[147197, 6829228], [147130, 6829306], [147200, 6829366], [147258, 6829301]])
-    zone5 = Polygon([[146527, 6830611], [146510, 6830712], [146694, 6830745], [146723, 6830635]])
-
-    for index, row in data.iterrows():
-        ping = Point(row['X_Beam'], row['Y_Beam'])
-        if zone1.contains(ping):
-            row['Zone'] = 1
-        elif zone2.contains(ping):
-            row['Zone'] = 2
-        elif zone3.contains(ping):
-            row['Zone'] = 3
-        elif zone4.contains(ping):
-            row['Zone'] = 4
-        elif zone5.contains(ping):
-            row['Zone'] = 5
-        data.at[index] = row
+    # Valeur de l'attribut Zone en fonction de la position des sondes (int8, 0 hors des zones)
+    data = add_zone(data, 'reduites_zone1bis', 'beam')
 
     d[line]['data'] = data
 
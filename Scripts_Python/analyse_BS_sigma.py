@@ -10,13 +10,13 @@ from scipy.spatial.transform import Rotation as R
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import glob
-import os
 import datetime as dt
 #import rasterio
 #from rasterio.plot import show
-from shapely.geometry import  Point, Polygon
 # Autres codes python
 from colormap import custom_cm
+from ea400_survey import Survey
+from ea400_zones import add_zone, get_zones
 import statistics
 import math
 import matplotlib
@@ -37,20 +37,9 @@ import matplotlib
 
 def load_data(files):
     ''' Cette fonction permet de charger les donnees h5 de l'ensemble des fichiers dans une unqique base de donnees d
+        Les tables de chaque ligne ne sont lues qu'au premier acces (cf. ea400_survey.Survey).
     '''
-    d = {} # ce dictionnaire contiendra l'ensemble de la base de donnée contenue dans les differents fichiers .h5
-    
-    for f in files:
-        line = os.path.basename(f)[:5]
-        
-        if line not in d:
-            d[line] = {}
-        # - Sauvegarde des 3 DataFrame dans le dictionnaire d - #
-        d[line]['data'] = pandas.read_hdf(f,key = 'data')
-        d[line]['trajectoire'] = pandas.read_hdf(f,key = 'trajectoire')
-        d[line]['param'] = pandas.read_hdf(f,key = 'param') 
-   
-    return d
+    return Survey(files)
 
 #------------- FONCTIONS INTERMEDIAIRES -------------
 def find_nearest(array, value):
@@ -630,16 +619,8 @@ def classif_glissante_BS(d,nbping,sampling,d_BS_ref,print_fig):
                 stop = stop + sampling
         
         
-        # zone1 = Polygon([[148111, 6831022], [148059, 6831120], [148137, 6831177], [148200, 6831088]])
-        zone2 = Polygon([[148097, 6830111], [148039, 6830173], [148119, 6830245], [148173, 6830177]])
-        zone3 = Polygon([[147665, 6829667], [147586, 6829740], [147663, 6829810], [147727, 6829746]])
-        zone4 = Polygon([[147197, 6829228], [147130, 6829306], [147200, 6829366], [147258, 6829301]])
-        zone5 = Polygon([[146527, 6830611], [146510, 6830712], [146694, 6830745], [146723, 6830635]])
-        if compute_on_zone1bis :
-            zone1 = Polygon([[147909, 6831018], [147970, 6831058], [148045, 6830968], [147981, 6830911]])
-        else :
-            zone1 = Polygon([[148111, 6831022], [148059, 6831120], [148137, 6831177], [148200, 6831088]])
-        # zone1bis = Polygon([[147909, 6831018], [147970, 6831058], [148045, 6830968], [147981, 6830911]])
+        zones = get_zones('reduites_zone1bis' if compute_on_zone1bis else 'reduites')
+        zone1, zone2, zone3, zone4, zone5 = (zones[i] for i in range(1, 6))
         
         
         
@@ -782,19 +763,8 @@ def par_zone_classif_glissante_BS(zone_,d,nbping,sampling,d_BS_ref):
     list_color_zone = ['tab:blue','tab:orange','tab:green','tab:red','tab:purple']
     
     
-       #zone1bis: 
-    # zone1 = Polygon([[147909, 6831018], [147970, 6831058], [148045, 6830968], [147981, 6830911]])
-        # zone 1:
-    # zone1 = Polygon([[148111, 6831022], [148059, 6831120], [148137, 6831177], [148200, 6831088]])
-    zone2 = Polygon([[148097, 6830111], [148039, 6830173], [148119, 6830245], [148173, 6830177]])
-    zone3 = Polygon([[147665, 6829667], [147586, 6829740], [147663, 6829810], [147727, 6829746]])
-    zone4 = Polygon([[147197, 6829228], [147130, 6829306], [147200, 6829366], [147258, 6829301]])
-    zone5 = Polygon([[146527, 6830611], [146510, 6830712], [146694, 6830745], [146723, 6830635]])
-    if compute_on_zone1bis :
-        zone1 = Polygon([[147909, 6831018], [147970, 6831058], [148045, 6830968], [147981, 6830911]])
-    else :
-        zone1 = Polygon([[148111, 6831022], [148059, 6831120], [148137, 6831177], [148200, 6831088]])
-        # zone1bis = Polygon([[147909, 6831018], [147970, 6831058], [148045, 6830968], [147981, 6830911]])
+    zones = get_zones('reduites_zone1bis' if compute_on_zone1bis else 'reduites')
+    zone1, zone2, zone3, zone4, zone5 = (zones[i] for i in range(1, 6))
         
         
     zone = zone_
@@ -928,40 +898,8 @@ def addZone(d,line):
     """ Cette fonction permet d'identifier la zone des pings"""
     
     data = d[line]['data']
-    data['Zone'] = np.zeros((data.shape[0]))
-    #old zones
-    # zone1 = Polygon([[147932, 6830864], [147826, 6830989], [148120, 6831205], [148214, 6831077]])
-    # zone2 = Polygon([[148026, 6830005], [147945, 6830093], [148170, 6830312], [148255, 6830225]])
-    # zone3 = Polygon([[147591, 6829582], [147512, 6829661], [147741, 6829883], [147819, 6829805]])
-    # zone4 = Polygon([[147099, 6829122], [147027, 6829206], [147227, 6829382], [147299, 6829303]])
-    # zone5 = Polygon([[146456, 6830591], [146434, 6830713], [146726, 6830760], [146754, 6830635]])
-
-    # new zones
-    # zone1 = Polygon([[148111, 6831022], [148059, 6831120], [148137, 6831177], [148200, 6831088]])
-    zone2 = Polygon([[148097, 6830111], [148039, 6830173], [148119, 6830245], [148173, 6830177]])
-    zone3 = Polygon([[147665, 6829667], [147586, 6829740], [147663, 6829810], [147727, 6829746]])
-    zone4 = Polygon([[147197, 6829228], [147130, 6829306], [147200, 6829366], [147258, 6829301]])
-    zone5 = Polygon([[146527, 6830611], [146510, 6830712], [146694, 6830745], [146723, 6830635]])
-    
-    if compute_on_zone1bis :
-        zone1 = Polygon([[147909, 6831018], [147970, 6831058], [148045, 6830968], [147981, 6830911]])
-    else :
-        zone1 = Polygon([[148111, 6831022], [148059, 6831120], [148137, 6831177], [148200, 6831088]])
-    for index, row in data.iterrows():
-        ping = Point(row['X_Beam'], row['Y_Beam'])
-        if zone1.contains(ping):
-            row['Zone'] = 1
-        # elif zone1bis.contains(ping):
-        #     row['Zone'] = 6
-        elif zone2.contains(ping):
-            row['Zone'] = 2
-        elif zone3.contains(ping):
-            row['Zone'] = 3
-        elif zone4.contains(ping):
-            row['Zone'] = 4
-        elif zone5.contains(ping):
-            row['Zone'] = 5
-        data.at[index] = row
+    # Valeur de l'attribut Zone en fonction de la position des sondes (int8, 0 hors des zones)
+    data = add_zone(data, 'reduites_zone1bis' if compute_on_zone1bis else 'reduites', 'beam')
 
     d[line]['data'] = data
     return d
@@ -1065,9 +1003,12 @@ if __name__=='__main__':
         if freq == '38 kHz' :
             d_ = compute_BS(d,line) # ajout de la valeur de BS calcule dans le dictionnaire
             d = d_
-            filepath = dir_path + line + '_ref.txt' # Répertoire des fichiers Kongsberg, 
-                                                    # il y en a un par ligne, au format .txt
-            L_Kongsberg = pandas.read_csv(filepath,sep=' ') 
+            if 'ref' in d[line]: # references Kongsberg enregistrees dans le fichier h5
+                L_Kongsberg = d[line]['ref']
+            else:
+                filepath = dir_path + line + '_ref.txt' # Répertoire des fichiers Kongsberg, 
+                                                        # il y en a un par ligne, au format .txt
+                L_Kongsberg = pandas.read_csv(filepath,sep=' ') 
             Kongsberg = L_Kongsberg[['DateTime','BS_38']] 
             depth_kongsberg = L_Kongsberg['Depth_38']
             # plotCompareBS(d,line,Kongsberg,'BS Comparison '+ line) # Pour comparer le BS calculé
@@ -1076,8 +1017,11 @@ if __name__=='__main__':
         elif freq == '200 kHz':
             d3 = compute_BS(d,line) 
             d = d3
-            filepath = dir_path + line + '_ref.txt'
-            L_Kongsberg = pandas.read_csv(filepath,sep=' ') 
+            if 'ref' in d[line]:
+                L_Kongsberg = d[line]['ref']
+            else:
+                filepath = dir_path + line + '_ref.txt'
+                L_Kongsberg = pandas.read_csv(filepath,sep=' ') 
             Kongsberg = L_Kongsberg[['DateTime','BS_200']]
             depth_kongsberg = L_Kongsberg['Depth_200']
             # plotCompareBS(d,line,Kongsberg,'BS Comparison '+ line)
@@ -11,12 +11,12 @@ from matplotlib.colors import ListedColormap
 import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-from shapely.geometry import Polygon
 import glob
-import os
 import rasterio
 # Autres codes python
 from colormap import custom_cm
+from ea400_survey import Survey
+from ea400_zones import get_zones
 
 
 #--------------------------------------------------------------------------------#
@@ -35,7 +35,8 @@ from colormap import custom_cm
 
 def load_data(files):
     """
-    Cette fonction permet de charger les donnees h5 de l'ensemble des fichiers dans une unqique base de donnees : d .
+    Cette fonction permet d'acceder aux donnees h5 de l'ensemble des fichiers dans une unique base de donnees : d .
+    Les tables de chaque ligne ne sont lues qu'au premier acces (cf. ea400_survey.Survey).
 
     Parametres
     ----------
@@ -44,23 +45,11 @@ def load_data(files):
 
     Sortie
     -------
-    d : dictionary
-        base de donnees complete - toutes les lignes de leve d[line] - toutes les donnees d[line]['param'] ; d[line]['data'] ; d[line]['trajectoire']
+    d : Survey
+        base de donnees complete, utilisable comme un dictionnaire - toutes les lignes de leve d[line] - toutes les donnees d[line]['param'] ; d[line]['data'] ; d[line]['trajectoire']
 
     """
-    d = {} # ce dictionnaire contiendra l'ensemble de la base de donnee contenue dans les differents fichiers .h5
-    
-    for f in files:
-        line = os.path.basename(f)[:5]
-        
-        if line not in d:
-            d[line] = {}
-        # - Sauvegarde des 3 DataFrame dans le dictionnaire d - #
-        d[line]['data'] = pandas.read_hdf(f,key = 'data')
-        d[line]['trajectoire'] = pandas.read_hdf(f,key = 'trajectoire')
-        d[line]['param'] = pandas.read_hdf(f,key = 'param') 
-   
-    return d
+    return Survey(files)
 
 
 
@@ -119,13 +108,15 @@ def plotEchogram(d,line,prof_display,title_str):
     """
     # Recuperation des donnees utiles
     Time = d[line]['data'].loc[:,'DateTime']
-    Power = d[line]['data'].loc[:,'Power']
+    matrix, n_samples = d[line].signal('Power') # matrice (ping x echantillon) lue directement
     # Selection des donnees jusqu'a la profondeur specifiee
     ind_display = round( 2*prof_display / (float(d[line]['param'].loc[:,'SampleInterval']) * float(d[line]['param'].loc[:,'SoundVelocity'])))
-    Power = np.array([np.array(li[:ind_display]) for li in Power]).T
+    Power = np.full((len(matrix), ind_display), np.nan, dtype=matrix.dtype)
+    Power[:, :min(ind_display, matrix.shape[1])] = matrix[:, :ind_display]
+    Power = Power.T
     Depth = d[line]['data'].loc[:,'Depth']
     # Variables
-    mi,ma = np.min(Power) ,  np.max(Power) # puissance min et max pour la colormap
+    mi,ma = np.nanmin(Power) ,  np.nanmax(Power) # puissance min et max pour la colormap
     t_mi , t_ma = min(Time) , max(Time) # temps min et max pour la legende x
     x_lims = mdates.date2num([t_mi,t_ma]) # conversion en dates matplotlib
     
@@ -211,10 +202,10 @@ def plotLineZone(d,lines,title_str):
     cm = ListedColormap([dic_color[x] for x in dic_color.keys()])
 
     plt.figure(figsize=(8,5))
+    dx , dy = 140000 , 6820000 # Offset sur les coordonnes pour la legende
     # Donnees a afficher
     for line in lines :
         x , y , v = d[line]['data'].loc[:,'X'] , d[line]['data'].loc[:,'Y'] ,d[line]['data'].loc[:,'Zone'].astype(int)
-        dx , dy = 140000 , 6820000 # Offset sur les coordonnes pour la legende
         x -= dx
         y -= dy
         plt.scatter(x,y,c=v,cmap=cm,marker='.')
@@ -226,33 +217,17 @@ def plotLineZone(d,lines,title_str):
     plt.xlabel('X [m] - 140000 Lambert 93')
     plt.ylabel('Y [m] - 682000 Lambert 93')
     plt.axis('equal')
-    # definition des zones initiales
-    zone1 = Polygon([[7932, 10864], [7826, 10989], [8120, 11205], [8214, 11077]])
-    zone2 = Polygon([[8026, 10005], [7945, 10093], [8170, 10312], [8255, 10225]])
-    zone3 = Polygon([[7591, 9582], [7512, 9661], [7741, 9883], [7819, 9805]])
-    zone4 = Polygon([[7099, 9122], [7027, 9206], [7227, 9382], [7299, 9303]])
-    zone5 = Polygon([[6456, 10591], [6434, 10713], [6726, 10760], [6754, 10635 ]])
-    zonesold = [zone1,zone2,zone3,zone4,zone5]
+    # zones initiales
     i=0
-    for zone in zonesold:
+    for zone in get_zones('initiales').values():
         x,y = zone.exterior.xy
-        plt.plot(x,y,linestyle='-',c=colors[i])
+        plt.plot(np.array(x)-dx,np.array(y)-dy,linestyle='-',c=colors[i])
         i+=1
         
-    # definition des zones reduites
-    # zone1 = Polygon([[8111, 11022], [8059, 11120], [8137, 11177], [8200, 11088]])
-    zone1 = Polygon([[7909, 11018], [7970, 11058], [8045, 10968], [7981, 10911]])
-    zone2 = Polygon([[8097, 10111], [8039, 10173], [8119, 10245], [8173, 10177]])
-    zone3 = Polygon([[7665, 9667], [7586, 9740], [7663, 9810], [7727, 9746]])
-    zone4 = Polygon([[7197, 9228], [7130, 9306], [7200, 9366], [7258, 9301]])
-    zone5 = Polygon([[6527, 10611], [6510, 10712], [6694, 10745], [6723, 10635]])
-    
-    zonesnew = [zone1,zone2,zone3,zone4,zone5]
-    i=0
-    for zone in zonesnew:
+    # zones reduites
+    for zone in get_zones('reduites_zone1bis').values():
         x,y = zone.exterior.xy
-        plt.plot(x,y,linestyle='-')
-        i+=1
+        plt.plot(np.array(x)-dx,np.array(y)-dy,linestyle='-')
         
     prelev = pandas.read_csv('Coordonnees_prelevements.csv')
     plt.scatter(prelev['X'].values-140000,prelev['Y'].values-6820000,marker='+',c='k',label='prélèvements')
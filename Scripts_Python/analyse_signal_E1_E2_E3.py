@@ -6,29 +6,17 @@ Auteur : Aelaig COURNEZ - Flora GUES - Yann LAMBRECHTS - Romain SAFRAN
 import matplotlib.pyplot as plt
 import numpy as np
 import scipy.signal as scs
-import os
 import glob
-import pandas
 from sklearn.cluster import KMeans
 from mpl_toolkits.mplot3d import Axes3D
+from ea400_survey import Survey
 
 #chargement des données
 def load_data(files):
     ''' Cette fonction permet de charger les donnees h5 de l'ensemble des fichiers dans une unqique base de donnees d
+        Les tables de chaque ligne ne sont lues qu'au premier acces (cf. ea400_survey.Survey).
     '''
-    d = {} # ce dictionnaire contiendra l'ensemble de la base de donnée contenue dans les differents fichiers .h5
-    
-    for f in files:
-        line = os.path.basename(f)[:5]
-        
-        if line not in d:
-            d[line] = {}
-        # - Sauvegarde des 3 DataFrame dans le dictionnaire d - #
-        d[line]['data'] = pandas.read_hdf(f,key = 'data')
-        d[line]['trajectoire'] = pandas.read_hdf(f,key = 'trajectoire')
-        d[line]['param'] = pandas.read_hdf(f,key = 'param') 
-   
-    return d
+    return Survey(files)
   
 ###########################################
 #Pour info : La structure 
@@ -289,7 +277,8 @@ if __name__ == '__main__':
   #Début boucle possible ici si on veut traiter toute les lignes :
     
   Time = d[line]['data'].loc[:,'DateTime']
-  Power = d[line]['data'].loc[:,'Power']
+  #puissance en W, lue directement sous forme de matrice (ping x echantillon)
+  i, n_samples = d[line].signal('Power', linear=True)
   c = d[line]['param']['SoundVelocity'].values
   PulseLenght = d[line]['param']['PulseLength'].values
   depth = d[line]['data']['Depth'].values
@@ -297,19 +286,16 @@ if __name__ == '__main__':
   Y = d[line]['data']['Y'].values
   #gérer l'exception de la ligne 24
   if line == 'L0024' :
-    Power = Power[1:]
+    i = i[1:]
     Time = Time[1:]
     depth = depth[1:]
     X = X[1:]
     Y = Y[1:]
   
-  Power = np.array([np.array(li[:]) for li in Power[:]]).T
-  nbSmp = Power.shape[0]
-  nbPing = Power.shape[1]
+  i = i.T
+  nbSmp = i.shape[0]
+  nbPing = i.shape[1]
   time = np.arange(0,int(nbSmp),1)*d[line]['param']['SampleInterval'].values
-  
-  #conversion de dB en W
-  i = 10**(Power/10)
    
   #calcule de la profondeur de référence qui sera utilisée. 
   ####################################################################################
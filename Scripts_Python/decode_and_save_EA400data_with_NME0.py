@@ -5,12 +5,18 @@
 # Librairies importee
 import numpy as np
 import pandas
-import struct
 import glob
 import os
 import time
-import datetime as dt
-from pyproj import Proj, transform
+# Autres codes python
+from ea400_datagrams import (decode_RAW0_datagrams, load_index, select_datagrams, count_datagrams, read_headers, filetime_to_datetime64, read_datagrams, iter_datagrams,
+                             CON0_HEADER, CON0_TRANSDUCER, CON0_TRANSDUCER_OFFSETS, RAW0_HEADER_DTYPE, DEP0_DTYPE, POWER_SCALE)
+from ea400_store import PingAccumulator, put_pings, append_pings, truncate_pings
+from ea400_bottom import detect_bottom
+from ea400_batch import run_tasks
+from ea400_nmea import parse_NMEA
+from ea400_proj import to_projected
+from ea400_dg import read_DGfile
 
 #--------------------------------------------------------------------------------#
 #               LECTURE ET SAUVEGARDE DES DONNEES EA400                          #
@@ -24,6 +30,35 @@ from pyproj import Proj, transform
 #   soit enregistrees.                                                           #
 #--------------------------------------------------------------------------------#
 
+# Ecart de temps maximal entre un ping et la trame DEP0 Kongsberg associee (en s)
+REF_TOLERANCE = 0.1
+
+# Reprise de la lecture apres une trame corrompue ou tronquee (les octets ignores sont signales)
+# False pour arreter la lecture sur la premiere trame invalide
+RECOVER_CORRUPT = True
+
+# Suivi d'un fichier en cours d'enregistrement : intervalle entre deux lectures (en s)
+# et duree sans nouvelle donnee au bout de laquelle le suivi s'arrete (en s)
+FOLLOW_INTERVAL = 2
+FOLLOW_TIMEOUT = 60
+
+# Attributs scalaires enregistres pour chaque ping (DateTime au format FILETIME)
+PING_FIELDS = [('DateTime','<u8'),('PowerMax','<f4'),('Depth','<f8'),('TransmitPower','<f4'),('Mode','<i2'),
+               ('TransducerDepth','<f4'),('Heave','<f4'),('Tx_Roll','<f4'),('Tx_Pitch','<f4'),('Spare1','<i2'),
+               ('Spare2','<i2'),('Rx_Roll','<f4'),('Rx_Pitch','<f4'),('Offset','<i4'),
+               ('SampleInterval','<f4'),('SoundVelocity','<f4'),('DetectFirst','<i4'),('DetectLast','<i4')]
+
+# Detection du fond, cf. ea400_bottom.detect_bottom : detecteur ('argmax', 'threshold', 'gradient'),
+# affinage sub-echantillon (refine) et suivi du fond (track, demi-largeur de la fenetre en echantillons)
+BOTTOM_DETECTION = {'method': 'argmax', 'refine': False, 'track': None}
+
+# Nombre de trames RAW0 decodees en bloc (entetes et echantillons en une seule lecture)
+RAW0_BLOCK = 1024
+
+# Enregistrement des puissances dans les fichiers h5 sous forme de comptes int16 bruts (conversion en dB a la lecture)
+# False pour les enregistrer en float32 (dB)
+STORE_COUNTS = True
+
 #-------- FONCTIONS PERMETTANT DE DECODER LES DIFFERENTES TRAMES --------
 
 def decode_CON0(data):
@@ -44,148 +79,100 @@ def decode_CON0(data):
     trame = data[:4]
     if trame == b'CON0':
         decode_data={}
-        decode_data["DateTime"] = struct.unpack('<Q', data[4:4+8])[0]
-        decode_data["SurveyName"] = struct.unpack('<128s', data[12:12+128])[0].decode('ascii').strip('\x00')
-        decode_data["TransectName"] = struct.unpack('<128s', data[140:140+128])[0].decode('ascii').strip('\x00')
-        decode_data["SounderName"] = struct.unpack('<128s', data[168:168+128])[0].decode('ascii').strip('\x00')
-        decode_data["Spare"] = struct.unpack('128s', data[296:296+128])[0].decode('ascii').strip('\x00')
-        # ecart de 100 bits...(?)
-        decode_data["TransducerCount"] = struct.unpack('<I', data[524:524+4])[0]
-        # transducer 1 = 38kHz
-        decode_data["ChannelId_38"] = struct.unpack('128s', data[528:528+128])[0].decode('ascii').strip('\x00')
-        decode_data["BeamType_38"] = struct.unpack('<l', data[656:656+4])[0]
-        decode_data["Frequency_38"] = struct.unpack('<f', data[660:660+4])[0]
-        decode_data["Gain_38"] = struct.unpack('<f', data[664:664+4])[0]
-        decode_data["EquivalentBeamAngle_38"] = struct.unpack('<f', data[668:668+4])[0]
-        # transducer 2 = 200kHz
-        decode_data["ChannelId_200"] = struct.unpack('128s', data[848:848+128])[0].decode('ascii').strip('\x00')
-        decode_data["BeamType_200"] = struct.unpack('<l', data[976:976+4])[0]
-        decode_data["Frequency_200"] = struct.unpack('<f', data[980:980+4])[0]
-        decode_data["Gain_200"] = struct.unpack('<f', data[984:984+4])[0]
-        decode_data["EquivalentBeamAngle_200"] = struct.unpack('<f', data[988:988+4])[0]
-    return decode_data
-
-
-def decode_RAW0(data):
-    """
-    Cette fonction permet de decoder les trames RAW0.
-
-    Parametres
-    ----------
-    data : string
-        trame RAW0 - portion de fichier binaire
-
-    Sortie
-    -------
-    decode_data : dictionary
-        dictionnaire comprenant l'ensemble des donnees associees a un ping/une mesure
-
-    """
-    trame = data[:4]
-    if trame == b'RAW0':
-        decode_data={}
-        decode_data["DateTime"] = struct.unpack('<Q', data[4:4+8])[0]
-        decode_data["Channel"] = struct.unpack('<h', data[12:12+2])[0]
-        decode_data["Mode"] = struct.unpack('<h', data[14:14+2])[0]
-        decode_data["TransducerDepth"] = struct.unpack('<f', data[16:16+4])[0]
-        decode_data["Frequency"] = struct.unpack('<f', data[20:20+4])[0]
-        decode_data["TransmitPower"] = struct.unpack('<f', data[24:24+4])[0]
-        decode_data["PulseLength"] = struct.unpack('<f', data[28:28+4])[0]
-        decode_data["BandWidth"] = struct.unpack('<f', data[32:32+4])[0]
-        decode_data["SampleInterval"] = struct.unpack('<f', data[36:36+4])[0]
-        decode_data["SoundVelocity"] = struct.unpack('<f', data[40:40+4])[0]
-        decode_data["AbsorptionCoefficient"] = struct.unpack('<f', data[44:44+4])[0]
-        decode_data["Heave"] = struct.unpack('<f', data[48:48+4])[0]
-        decode_data["Tx_Roll"] = struct.unpack('<f', data[52:52+4])[0]
-        decode_data["Tx_Pitch"] = struct.unpack('<f', data[56:56+4])[0]
-        decode_data["Temperature"] = struct.unpack('<f', data[60:60+4])[0]
-        decode_data["Spare1"] = struct.unpack('<h', data[64:64+2])[0]
-        decode_data["Spare2"] = struct.unpack('<h', data[66:66+2])[0]
-        decode_data["Rx_Roll"] = struct.unpack('<f', data[68:68+4])[0]
-        decode_data["Rx_Pitch"] = struct.unpack('<f', data[72:72+4])[0]
-        decode_data["Offset"] = struct.unpack('<l', data[76:76+4])[0]
-        decode_data["Count"] = struct.unpack('<l', data[80:80+4])[0]
-        decode_data["Power"] = []
-        for i in range(decode_data["Count"]):
-            decode_data["Power"].append(struct.unpack('<h', data[84+i*2:84+i*2+2])[0]*10*np.log10(2)/256)
+        # un seul appel pour l'entete, puis un appel par transducteur
+        (_, decode_data["DateTime"], survey, transect, sounder, version, spare,
+         decode_data["TransducerCount"]) = CON0_HEADER.unpack_from(data)
+        decode_data["SurveyName"] = survey.decode('ascii').strip('\x00')
+        decode_data["TransectName"] = transect.decode('ascii').strip('\x00')
+        decode_data["SounderName"] = sounder.decode('ascii').strip('\x00')
+        decode_data["Spare"] = spare.decode('ascii').strip('\x00')
+        # transducer 1 = 38kHz ; transducer 2 = 200kHz
+        for freq, offset in CON0_TRANSDUCER_OFFSETS.items():
+            (channel_id, decode_data["BeamType_"+freq], decode_data["Frequency_"+freq], decode_data["Gain_"+freq],
+             decode_data["EquivalentBeamAngle_"+freq]) = CON0_TRANSDUCER.unpack_from(data, offset)
+            decode_data["ChannelId_"+freq] = channel_id.decode('ascii').strip('\x00')
     return decode_data
 
 
-
-def decode_NME0(data):
-    """
-    Cette fonction permet de decoder les trames NME0
-    /!\ return None si line_[0]!='$GPGGA'
-
-    Parametres
-    ----------
-    data : string
-        trame NME0 - portion de fichier binaire
-
-    Sorties
-    -------
-    data_traj : list of float
-        donnees de postionnement [date en secondes, latitude, longitude, altitude]
-
-    """
-    trame = data[:4]
-    if trame == b'NME0':
-        trames = data[12:].decode('ascii').split('\n')
-       
-        for line_ in trames:
-
-            line_=line_.split(',')
-            if line_[0]=='$GPGGA':
-                
-                sec_txt = line_[1].split(".")[0]
-                secondes = int(sec_txt[-2:]) + int(sec_txt[-4:-2])*60 + int(sec_txt[:-4])*3600
-                
-                lat=float(line_[2])
-                lat=lat//100+(lat-lat//100*100)/60
-                
-                if line_[3]=='S':
-                    lat=-lat
-                    
-                lon=float(line_[4])
-                lon = lon // 100 + (lon - lon // 100*100) / 60
-                
-                if line_[5]=='W':
-                    lon=-lon
-                    
-                data_traj = [secondes, lat, lon, float(line_[9])+float(line_[11])]             
-                return data_traj
-
-
-
-def decode_DEP0(data):
+def add_RAW0_pings(pings,datagrams,line,channels,d_param,decoded_CON0,range_detection,depth_max_toSave):
     """
-    Cette fonction permet de decoder les trames DEP0.
+    Cette fonction permet d'ajouter un bloc de trames RAW0 aux donnees des pings de chaque canal.
+    Les entetes et les echantillons du bloc sont decodes en une fois (cf. ea400_datagrams.decode_RAW0_datagrams),
+    puis les indices de sauvegarde et de l'intervalle de detection du fond sont calcules pour tous les pings du bloc.
 
     Parametres
     ----------
-    data : string
-        trame DEP0 - portion de fichier binaire
-
-    Sortie
-    -------
-    decode_data : dictionary
-        dictionnaire comprenant les donnes utiles : detection du fond et BS calcule par Kongsberg
+    pings : dictionary
+        accumulateur des donnees des pings de chaque canal (PingAccumulator), complete
+    datagrams : list of bytes
+        trames RAW0 du bloc, dans l'ordre du fichier
+    line : string
+        identifiant de la ligne de leve, par ex : 'L0006'
+    channels : list of int
+        liste des canaux que l'on souhaite lire, par ex : [1,2] avec {1:38kHz ; 2:200kHz}
+    d_param : dictionary
+        parametres d'acquisition de chaque canal, completes au premier ping de la ligne : d_param[channel][line]
+    decoded_CON0 : dictionary
+        parametres d'acquisition de la trame CON0, cf. decode_CON0
+    range_detection : list of int
+        intervalle de profondeur utilise pour la detection du fond, par ex : [5,100]
+    depth_max_toSave : int
+        profondeur seuil pour la sauvegarde des donnees
 
     """
-    trame = data[:4]
-    if trame == b'DEP0':
-        decode_data={}
-        decode_data["DateTime"] = struct.unpack('<Q', data[4:4+8])[0]
-        decode_data["NbChannel"] = struct.unpack('<I', data[12:12+4])[0]
-        # transducer 1 = 38kHz
-        decode_data["Depth_38"] = struct.unpack('<f', data[16:16+4])[0]
-        decode_data["BS_38"] = struct.unpack('<f', data[20:20+4])[0]
-        decode_data["Param2_38"] = struct.unpack('<f', data[24:24+4])[0]
-        # transducer 2 = 200kHz
-        decode_data["Depth_200"] = struct.unpack('<f', data[28:28+4])[0]
-        decode_data["BS_200"] = struct.unpack('<f', data[32:32+4])[0]
-        decode_data["Param2_200"] = struct.unpack('<f', data[36:36+4])[0]
-    return decode_data
+    headers, counts, n_count = decode_RAW0_datagrams(datagrams)
+
+    # Conversion des profondeurs en indices
+    step = headers['SampleInterval'].astype(np.float64) * headers['SoundVelocity'].astype(np.float64)
+    i_max_save = np.rint(2*depth_max_toSave / step).astype(np.int64) # i_borne_prof
+    i_min_detect = np.rint(2*range_detection[0] / step).astype(np.int64)
+    i_max_detect = np.rint(2*range_detection[1] / step).astype(np.int64)
+
+    for channel in channels:
+        keep = (headers['Channel'] == channel) & (n_count > 0) # pings du canal ayant des echantillons
+        if not np.any(keep):
+            continue
+        h = headers[keep]
+
+        # Puissance sauvegardee, jusqu'a la plus grande des profondeurs depth_max_toSave et range_detection[1] :
+        # l'intervalle de detection du fond (PowerDetectInterval) est une vue sur ce signal.
+        # La detection du fond est faite sur tous les pings a la fin de la lecture
+        n_save = np.minimum(n_count[keep], np.maximum(i_max_save[keep], i_max_detect[keep]) + 1)
+        power = counts[keep, :n_save.max()].astype(np.float32) * POWER_SCALE
+        power[np.arange(power.shape[1]) >= n_save[:, None]] = np.nan
+
+        if line not in d_param[channel]: # lorsqu'on traite un nouveau fichier, on enregistre les metadonnees du premier ping
+            first = {name: h[name][0].item() for name in RAW0_HEADER_DTYPE.names}
+            # Initialisation du DataFrame pour d_param, definition des variables
+            d_param[channel][line] = pandas.DataFrame( columns= ['SurveyName','TransectName','SounderName','TransducerCount',
+                                                        'Frequency_38','Gain_38','EquivalentBeamAngle_38',
+                                                        'Frequency_200','Gain_200','EquivalentBeamAngle_200',
+                                                        'Channel','Frequency',
+                                                        'SampleInterval','SoundVelocity','PulseLength',
+                                                        'BandWidth','AbsorptionCoefficient','Count',
+                                                        'Mode','DepthMaxSave','DepthMinDetect','DepthMaxDetect'])
+            
+            # Enregistrement des metadonnees dans d_param
+            d_param[channel][line].loc['param'] = [decoded_CON0['SurveyName'],decoded_CON0['TransectName'],decoded_CON0['SounderName'],decoded_CON0['TransducerCount'],
+                      decoded_CON0['Frequency_38'],decoded_CON0['Gain_38'],decoded_CON0['EquivalentBeamAngle_38'],
+                      decoded_CON0['Frequency_200'],decoded_CON0['Gain_200'],decoded_CON0['EquivalentBeamAngle_200'],  
+                      channel,first["Frequency"],
+                      first['SampleInterval'],first['SoundVelocity'],first['PulseLength'],
+                      first['BandWidth'],first['AbsorptionCoefficient'],first['Count'],
+                      first['Mode'],depth_max_toSave,range_detection[0],range_detection[1]]
+
+        # Enregistrement des donnees des pings dans l'accumulateur
+        pings[channel].extend({'DateTime': h['DateTime'],
+                               'SampleInterval': h['SampleInterval'], 'SoundVelocity': h['SoundVelocity'],
+                               'DetectFirst': i_min_detect[keep], 'DetectLast': i_max_detect[keep],
+                               'TransmitPower': h['TransmitPower'], 'Mode': h['Mode'],
+                               'TransducerDepth': h['TransducerDepth'], 'Heave': h['Heave'],
+                               'Tx_Roll': h['Tx_Roll'], 'Tx_Pitch': h['Tx_Pitch'],
+                               'Spare1': h['Spare1'], 'Spare2': h['Spare2'],
+                               'Rx_Roll': h['Rx_Roll'], 'Rx_Pitch': h['Rx_Pitch'],
+                               'Offset': h['Offset']},
+                              {'Power': (power, n_save)})
+    return None
 
 
     
@@ -193,9 +180,11 @@ def decode_DEP0(data):
 #--------------- FONCTIONS PERMETTANT DE LIRE LES DONNEES ------------------  
     
 
-def read_RAWfile(f,line,channel,survey_date,range_detection,depth_max_toSave):
+def read_RAWfile(f,line,channels,survey_date,range_detection,depth_max_toSave,follow=False):
     """
     Cette fonction permet de lire un fichier .raw, puis elle enregistre les donnees dans des dictionnaires.
+    Le fichier est lu une seule fois : les pings de chaque canal demande sont repartis au fil de la lecture.
+    La lecture commence a la position courante du fichier f (debut du fichier, ou point de controle en mode suivi).
    
 
     Parametres
@@ -204,22 +193,27 @@ def read_RAWfile(f,line,channel,survey_date,range_detection,depth_max_toSave):
         fichier .raw issu de l'EA400 et ouvert grace a : open(filepath, 'rb')
     line : string
         identifiant du fichier de donnees, ici nom de la ligne, par ex : 'L0006'
-    channel : list of int
+    channels : list of int
         liste des canaux que l'on souhaite lire, par ex : [1,2] [1], ou [2] avec {1:38kHz ; 2:200kHz}
     survey_date : datetime
         date a laquelle a ete realisee le leve (jour), par ex : dt.datetime(year=2020,month=10,day=7,hour = 0,minute = 0,second = 0)
+        utilisee seulement si le fichier ne contient pas de phrase ZDA/RMC ; None pour utiliser la date des trames NME0
     range_detection : list of int
         intervalle de profondeur utilise pour la detection du fond, par ex : [5,100]
     depth_max_toSave : int
         profondeur seuil pour la sauvegarde des donnees, ne pas sauvegarder si la profondeur est superieure au seuil
+    follow : boolean
+        True pour un fichier en cours d'enregistrement : la lecture s'arrete avant la derniere trame si elle est incomplete,
+        f est alors positionne au debut de cette trame (f.tell() donne le point de controle de la lecture suivante) ;
+        tant qu'aucune trame CON0 n'est decodee, rien n'est renvoye et f reste a sa position de depart
 
 
     Sorties
     -------
     d_param : dictionary
-        dictionnaire comprenant tous les parametres d'acquisition respectifs a une ligne de leve
+        dictionnaire comprenant tous les parametres d'acquisition respectifs a une ligne de leve, pour chaque canal : d_param[channel][line]
     d_power : dictionary
-        dictionnaire comprenant l'ensemble des donnees acoustiques mesurees pendant une ligne
+        dictionnaire comprenant l'ensemble des donnees acoustiques mesurees pendant une ligne, pour chaque canal : d_power[channel][line]
     d_traj : dictionary
         dictionnaire comprenant l'ensemble des donnees de positionnement recueillies pendant une ligne
 
@@ -227,32 +221,35 @@ def read_RAWfile(f,line,channel,survey_date,range_detection,depth_max_toSave):
     #-------------Definition des variables -----------
     
     nb_con , nb_tag , nb_nme , nb_raw , nb_svp , nb_dep = 0,0,0,0,0,0 # compteurs de trames
-    ping=0  # compteur de ping
+    RAW0_datagrams = [] # trames RAW0 en attente de decodage
+    decoded_CON0 = None # parametres d'acquisition, None tant qu'aucune trame CON0 n'a ete decodee
+    nb_raw_ignored = 0 # trames RAW0 ignorees faute de trame CON0 (trame CON0 corrompue)
     
-    # Sauvegarde des donnees NME0
-    Trajectoire_time = [] # liste des temps trajectoire
-    Trajectoire_lat,Trajectoire_lon,Trajectoire_z=[],[],[] # listes des latitudes, longitudes et altitudes
+    # Sauvegarde des donnees NME0 (decodees en bloc a la fin du fichier)
+    NME0_text = [] # liste des phrases NMEA de chaque trame
+    NME0_time = [] # liste des dates des trames
     
-    # Origine des dates
-    origine_1601 = dt.datetime(year=1601,month=1,day=1,hour = 0,minute = 0,second = 0)
         
 
-    # Dictionnaires a remplir
-    d_power = {}
-    d_param = {}
-    d_traj = {}
+    # Dictionnaires a remplir, un dictionnaire par canal
+    d_power = {channel: {} for channel in channels}
+    d_param = {channel: {} for channel in channels}
+    # Accumulateurs des donnees des pings de chaque canal (convertis en DataFrame a la fin du fichier)
+    pings = {channel: PingAccumulator(PING_FIELDS, sample_fields=['Power']) for channel in channels}
     #--------------------------------------------------
 
-    data = f.read(4 * 1) # Debut de la lecture des donnees 
-    
-    while len(data)==4 : # Tant qu'il y a toujours des donnees a lire
-        
-        # on lit la longueur de la trame precisee au debut
-        lengths, = struct.unpack('<l', data)
-        # on isole la trame dans data
-        data = f.read(lengths*1)
-        
-        trame = data[:4]
+    # Reprise en cours de fichier (mode suivi) : la trame CON0 est relue au debut du fichier
+    start = f.tell()
+    if start > 0:
+        f.seek(0)
+        trame, data = next(iter_datagrams(f))
+        if trame == b'CON0':
+            decoded_CON0 = decode_CON0(data)
+        f.seek(start)
+
+    # Lecture des trames au fil du fichier
+    report = {} # octets ignores dans les zones corrompues du fichier
+    for trame, data in iter_datagrams(f, recover=RECOVER_CORRUPT, report=report, stop_at_eof=follow):
 
         if trame == b'CON0':
             nb_con+=1      
@@ -262,13 +259,9 @@ def read_RAWfile(f,line,channel,survey_date,range_detection,depth_max_toSave):
             nb_tag+=1
         elif trame == b'NME0':
             nb_nme+=1
-            # on decode la trame NME0
-            decoded_NME0 = decode_NME0(data)
-            if decoded_NME0 != None:
-                Trajectoire_time.append(survey_date + dt.timedelta(seconds = decoded_NME0[0]))
-                Trajectoire_lat.append(decoded_NME0[1])
-                Trajectoire_lon.append(decoded_NME0[2])
-                Trajectoire_z.append(decoded_NME0[3])
+            # on conserve le texte NMEA de la trame
+            NME0_text.append(data[12:])
+            NME0_time.append(int.from_bytes(data[4:12], 'little'))
                 
         elif trame == b'SVP0':
             nb_svp+=1
@@ -277,137 +270,144 @@ def read_RAWfile(f,line,channel,survey_date,range_detection,depth_max_toSave):
         
         elif trame == b'RAW0':
             nb_raw+=1
-            # on decode la trame RAW0
-            decoded_RAW0 = decode_RAW0(data)
-        
-            # Variables 
-            dateTime_ms = (decoded_RAW0["DateTime"]) // 10 # conversion de l'heure de dixieme de ms en ms
-            sample_int = decoded_RAW0["SampleInterval"]
-            sound_vel = decoded_RAW0["SoundVelocity"]
-            power = decoded_RAW0["Power"]
-            
-            # Conversion des profondeurs en indices
-            i_max_save = round( 2*depth_max_toSave / (sample_int * sound_vel)) # i_borne_prof
-            i_min_detect = round( 2*range_detection[0] / (sample_int * sound_vel))
-            i_max_detect = round( 2*range_detection[1] / (sample_int * sound_vel))
-            
-
-        
-            if decoded_RAW0["Channel"]==channel: # si la trame est dans la frequence choisie
-            
-                
-                if len(power)!=0:
-                    ping += 1
-                   
-
-                    # Detection du fond = max de puissance dans l'intervalle range_detection
-                    save_power_list = power[:i_max_save+1] # puissance a sauvegarder
-                    detect_power_list = power[i_min_detect:i_max_detect+1] # puissance pour detection du fond
-                    max_power = max(detect_power_list) # maximum de puissance dans detect_power_list
-                    i_max_power = i_min_detect + detect_power_list.index(max_power) # indice du max
-                    prof_max_power = i_max_power * sample_int * sound_vel / 2 # profondeur du max
-
-
-                    # - - - Stockage des donnees dans les dictionnaires d_param et d_power - - - #
-                    
-                    # extraction de Power dans un dictionnaire dont la clef est le nom de la ligne
-                    # sous forme de dataframe dont l'index est le numero du ping  
-     
-                        
-                    if line not in d_power: # lorsqu'on traite un nouveau fichier, on crée un nouveau DataFrame dans d_power
-                        # Initialisation du DataFrame pour d_param, definition des variables
-                        d_param[line] = pandas.DataFrame( columns= ['SurveyName','TransectName','SounderName','TransducerCount',
-                                                                    'Frequency_38','Gain_38','EquivalentBeamAngle_38',
-                                                                    'Frequency_200','Gain_200','EquivalentBeamAngle_200',
-                                                                    'Channel','Frequency',
-                                                                    'SampleInterval','SoundVelocity','PulseLength',
-                                                                    'BandWidth','AbsorptionCoefficient','Count',
-                                                                    'Mode','DepthMaxSave','DepthMinDetect','DepthMaxDetect'])
-                        
-                        # Enregistrement des metadonnees dans d_param
-                        d_param[line].loc['param'] = [decoded_CON0['SurveyName'],decoded_CON0['TransectName'],decoded_CON0['SounderName'],decoded_CON0['TransducerCount'],
-                                  decoded_CON0['Frequency_38'],decoded_CON0['Gain_38'],decoded_CON0['EquivalentBeamAngle_38'],
-                                  decoded_CON0['Frequency_200'],decoded_CON0['Gain_200'],decoded_CON0['EquivalentBeamAngle_200'],  
-                                  channel,decoded_RAW0["Frequency"],
-                                  decoded_RAW0['SampleInterval'],decoded_RAW0['SoundVelocity'],decoded_RAW0['PulseLength'],
-                                  decoded_RAW0['BandWidth'],decoded_RAW0['AbsorptionCoefficient'],decoded_RAW0['Count'],
-                                  decoded_RAW0['Mode'],depth_max_toSave,range_detection[0],range_detection[1]]
-
-                    
-                        # Initialisation du DataFrame pour d_power, definition des variables
-                        d_power[line] = pandas.DataFrame( columns= ['DateTime','Power','PowerDetectInterval','PowerMax','Depth',
-                                                                    'TransmitPower','Mode','TransducerDepth',
-                                                                    'Heave','Tx_Roll','Tx_Pitch','Spare1','Spare2',
-                                                                    'Rx_Roll','Rx_Pitch','Offset'])
-                            
-                        # Enregistrement des donnees dans d_power
-                        d_power[line].loc[ping,'DateTime'] = origine_1601 + dt.timedelta(microseconds = dateTime_ms)
-                        d_power[line].loc[ping,'Power'] = save_power_list
-                        d_power[line].loc[ping,'PowerDetectInterval'] = detect_power_list
-                        d_power[line].loc[ping,'PowerMax'] = max_power
-                        d_power[line].loc[ping,'Depth'] = prof_max_power
-                        d_power[line].loc[ping,'TransmitPower'] = decoded_RAW0['TransmitPower']
-                        d_power[line].loc[ping,'Mode'] = decoded_RAW0['Mode']
-                        d_power[line].loc[ping,'TransducerDepth'] = decoded_RAW0['TransducerDepth']
-                        d_power[line].loc[ping,'Heave'] = decoded_RAW0['Heave']
-                        d_power[line].loc[ping,'Tx_Roll'] = decoded_RAW0['Tx_Roll']
-                        d_power[line].loc[ping,'Tx_Pitch'] = decoded_RAW0['Tx_Pitch']  
-                        d_power[line].loc[ping,'Spare1'] = decoded_RAW0['Spare1']  
-                        d_power[line].loc[ping,'Spare2'] = decoded_RAW0['Spare2']  
-                        d_power[line].loc[ping,'Rx_Roll'] = decoded_RAW0['Rx_Roll']
-                        d_power[line].loc[ping,'Rx_Pitch'] = decoded_RAW0['Rx_Pitch']     
-                        d_power[line].loc[ping,'Offset'] = decoded_RAW0['Offset']
-                        
-
-                    # - - - end Stockage - - - #   
+            if decoded_CON0 is None and not follow: # parametres d'acquisition inconnus : ping ignore
+                nb_raw_ignored+=1
+                continue
+            # trame conservee puis decodee en bloc avec les suivantes (entetes et echantillons en une fois)
+            RAW0_datagrams.append(data)
+            if len(RAW0_datagrams) >= RAW0_BLOCK and decoded_CON0 is not None:
+                add_RAW0_pings(pings,RAW0_datagrams,line,channels,d_param,decoded_CON0,range_detection,depth_max_toSave)
+                RAW0_datagrams = []
                    
                
-        data = f.read(4 * 1)  # Poursuite de la lecture
-        # on lit la longueur de la trame precisee à la fin
-        lengthf, = struct.unpack('<l', data)
-        
-        if lengthf != lengths: # on verifie que l'identifiant est le même au début et à la fin
-            raise Exception('Length problem') 
-        data = f.read(4 * 1) # Poursuite de la lecture
-        
-        #----------------- FIN BOUCLE WHILE -----------------
+        #----------------- FIN BOUCLE FOR -----------------
 
+    # Mode suivi, trame CON0 pas encore decodee (incomplete) : rien n'est decode,
+    # f est replace au point de depart pour que la lecture suivante relise la trame CON0
+    if decoded_CON0 is None and follow:
+        f.seek(start)
+        return d_param,d_power,{}
 
-    # # - - - Stockage des metadonnees et des donnees de positionnement dans d_traj - - - #
-         
-    if line not in d_traj:
-        
-        # Initialisation du DataFrame pour d_traj, definition des variables
-        d_traj[line] = pandas.DataFrame( columns= ['DateTime','lon','lat','X','Y','z'])
-    
-    # - Conversion des coordonnees de WGS84 en Lambert93 - #
-    outProj = Proj('epsg:2154')
-    inProj = Proj('epsg:4326') 
-    lon, lat = np.array(Trajectoire_lon), np.array(Trajectoire_lat)
-    X_L93,Y_L93 = transform(inProj,outProj,lat,lon)   
+    # Decodage des dernieres trames RAW0
+    add_RAW0_pings(pings,RAW0_datagrams,line,channels,d_param,decoded_CON0,range_detection,depth_max_toSave)
 
-    # Enregistrement des donnees dans d_traj
-    d_traj[line]['DateTime'] = Trajectoire_time
-    d_traj[line]['lon'] = Trajectoire_lon # Sauvegarde des coordonnees en WGS84
-    d_traj[line]['lat'] = Trajectoire_lat
-    d_traj[line]['X'] = X_L93 # Sauvegarde des coordonnees en Lambert93
-    d_traj[line]['Y'] = Y_L93
-    d_traj[line]['z'] = Trajectoire_z
-        
-        
+
+    # # - - - Stockage des donnees de positionnement dans d_traj - - - #
+    d_traj = build_trajectory(NME0_text,NME0_time,survey_date,line)
     # # - - -  end - - - #
     
+    # - - - Construction du DataFrame d_power en une seule fois - - - #
+    for channel in channels:
+        if pings[channel].n_ping == 0:
+            continue
+        # Detection du fond en une fois sur la matrice (ping x echantillon), dans l'intervalle de detection de chaque ping
+        columns, samples, n_samples = pings[channel].to_arrays()
+        i_detect, columns['PowerMax'][:] = detect_bottom(samples['Power'], columns['DetectFirst'], columns['DetectLast'], **BOTTOM_DETECTION)
+        columns['Depth'][:] = i_detect * columns['SampleInterval'] * columns['SoundVelocity'] / 2
+        # DataFrame dont l'index est le numero du ping
+        d_power[channel][line] = pings[channel].to_dataframe(columns= ['DateTime','Power','PowerDetectInterval','PowerMax','Depth','DetectFirst','DetectLast',
+                                                                      'TransmitPower','Mode','TransducerDepth',
+                                                                      'Heave','Tx_Roll','Tx_Pitch','Spare1','Spare2',
+                                                                      'Rx_Roll','Rx_Pitch','Offset'],
+                                                             index = np.arange(1, pings[channel].n_ping+1))
+        # conversion en une fois des dates FILETIME en datetime64
+        d_power[channel][line]['DateTime'] = filetime_to_datetime64(d_power[channel][line]['DateTime'].values)
+
     # Nombre de trames au total
     nb_tot = nb_con + nb_tag + nb_nme + nb_raw + nb_svp + nb_dep 
     # Affiche le nom du fichier traite et le nombre de trames qu'il contient
-    print('\nFichier : ',f.name)
-    print('nb_tot : ',nb_tot,'\nnb_con : ' ,nb_con, '\nnb_tag : ',nb_tag , '\nnb_nme : ',nb_nme , '\nnb_raw : ',nb_raw ,'\nnb_svp : ', nb_svp,'\nnb_dep : ',nb_dep)
+    if not follow:
+        print('\nFichier : ',f.name)
+        print('nb_tot : ',nb_tot,'\nnb_con : ' ,nb_con, '\nnb_tag : ',nb_tag , '\nnb_nme : ',nb_nme , '\nnb_raw : ',nb_raw ,'\nnb_svp : ', nb_svp,'\nnb_dep : ',nb_dep)
+    if report:
+        print('octets ignores : ',report['skipped_bytes'],' (',report['n_resync'],' zones corrompues)')
+    if nb_raw_ignored:
+        print('trames RAW0 ignorees (aucune trame CON0 valide avant elles) : ',nb_raw_ignored)
     
 
     return d_param,d_power,d_traj
     
 
 
+def build_trajectory(NME0_text,NME0_time,survey_date,line):
+    """
+    Cette fonction permet de construire la trajectoire d'une ligne a partir des phrases NMEA des trames NME0.
+
+    Parametres
+    ----------
+    NME0_text : list of bytes
+        texte NMEA de chaque trame NME0 (apres l'entete de 12 octets)
+    NME0_time : list of int
+        date FILETIME de chaque trame NME0
+    survey_date : datetime
+        date du leve, utilisee seulement si les trames ne contiennent pas de phrase ZDA/RMC, cf. ea400_nmea.parse_NMEA
+    line : string
+        identifiant de la ligne de leve, par ex : 'L0006'
+
+    Sortie
+    -------
+    d_traj : dictionary
+        dictionnaire comprenant les donnees de positionnement de la ligne : d_traj[line]
+
+    """
+    d_traj = {}
+    # Initialisation du DataFrame pour d_traj, definition des variables
+    d_traj[line] = pandas.DataFrame( columns= ['DateTime','lon','lat','X','Y','z'])
+    
+    # - Decodage en bloc des phrases NMEA : positions GGA, ou RMC a defaut - #
+    nav = parse_NMEA(NME0_text, np.array(NME0_time, dtype=np.uint64), survey_date)
+    if len(nav['GGA']['DateTime']) > 0:
+        position = nav['GGA']
+        Trajectoire_z = position['z']
+    else:
+        position = nav['RMC']
+        Trajectoire_z = np.full(len(position['DateTime']), np.nan)
+    
+    # - Conversion des coordonnees de WGS84 en Lambert93 (systeme projete TARGET_CRS de ea400_proj) - #
+    lon, lat = position['lon'], position['lat']
+    X_L93,Y_L93 = to_projected(lon,lat)
+
+    # Enregistrement des donnees dans d_traj
+    d_traj[line]['DateTime'] = position['DateTime']
+    d_traj[line]['lon'] = lon # Sauvegarde des coordonnees en WGS84
+    d_traj[line]['lat'] = lat
+    d_traj[line]['X'] = X_L93 # Sauvegarde des coordonnees en Lambert93
+    d_traj[line]['Y'] = Y_L93
+    d_traj[line]['z'] = Trajectoire_z
+    return d_traj
+
+
+def read_NME0file(filepath,line,survey_date):
+    """
+    Cette fonction permet de lire uniquement les trames NME0 d'un fichier EA400 (par ex : fichier .out associe a un fichier .dg)
+    et de construire la trajectoire de la ligne.
+
+    Parametres
+    ----------
+    filepath : string
+        chemin vers le fichier .raw ou .out
+    line : string
+        identifiant de la ligne de leve, par ex : 'L0006'
+    survey_date : datetime
+        date du leve, cf. build_trajectory
+
+    Sortie
+    -------
+    d_traj : dictionary
+        dictionnaire comprenant les donnees de positionnement de la ligne : d_traj[line] (vide si le fichier est absent)
+
+    """
+    NME0_text, NME0_time = [], []
+    if os.path.exists(filepath):
+        selection = select_datagrams(load_index(filepath, recover=RECOVER_CORRUPT), types=['NME0'])
+        for data in read_datagrams(filepath, selection):
+            NME0_text.append(data[12:])
+        NME0_time = list(selection['DateTime'])
+    else:
+        print('Pas de fichier de positionnement : '+filepath)
+    return build_trajectory(NME0_text,NME0_time,survey_date,line)
+
+
 def read_OUTfile(f,line):
     """
     Cette fonction permet de lire un fichier .out, puis elle enregistre les donnees pertinentes dans des dictionnaires.
@@ -429,58 +429,25 @@ def read_OUTfile(f,line):
 
     #-------------Definition des variables -----------
     
-    nb_con , nb_tag , nb_nme , nb_raw , nb_svp , nb_dep = 0,0,0,0,0,0 # compteurs de trames
-    # Initialisation des listes
-    L_time , L_depth38, L_depth200, L_BS38, L_BS200 = [],[],[],[],[]
-    # Origine des dates
-    origine_1601 = dt.datetime(year=1601,month=1,day=1,hour = 0,minute = 0,second = 0)
     # Dictionnaire a remplir
     d_out = {}
     
     #-------------------------------------------------
     
-    data = f.read(4 * 1) # Debut de la lecture des donnees 
+    # Index des trames du fichier (relu depuis le fichier annexe s'il est a jour)
+    report = {} # octets ignores dans les zones corrompues du fichier
+    index = load_index(f.name, recover=RECOVER_CORRUPT, report=report)
+    # compteurs de trames
+    counts = count_datagrams(index)
+    nb_con , nb_tag , nb_nme , nb_raw , nb_svp , nb_dep = [counts.get(t,0) for t in ['CON0','TAG0','NME0','RAW0','SVP0','DEP0']]
     
-    while len(data)==4 : # Tant qu'il y a toujours des donnees a lire
-        
-        # on lit la longueur de la trame precisee au debut
-        lengths, = struct.unpack('<l', data)
-        # on isole la trame dans data
-        data = f.read(lengths*1)
-        
-        trame = data[:4]
-
-        if trame == b'CON0':
-            nb_con+=1      
-        elif trame == b'TAG0':
-            nb_tag+=1
-        elif trame == b'NME0':
-            nb_nme+=1
-            decode_NME0(data)
-        elif trame == b'RAW0':
-            nb_raw+=1
-        elif trame == b'SVP0':
-            nb_svp+=1
-        elif trame == b'DEP0':
-            nb_dep+=1
-            # on decode la trame DEP0
-            decoded_DEP0 = decode_DEP0(data)
-            time_ms = (decoded_DEP0['DateTime']) //10 # conversion des dates en ms
-            L_time.append(origine_1601 + dt.timedelta(microseconds = time_ms))
-            L_depth38.append(decoded_DEP0['Depth_38'])
-            L_depth200.append(decoded_DEP0['Depth_200'])
-            L_BS38.append(decoded_DEP0['BS_38'])
-            L_BS200.append(decoded_DEP0['BS_200'])
-            
-        data = f.read(4 * 1)  # Poursuite de la lecture
-        # on lit la longueur de la trame precisee à la fin
-        lengthf, = struct.unpack('<l', data)
-        
-        if lengthf != lengths: # on vérifie que l'identifiant est le même au début et à la fin
-            raise Exception('Length problem') 
-        data = f.read(4 * 1) # Poursuite de la lecture
-        
-        #----------------- FIN BOUCLE WHILE -----------------
+    # Lecture directe des trames DEP0 : decodage de toutes les trames en un seul tableau
+    decoded_DEP0 = read_headers(f.name, select_datagrams(index, types=['DEP0']), DEP0_DTYPE)
+    L_time = filetime_to_datetime64(decoded_DEP0['DateTime']) # conversion en une fois des dates FILETIME en datetime64
+    L_depth38 = decoded_DEP0['Depth_38']
+    L_depth200 = decoded_DEP0['Depth_200']
+    L_BS38 = decoded_DEP0['BS_38']
+    L_BS200 = decoded_DEP0['BS_200']
     
     if line not in d_out:
         d_out[line] = pandas.DataFrame( columns= ['DateTime','Depth_38','Depth_200','BS_38','BS_200'])
@@ -496,9 +463,84 @@ def read_OUTfile(f,line):
     # Affiche le nom du fichier traite et le nombre de trames qu'il contient
     print('\nFichier : ',f.name)
     print('nb_tot : ',nb_tot,'\nnb_con : ' ,nb_con, '\nnb_tag : ',nb_tag , '\nnb_nme : ',nb_nme , '\nnb_raw : ',nb_raw ,'\nnb_svp : ', nb_svp,'\nnb_dep : ',nb_dep)
+    if report:
+        print('octets ignores : ',report['skipped_bytes'],' (',report['n_resync'],' zones corrompues)')
+    
+    return d_out
     
+
+def read_REFfile(fileRAW,line):
+    """
+    Cette fonction permet de lire les references Kongsberg (trames DEP0) du fichier .out associe a un fichier .raw
+    (meme nom, extension .out).
+
+    Parametres
+    ----------
+    fileRAW : string
+        chemin vers le fichier .raw
+    line : string
+        identifiant de la ligne de leve, par ex : 'L0006'
+
+    Sortie
+    -------
+    d_out : dictionary
+        dictionnaire comprenant les donnees des trames DEP0, cf. read_OUTfile ; None si le fichier .out est absent
+
+    """
+    fileOUT = os.path.splitext(fileRAW)[0] + '.out'
+    if not os.path.exists(fileOUT):
+        print('Pas de fichier .out associe a : '+fileRAW)
+        return None
+    with open(fileOUT, 'rb') as f:
+        d_out = read_OUTfile(f,line)
     return d_out
+
+
+def addKongsbergRef(d_power,d_out,line,channel,tolerance=REF_TOLERANCE):
+    """
+    Cette fonction permet d'associer a chaque ping la detection du fond et le BS calcules par Kongsberg (trames DEP0 du fichier .out).
+    Pour chaque ping, on retient la trame DEP0 la plus proche dans le temps, si l'ecart est inferieur a la tolerance.
+
+    Parametres
+    ----------
+    d_power : dictionary
+        dictionnaire comprenant l'ensemble des donnees acoustiques pour chaque ping
+    d_out : dictionary
+        dictionnaire comprenant les donnees des trames DEP0, cf. read_OUTfile
+    line : string
+        identifiant de la ligne de leve
+    channel : int
+        canal des pings, par ex : 1->38kHz et 2->200kHz
+    tolerance : float
+        ecart de temps maximal entre un ping et la trame DEP0 associee (en s)
+
+    Sortie
+    -------
+    d_power : dictionary
+        dictionnaire fourni en entree avec les attributs supplementaires 'Depth_Kongsberg' et 'BS_Kongsberg'
+        (NaN si aucune trame DEP0 n'est assez proche)
+
+    """
+    # Prise en compte de la frequence
+    if channel ==1: str_freq = '_38'
+    else : str_freq = '_200'
     
+    data = d_power[line]
+    ref = d_out[line][['DateTime','Depth'+str_freq,'BS'+str_freq]]
+    ref = ref.rename(columns={'Depth'+str_freq:'Depth_Kongsberg','BS'+str_freq:'BS_Kongsberg'})
+    ref['DateTime'] = pandas.to_datetime(ref['DateTime']).astype('datetime64[ns]')
+    
+    # Jointure sur la date la plus proche (donnees triees par date)
+    pings = data.drop(columns=['Depth_Kongsberg','BS_Kongsberg'], errors='ignore')
+    index_pings = pings.index
+    pings = pings.reset_index(drop=True)
+    pings['DateTime'] = pandas.to_datetime(pings['DateTime']).astype('datetime64[ns]')
+    result = pandas.merge_asof(pings, ref, on='DateTime', direction='nearest',
+                               tolerance=pandas.Timedelta(seconds=tolerance))
+    result.index = index_pings
+    d_power[line] = result
+    return d_power
+
 
 def check_FileExists(filepath):
     """
@@ -528,7 +570,7 @@ def check_FileExists(filepath):
     return Save
    
     
-def save_RAWbdd(outpath,channel,d_param,d_power,d_traj):
+def save_RAWbdd(outpath,channel,d_param,d_power,d_traj,overwrite=None,d_out=None):
     """
     Cette fonction permet de sauvegarder les donnees des fichiers .RAW rassemblees dans les dictionnaires dans des fichiers h5.
 
@@ -544,6 +586,11 @@ def save_RAWbdd(outpath,channel,d_param,d_power,d_traj):
         dictionnaire comprenant l'ensemble des donnees acoustiques mesurees pendant une ligne
     d_traj : dictionary
         dictionnaire comprenant l'ensemble des donnees de positionnement recueillies pendant une ligne
+    overwrite : boolean
+        None pour demander a l'utilisateur si un fichier existant doit etre ecrase,
+        True pour ecraser les fichiers existants, False pour les conserver
+    d_out : dictionary
+        dictionnaire comprenant les donnees des trames DEP0 (references Kongsberg), sauvegardees sous la clef 'ref' ; None si absent
 
     """
     # Prise en compte de la frequence
@@ -555,28 +602,39 @@ def save_RAWbdd(outpath,channel,d_param,d_power,d_traj):
         fic_h5_data = ligne +str_freq+ '_data.h5' # nom du fichier de sortie rassemblant les donnees
         
         # Verification pour ne pas ecraser de fichier
-        Save = check_FileExists(outpath + fic_h5_data)
+        if overwrite is None:
+            Save = check_FileExists(outpath + fic_h5_data)
+        else:
+            Save = overwrite or not os.path.exists(outpath + fic_h5_data)
+            if not Save:
+                print('Fichier existant conserve : '+outpath + fic_h5_data)
                 
         if Save : # Sauvegarde
             # Creation d'un fichier de sortie h5
             store = pandas.HDFStore(outpath + fic_h5_data)
-            store['data'] = d_power[ligne]
+            put_pings(store, 'data', d_power[ligne], counts=STORE_COUNTS)
             store['trajectoire'] = d_traj[ligne]
             store['param'] = d_param[ligne]
+            if d_out is not None and ligne in d_out:
+                store['ref'] = d_out[ligne]
             store.close()
 
     return None
 
 
 
-def runDECODEandSAVE_RAWfiles(filesRAW_to_read,out_path,channels,survey_date,range_detection,depth_max_toSave):
+def runDECODEandSAVE_RAWfiles(filesRAW_to_read,out_path,channels,survey_date,range_detection,depth_max_toSave,overwrite=None):
     """
     Cette fonction permet d'executer la lecture et la sauvegarde des fichiers .RAW dans des fichiers h5.
+    Chaque fichier n'est lu qu'une seule fois, les canaux demandes sont separes pendant la lecture.
+    Si le fichier .out de la ligne est present a cote du fichier .raw, ses trames DEP0 (references Kongsberg)
+    sont associees a chaque ping et enregistrees dans le meme fichier h5 (clef 'ref').
+    Les fichiers .dg sont lus de la meme facon, la trajectoire etant lue dans les trames NME0 du fichier .out associe.
 
     Parametres
     ----------
     filesRAW_to_read : list of string
-        liste des chemins vers les fichiers .raw a lire
+        liste des chemins vers les fichiers .raw (ou .dg) a lire
     out_path : string
         chemin vers le repertoire de sortie
     channels : list of int
@@ -587,24 +645,229 @@ def runDECODEandSAVE_RAWfiles(filesRAW_to_read,out_path,channels,survey_date,ran
         intervalle de profondeur utilise pour la detection du fond, par ex : [5,100]
     depth_max_toSave : int
         profondeur seuil pour la sauvegarde des donnees, ne pas sauvegarder si la profondeur est superieure au seuil
+    overwrite : boolean
+        None pour demander a l'utilisateur si un fichier existant doit etre ecrase,
+        True pour ecraser les fichiers existants, False pour les conserver
 
     """
-    for channel in channels : # on parcout les canaux 
-        for file in filesRAW_to_read : # on parcourt les fichiers de donnees .raw
-            line = os.path.basename(file)[:5]
-            print('-> Lecture du fichier RAW, Ligne : '+line+' Canal : '+str(channel))
+    for file in filesRAW_to_read : # on parcourt les fichiers de donnees .raw
+        line = os.path.basename(file)[:5]
+        print('-> Lecture du fichier RAW, Ligne : '+line+' Canaux : '+str(channels))
+        if file.endswith('.dg'): # fichier .dg : echantillons seuls, positionnement dans le fichier .out
+            d_param,d_power = read_DGfile(file,line,channels,range_detection,depth_max_toSave,survey_date,detection=BOTTOM_DETECTION)
+            d_traj = read_NME0file(os.path.splitext(file)[0] + '.out',line,survey_date)
+        else:
             # Ouverture du fichier
             f = open(file, 'rb')
-            # lecture et remplissage de dictionnaires :
-            d_power,d_param,d_traj = read_RAWfile(f,line,channel,survey_date,range_detection,depth_max_toSave)
-            print('Lecture achevee')
+            # lecture de tous les canaux en une seule passe et remplissage de dictionnaires :
+            d_param,d_power,d_traj = read_RAWfile(f,line,channels,survey_date,range_detection,depth_max_toSave)
+            f.close()
+        # lecture des references Kongsberg du fichier .out associe
+        d_out = read_REFfile(file,line)
+        print('Lecture achevee')
+        for channel in channels : # on parcourt les canaux
+            if d_out is not None and line in d_power[channel]:
+                # association des references Kongsberg a chaque ping
+                d_power[channel] = addKongsbergRef(d_power[channel],d_out,line,channel)
             print('-> Sauvegarde du fichier RAW, Ligne : '+line+' Canal : '+str(channel))
             # Enregistrement des donnees dans des fichiers h5
-            save_RAWbdd(out_path,channel,d_param,d_power,d_traj)
+            save_RAWbdd(out_path,channel,d_param[channel],d_power[channel],d_traj,overwrite,d_out)
             print('Sauvegarde achevee')
     return None
 
 
+def runDECODEandSAVE_RAWfiles_parallel(filesRAW_to_read,out_path,channels,survey_date,range_detection,depth_max_toSave,n_workers=None,overwrite=False):
+    """
+    Cette fonction permet d'executer la lecture et la sauvegarde des fichiers .RAW en parallele, une ligne de leve par processus.
+    Les fichiers d'une meme ligne sont traites dans l'ordre par le meme processus : les noms des fichiers de sortie
+    ne dependent donc pas de l'ordre d'execution. Une ligne en erreur est signalee sans interrompre les autres.
+
+    Parametres
+    ----------
+    filesRAW_to_read : list of string
+        liste des chemins vers les fichiers .raw a lire
+    out_path : string
+        chemin vers le repertoire de sortie
+    channels : list of int
+        liste des canaux que l'on souhaite lire, par ex : [1,2] [1], ou [2] avec {1:38kHz ; 2:200kHz}
+    survey_date : datetime
+        date a laquelle a ete realisee le leve (jour), par ex : dt.datetime(year=2020,month=10,day=7,hour = 0,minute = 0,second = 0)
+    range_detection : list of int
+        intervalle de profondeur utilise pour la detection du fond, par ex : [5,100]
+    depth_max_toSave : int
+        profondeur seuil pour la sauvegarde des donnees, ne pas sauvegarder si la profondeur est superieure au seuil
+    n_workers : int
+        nombre de processus, None pour utiliser tous les coeurs disponibles
+    overwrite : boolean
+        True pour ecraser les fichiers existants, False pour les conserver (pas de question possible en parallele)
+
+    Sortie
+    -------
+    d_report : dictionary
+        temps de calcul et erreur eventuelle pour chaque ligne, cf. ea400_batch.run_tasks
+
+    """
+    # Regroupement des fichiers par ligne de leve
+    d_files = {}
+    for file in sorted(filesRAW_to_read):
+        d_files.setdefault(os.path.basename(file)[:5], []).append(file)
+    tasks = {line: (files,out_path,channels,survey_date,range_detection,depth_max_toSave,overwrite) for line, files in d_files.items()}
+    return run_tasks(runDECODEandSAVE_RAWfiles, tasks, n_workers)
+
+
+def load_followState(out_path,line,channels):
+    """
+    Cette fonction permet de relire le point de controle d'une ligne suivie dans ses fichiers h5.
+    Les pings et la trajectoire ajoutes apres le point de controle (suivi interrompu pendant une sauvegarde) sont supprimes.
+
+    Parametres
+    ----------
+    out_path : string
+        chemin vers le repertoire de sortie
+    line : string
+        identifiant de la ligne de leve, par ex : 'L0006'
+    channels : list of int
+        liste des canaux suivis, par ex : [1,2] avec {1:38kHz ; 2:200kHz}
+
+    Sortie
+    -------
+    d_state : dictionary
+        'offset' : position du fichier .raw a partir de laquelle reprendre la lecture (0 si aucun point de controle),
+        'n_ping' : nombre de pings sauvegardes de chaque canal, 'n_traj' : nombre de points de trajectoire sauvegardes
+
+    """
+    d_state = {'offset': 0, 'n_ping': {channel: 0 for channel in channels}, 'n_traj': 0}
+    checkpoints = {}
+    for channel in channels:
+        str_freq = '_38kHz' if channel == 1 else '_200kHz'
+        fic_h5_data = out_path + line + str_freq + '_data.h5'
+        if not os.path.exists(fic_h5_data):
+            continue
+        with pandas.HDFStore(fic_h5_data, mode='r') as store:
+            if '/checkpoint' in store.keys() and 'n_ping' in store['checkpoint']:
+                checkpoints[fic_h5_data] = (channel, store['checkpoint'])
+    # reprise seulement si tous les canaux deja sauvegardes l'ont ete au meme point de controle
+    # (un canal sans fichier n'a encore aucun ping)
+    if len({int(checkpoint['offset']) for _, checkpoint in checkpoints.values()}) == 1:
+        for fic_h5_data, (channel, checkpoint) in checkpoints.items():
+            d_state['offset'] = int(checkpoint['offset'])
+            d_state['n_ping'][channel] = int(checkpoint['n_ping'])
+            d_state['n_traj'] = int(checkpoint['n_traj'])
+            with pandas.HDFStore(fic_h5_data, mode='a') as store:
+                truncate_pings(store, 'data', d_state['n_ping'][channel])
+                truncate_pings(store, 'trajectoire', d_state['n_traj'])
+    return d_state
+
+
+def save_followState(out_path,line,channels,d_state,d_param,d_power,d_traj,offset):
+    """
+    Cette fonction permet d'ajouter aux fichiers h5 d'une ligne suivie les pings et la trajectoire nouvellement decodes,
+    sans relire ni reecrire les donnees deja sauvegardees (cf. ea400_store.append_pings), puis le point de controle.
+    Le point de controle est ecrit en dernier : les donnees ajoutees apres lui sont supprimees a la reprise du suivi.
+
+    Parametres
+    ----------
+    out_path : string
+        chemin vers le repertoire de sortie
+    line : string
+        identifiant de la ligne de leve, par ex : 'L0006'
+    channels : list of int
+        liste des canaux suivis, par ex : [1,2] avec {1:38kHz ; 2:200kHz}
+    d_state : dictionary
+        point de controle de la ligne, cf. load_followState ; mis a jour
+    d_param, d_power, d_traj : dictionary
+        donnees nouvellement decodees, cf. read_RAWfile
+    offset : int
+        position du fichier .raw apres la derniere trame decodee
+
+    """
+    traj = d_traj[line]
+    traj.index = np.arange(d_state['n_traj'], d_state['n_traj'] + len(traj))
+    saved = {}
+    for channel in channels:
+        str_freq = '_38kHz' if channel == 1 else '_200kHz'
+        fic_h5_data = out_path + line + str_freq + '_data.h5'
+        new = d_power[channel].get(line)
+        n_new = 0 if new is None else len(new)
+        n_ping = d_state['n_ping'][channel]
+        if n_ping == 0:
+            if n_new == 0: # aucun ping pour l'instant
+                continue
+            with pandas.HDFStore(fic_h5_data, mode='w') as store:
+                store['param'] = d_param[channel][line]
+                if len(saved) > 0 and d_state['n_traj'] > 0: # trajectoire deja sauvegardee avec un autre canal
+                    old_traj = pandas.read_hdf(next(iter(saved.values())), 'trajectoire', stop=d_state['n_traj'])
+                    store.append('trajectoire', old_traj, format='table', index=False)
+        with pandas.HDFStore(fic_h5_data, mode='a') as store:
+            if n_new > 0: # numerotation des pings a la suite des pings deja sauvegardes
+                new.index = new.index + n_ping
+                append_pings(store, 'data', new, counts=STORE_COUNTS)
+            if len(traj) > 0:
+                store.append('trajectoire', traj, format='table', index=False)
+            store['checkpoint'] = pandas.Series({'offset': offset, 'n_ping': n_ping + n_new, 'n_traj': d_state['n_traj'] + len(traj)})
+        saved[channel] = fic_h5_data
+        d_state['n_ping'][channel] = n_ping + n_new
+    d_state['n_traj'] += len(traj)
+    d_state['offset'] = offset
+    return None
+
+
+def follow_RAWfile(file,out_path,channels,survey_date,range_detection,depth_max_toSave,poll_interval=FOLLOW_INTERVAL,idle_timeout=FOLLOW_TIMEOUT):
+    """
+    Cette fonction permet de suivre un fichier .raw en cours d'enregistrement : le fichier est relu regulierement
+    a partir du dernier point de controle (fin de la derniere trame complete decodee), seules les nouvelles trames
+    sont decodees puis ajoutees aux fichiers h5 de la ligne, sans garder en memoire les pings deja sauvegardes.
+    Le suivi reprend au point de controle sauvegarde s'il est relance, et s'arrete lorsque le fichier n'a pas grossi
+    pendant idle_timeout secondes (fin de la ligne).
+
+    Parametres
+    ----------
+    file : string
+        chemin vers le fichier .raw en cours d'enregistrement
+    out_path : string
+        chemin vers le repertoire de sortie
+    channels : list of int
+        liste des canaux que l'on souhaite lire, par ex : [1,2] [1], ou [2] avec {1:38kHz ; 2:200kHz}
+    survey_date : datetime
+        date du leve, cf. read_RAWfile
+    range_detection : list of int
+        intervalle de profondeur utilise pour la detection du fond, par ex : [5,100]
+    depth_max_toSave : int
+        profondeur seuil pour la sauvegarde des donnees, ne pas sauvegarder si la profondeur est superieure au seuil
+    poll_interval : float
+        intervalle entre deux lectures du fichier (en s)
+    idle_timeout : float
+        duree sans nouvelle donnee au bout de laquelle le suivi s'arrete (en s), None pour suivre sans fin
+
+    Sortie
+    -------
+    d_state : dictionary
+        point de controle final de la ligne, cf. load_followState
+
+    """
+    line = os.path.basename(file)[:5]
+    d_state = load_followState(out_path,line,channels)
+    print('-> Suivi du fichier RAW, Ligne : '+line+' Canaux : '+str(channels)+' a partir de l\'octet '+str(d_state['offset']))
+    t_last = time.time() # date de la derniere lecture de nouvelles donnees
+
+    while True:
+        if os.path.getsize(file) > d_state['offset']:
+            with open(file, 'rb') as f:
+                f.seek(d_state['offset'])
+                # lecture des nouvelles trames completes uniquement
+                d_param,d_power,d_traj = read_RAWfile(f,line,channels,survey_date,range_detection,depth_max_toSave,follow=True)
+                offset = f.tell()
+            if offset > d_state['offset']:
+                t_last = time.time()
+                save_followState(out_path,line,channels,d_state,d_param,d_power,d_traj,offset)
+                print(time.strftime('%H:%M:%S')+' '+line+' : octet '+str(offset)+', pings '+str(d_state['n_ping']))
+        if idle_timeout is not None and time.time() - t_last > idle_timeout:
+            print('Fin du suivi, Ligne : '+line+' (pas de nouvelle donnee depuis '+str(idle_timeout)+' s)')
+            break
+        time.sleep(poll_interval)
+    return d_state
+
+
 def runDECODEandSAVE_OUTfiles(filesOUT_to_read,out_path):
     """
     Cette fonction permet d'executer la lecture et la sauvegarde des fichiers .out dans des fichiers h5.
@@ -645,22 +908,31 @@ if __name__ == '__main__':
     
     # Chemins vers les repertoires de donnees
     dir_path = './data/' # repertoire d'entree   ->>> A SPECIFIER
-    filesRAW_to_read = glob.glob(dir_path+'*.raw') # Ensemble des fichiers RAW a traiter
+    filesRAW_to_read = glob.glob(dir_path+'*.raw') # Ensemble des fichiers RAW a traiter (ou glob.glob(dir_path+'*.dg') pour les fichiers .dg)
     filesOUT_to_read = glob.glob(dir_path+'*.out') # Ensemble des fichiers OUT a traiter
     out_path = './fic_h5/' # repertoire de sortie   ->>> A SPECIFIER
     
     # Variables 
-    # Date du leve /!\ a modifier 07/10/2020 ou 23/10/2020   ->>> A SPECIFIER
-    survey_date = dt.datetime(year=2020,month=10,day=7,hour = 0,minute = 0,second = 0)
+    # Date du leve, utilisee seulement si les trames NME0 ne contiennent pas de phrase ZDA/RMC
+    # None : jour donne par la date des trames NME0 ; par ex : dt.datetime(year=2020,month=10,day=7) pour l'imposer
+    survey_date = None
     channels = [1,2] # canaux à lire {1:38kHz ; 2:200kHz}   ->>> A SPECIFIER
     range_detection = [5,100] # intervalle de profondeur pour la recherche du fond (en m)
     depth_max_toSave = 100 # profondeur max sauvegardee dans les fichiers h5 (en m)
+    n_workers = 1 # nombre de processus pour le decodage des fichiers .RAW (1 : lecture sequentielle)
+    follow_file = None # fichier .raw en cours d'enregistrement a suivre, par ex : dir_path+'L0024-D20201007-T140952-EA400-38-200.raw'
       
     # Lecture et Sauvegarde des fichiers .RAW
-    runDECODEandSAVE_RAWfiles(filesRAW_to_read,out_path,channels,survey_date,range_detection,depth_max_toSave)
+    if follow_file is not None: # suivi pendant l'acquisition
+        follow_RAWfile(follow_file,out_path,channels,survey_date,range_detection,depth_max_toSave)
+    elif n_workers == 1:
+        runDECODEandSAVE_RAWfiles(filesRAW_to_read,out_path,channels,survey_date,range_detection,depth_max_toSave)
+    else:
+        runDECODEandSAVE_RAWfiles_parallel(filesRAW_to_read,out_path,channels,survey_date,range_detection,depth_max_toSave,n_workers)
     
-    # Lecture et Sauvegarde des fichiers .OUT
-    runDECODEandSAVE_OUTfiles(filesOUT_to_read,out_path)
+    # Les fichiers .OUT sont lus avec les fichiers .RAW de la meme ligne (references Kongsberg dans les fichiers h5)
+    # Export optionnel des fichiers _ref.txt
+    # runDECODEandSAVE_OUTfiles(filesOUT_to_read,out_path)
     
     # Affichage du temps de calcul
     t_end = time.time() # Fin du temps de calcul
@@ -5,12 +5,19 @@
 # Librairies importee
 import numpy as np
 import pandas
-import struct
 import glob
 import os
 import time
-import datetime as dt
-from shapely.geometry import  Point, Polygon
+# Autres codes python
+from ea400_datagrams import (decode_RAW0_datagrams, load_index, select_datagrams, count_datagrams, read_headers, filetime_to_datetime64, iter_datagrams,
+                             CON0_HEADER, CON0_TRANSDUCER, CON0_TRANSDUCER_OFFSETS, RAW0_HEADER_DTYPE, DEP0_DTYPE, POWER_SCALE)
+from ea400_store import PingAccumulator, put_pings
+from ea400_bottom import detect_bottom
+from ea400_batch import run_tasks
+from ea400_dg import read_DGfile
+from ea400_nav import interpolate_nav, align_streams, NAV_COLUMNS
+from ea400_qinsy import read_qinsy
+from ea400_zones import add_zone
 
 #--------------------------------------------------------------------------------#
 #               LECTURE ET SAUVEGARDE DES DONNEES EA400                          #
@@ -27,132 +34,75 @@ from shapely.geometry import  Point, Polygon
 #   d'attitude fournis par Qinsy.                                                #                         #
 #--------------------------------------------------------------------------------#
 
-#-------- FONCTIONS PERMETTANT DE DECODER LES DIFFERENTES TRAMES --------
-
-def decode_CON0(data):
-    """
-    Cette fonction permet de decoder les trames CON0.
-
-    Parametres
-    ----------
-    data : string
-        trame CON0 - portion de fichier binaire
-
-    Sortie
-    -------
-    decode_data : dictionary
-        dictionnaire comprenant l'ensemble des parametres d'acquisition
-
-    """
-    trame = data[:4]
-    if trame == b'CON0':
-        decode_data={}
-        decode_data["DateTime"] = struct.unpack('<Q', data[4:4+8])[0]
-        decode_data["SurveyName"] = struct.unpack('<128s', data[12:12+128])[0].decode('ascii').strip('\x00')
-        decode_data["TransectName"] = struct.unpack('<128s', data[140:140+128])[0].decode('ascii').strip('\x00')
-        decode_data["SounderName"] = struct.unpack('<128s', data[168:168+128])[0].decode('ascii').strip('\x00')
-        decode_data["Spare"] = struct.unpack('128s', data[296:296+128])[0].decode('ascii').strip('\x00')
-        # ecart de 100 bits...(?)
-        decode_data["TransducerCount"] = struct.unpack('<I', data[524:524+4])[0]
-        # transducer 1 = 38kHz
-        decode_data["ChannelId_38"] = struct.unpack('128s', data[528:528+128])[0].decode('ascii').strip('\x00')
-        decode_data["BeamType_38"] = struct.unpack('<l', data[656:656+4])[0]
-        decode_data["Frequency_38"] = struct.unpack('<f', data[660:660+4])[0]
-        decode_data["Gain_38"] = struct.unpack('<f', data[664:664+4])[0]
-        decode_data["EquivalentBeamAngle_38"] = struct.unpack('<f', data[668:668+4])[0]
-        # transducer 2 = 200kHz
-        decode_data["ChannelId_200"] = struct.unpack('128s', data[848:848+128])[0].decode('ascii').strip('\x00')
-        decode_data["BeamType_200"] = struct.unpack('<l', data[976:976+4])[0]
-        decode_data["Frequency_200"] = struct.unpack('<f', data[980:980+4])[0]
-        decode_data["Gain_200"] = struct.unpack('<f', data[984:984+4])[0]
-        decode_data["EquivalentBeamAngle_200"] = struct.unpack('<f', data[988:988+4])[0]
-    return decode_data
+# Ecart de temps maximal entre un ping et la trame DEP0 Kongsberg associee (en s)
+REF_TOLERANCE = 0.1
 
+# Reprise de la lecture apres une trame corrompue ou tronquee (les octets ignores sont signales)
+# False pour arreter la lecture sur la premiere trame invalide
+RECOVER_CORRUPT = True
 
+# Attributs scalaires enregistres pour chaque ping (DateTime au format FILETIME)
+PING_FIELDS = [('DateTime','<u8'),('Angle','<f8'),('PowerMax','<f4'),('Depth','<f8'),('TransmitPower','<f4'),('Mode','<i2'),
+               ('TransducerDepth','<f4'),('Heave','<f4'),('Tx_Roll','<f4'),('Tx_Pitch','<f4'),('Spare1','<i2'),
+               ('Spare2','<i2'),('Rx_Roll','<f4'),('Rx_Pitch','<f4'),('Offset','<i4'),
+               ('SampleInterval','<f4'),('SoundVelocity','<f4'),('DetectFirst','<i4'),('DetectLast','<i4')]
 
-def decode_RAW0(data):
-    """
-    Cette fonction permet de decoder les trames RAW0.
+# Version des zones d'etude affectees aux pings, cf. ea400_zones.get_zones ('initiales', 'reduites', 'reduites_zone1bis', 'qgis')
+ZONES = 'initiales'
 
-    Parametres
-    ----------
-    data : string
-        trame RAW0 - portion de fichier binaire
+# Detection du fond, cf. ea400_bottom.detect_bottom : detecteur ('argmax', 'threshold', 'gradient'),
+# affinage sub-echantillon (refine) et suivi du fond (track, demi-largeur de la fenetre en echantillons)
+BOTTOM_DETECTION = {'method': 'argmax', 'refine': False, 'track': None}
 
-    Sortie
-    -------
-    decode_data : dictionary
-        dictionnaire comprenant l'ensemble des donnees associees a un ping/une mesure
-
-    """
-    trame = data[:4]
-    if trame == b'RAW0':
-        decode_data={}
-        decode_data["DateTime"] = struct.unpack('<Q', data[4:4+8])[0]
-        decode_data["Channel"] = struct.unpack('<h', data[12:12+2])[0]
-        decode_data["Mode"] = struct.unpack('<h', data[14:14+2])[0]
-        decode_data["TransducerDepth"] = struct.unpack('<f', data[16:16+4])[0]
-        decode_data["Frequency"] = struct.unpack('<f', data[20:20+4])[0]
-        decode_data["TransmitPower"] = struct.unpack('<f', data[24:24+4])[0]
-        decode_data["PulseLength"] = struct.unpack('<f', data[28:28+4])[0]
-        decode_data["BandWidth"] = struct.unpack('<f', data[32:32+4])[0]
-        decode_data["SampleInterval"] = struct.unpack('<f', data[36:36+4])[0]
-        decode_data["SoundVelocity"] = struct.unpack('<f', data[40:40+4])[0]
-        decode_data["AbsorptionCoefficient"] = struct.unpack('<f', data[44:44+4])[0]
-        decode_data["Heave"] = struct.unpack('<f', data[48:48+4])[0]
-        decode_data["Tx_Roll"] = struct.unpack('<f', data[52:52+4])[0]
-        decode_data["Tx_Pitch"] = struct.unpack('<f', data[56:56+4])[0]
-        decode_data["Temperature"] = struct.unpack('<f', data[60:60+4])[0]
-        decode_data["Spare1"] = struct.unpack('<h', data[64:64+2])[0]
-        decode_data["Spare2"] = struct.unpack('<h', data[66:66+2])[0]
-        decode_data["Rx_Roll"] = struct.unpack('<f', data[68:68+4])[0]
-        decode_data["Rx_Pitch"] = struct.unpack('<f', data[72:72+4])[0]
-        decode_data["Offset"] = struct.unpack('<l', data[76:76+4])[0]
-        decode_data["Count"] = struct.unpack('<l', data[80:80+4])[0]
-        decode_data["Power"] = []
-        for i in range(decode_data["Count"]):
-            decode_data["Power"].append(struct.unpack('<h', data[84+i*2:84+i*2+2])[0]*10*np.log10(2)/256)
-    return decode_data
+# Nombre de trames RAW0 decodees en bloc (entetes et echantillons en une seule lecture)
+RAW0_BLOCK = 1024
 
+# Enregistrement des puissances dans les fichiers h5 sous forme de comptes int16 bruts (conversion en dB a la lecture)
+# False pour les enregistrer en float32 (dB)
+STORE_COUNTS = True
 
+#-------- FONCTIONS PERMETTANT DE DECODER LES DIFFERENTES TRAMES --------
 
-def decode_DEP0(data):
+def decode_CON0(data):
     """
-    Cette fonction permet de decoder les trames DEP0.
+    Cette fonction permet de decoder les trames CON0.
 
     Parametres
     ----------
     data : string
-        trame DEP0 - portion de fichier binaire
+        trame CON0 - portion de fichier binaire
 
     Sortie
     -------
     decode_data : dictionary
-        dictionnaire comprenant les donnes utiles : detection du fond et BS calcule par Kongsberg
+        dictionnaire comprenant l'ensemble des parametres d'acquisition
 
     """
     trame = data[:4]
-    if trame == b'DEP0':
+    if trame == b'CON0':
         decode_data={}
-        decode_data["DateTime"] = struct.unpack('<Q', data[4:4+8])[0]
-        decode_data["NbChannel"] = struct.unpack('<I', data[12:12+4])[0]
-        # transducer 1 = 38kHz
-        decode_data["Depth_38"] = struct.unpack('<f', data[16:16+4])[0]
-        decode_data["BS_38"] = struct.unpack('<f', data[20:20+4])[0]
-        decode_data["Param2_38"] = struct.unpack('<f', data[24:24+4])[0]
-        # transducer 2 = 200kHz
-        decode_data["Depth_200"] = struct.unpack('<f', data[28:28+4])[0]
-        decode_data["BS_200"] = struct.unpack('<f', data[32:32+4])[0]
-        decode_data["Param2_200"] = struct.unpack('<f', data[36:36+4])[0]
+        # un seul appel pour l'entete, puis un appel par transducteur
+        (_, decode_data["DateTime"], survey, transect, sounder, version, spare,
+         decode_data["TransducerCount"]) = CON0_HEADER.unpack_from(data)
+        decode_data["SurveyName"] = survey.decode('ascii').strip('\x00')
+        decode_data["TransectName"] = transect.decode('ascii').strip('\x00')
+        decode_data["SounderName"] = sounder.decode('ascii').strip('\x00')
+        decode_data["Spare"] = spare.decode('ascii').strip('\x00')
+        # transducer 1 = 38kHz ; transducer 2 = 200kHz
+        for freq, offset in CON0_TRANSDUCER_OFFSETS.items():
+            (channel_id, decode_data["BeamType_"+freq], decode_data["Frequency_"+freq], decode_data["Gain_"+freq],
+             decode_data["EquivalentBeamAngle_"+freq]) = CON0_TRANSDUCER.unpack_from(data, offset)
+            decode_data["ChannelId_"+freq] = channel_id.decode('ascii').strip('\x00')
     return decode_data
 
     
 #--------------- FONCTIONS PERMETTANT DE LIRE LES DONNEES ------------------  
     
 
-def read_RAWfile(f,line,channel,range_detection,depth_max_toSave,angle):
+def read_RAWfile(f,line,channels,range_detection,depth_max_toSave,angle):
     """
     Cette fonction permet de lire un fichier .raw, puis elle enregistre les donnees dans des dictionnaires.
+    Le fichier est lu une seule fois : les pings de chaque canal demande sont repartis au fil de la lecture.
    
 
     Parametres
@@ -161,7 +111,7 @@ def read_RAWfile(f,line,channel,range_detection,depth_max_toSave,angle):
         fichier .raw issu de l'EA400 et ouvert grace a : open(filepath, 'rb')
     line : string
         identifiant du fichier de donnees, ici nom de la ligne, par ex : 'L0006'
-    channel : list of int
+    channels : list of int
         liste des canaux que l'on souhaite lire, par ex : [1,2] [1], ou [2] avec {1:38kHz ; 2:200kHz}
     range_detection : list of int
         intervalle de profondeur utilise pour la detection du fond, par ex : [5,100]
@@ -173,35 +123,30 @@ def read_RAWfile(f,line,channel,range_detection,depth_max_toSave,angle):
     Sorties
     -------
     d_param : dictionary
-        dictionnaire comprenant tous les parametres d'acquisition respectifs a une ligne de leve
+        dictionnaire comprenant tous les parametres d'acquisition respectifs a une ligne de leve, pour chaque canal : d_param[channel][line]
     d_power : dictionary
-        dictionnaire comprenant l'ensemble des donnees acoustiques mesurees pendant une ligne
+        dictionnaire comprenant l'ensemble des donnees acoustiques mesurees pendant une ligne, pour chaque canal : d_power[channel][line]
     
     """
     #-------------Definition des variables -----------
     
     nb_con , nb_tag , nb_nme , nb_raw , nb_svp , nb_dep = 0,0,0,0,0,0 # compteurs de trames
-    ping=0  # compteur de ping
+    RAW0_datagrams = [] # trames RAW0 en attente de decodage
+    decoded_CON0 = None # parametres d'acquisition, None tant qu'aucune trame CON0 n'a ete decodee
+    nb_raw_ignored = 0 # trames RAW0 ignorees faute de trame CON0 (trame CON0 corrompue)
     
-    # Origine des dates
-    origine_1601 = dt.datetime(year=1601,month=1,day=1,hour = 0,minute = 0,second = 0)
         
 
-    # Dictionnaires a remplir 
-    d_power = {}
-    d_param = {}
+    # Dictionnaires a remplir, un dictionnaire par canal 
+    d_power = {channel: {} for channel in channels}
+    d_param = {channel: {} for channel in channels}
+    # Accumulateurs des donnees des pings de chaque canal (convertis en DataFrame a la fin du fichier)
+    pings = {channel: PingAccumulator(PING_FIELDS, sample_fields=['Power']) for channel in channels}
     #--------------------------------------------------
 
-    data = f.read(4 * 1) # Debut de la lecture des donnees 
-    
-    while len(data)==4 : # Tant qu'il y a toujours des donnees a lire
-        
-        # on lit la longueur de la trame precisee au debut
-        lengths, = struct.unpack('<l', data)
-        # on isole la trame dans data
-        data = f.read(lengths*1)
-        
-        trame = data[:4]
+    # Lecture des trames au fil du fichier
+    report = {} # octets ignores dans les zones corrompues du fichier
+    for trame, data in iter_datagrams(f, recover=RECOVER_CORRUPT, report=report):
 
         if trame == b'CON0':
             nb_con+=1      
@@ -218,117 +163,141 @@ def read_RAWfile(f,line,channel,range_detection,depth_max_toSave,angle):
         
         elif trame == b'RAW0':
             nb_raw+=1
-            # on decode la trame RAW0
-            decoded_RAW0 = decode_RAW0(data)
-        
-            # Variables 
-            dateTime_ms = (decoded_RAW0["DateTime"]) // 10 # conversion de l'heure de dixieme de ms en ms
-            sample_int = decoded_RAW0["SampleInterval"]
-            sound_vel = decoded_RAW0["SoundVelocity"]
-            power = decoded_RAW0["Power"]
-            
-            # Conversion des profondeurs en indices
-            i_max_save = round( 2*depth_max_toSave / (sample_int * sound_vel)) #i_borne_prof
-            i_min_detect = round( 2*range_detection[0] / (sample_int * sound_vel))
-            i_max_detect = round( 2*range_detection[1] / (sample_int * sound_vel))
-            
-
-        
-            if decoded_RAW0["Channel"]==channel: # si la trame est dans la frequence choisie
-            
-                
-                if len(power)!=0:
-                    ping += 1
-                   
-
-                    # Detection du fond = max de puissance dans l'intervalle range_detect
-                    save_power_list = power[:i_max_save+1] # puissance a sauvegarder
-                    detect_power_list = power[i_min_detect:i_max_detect+1] # puissance pour detetction du fond
-                    max_power = max(detect_power_list) # maximum de puissance dans detect_power_list
-                    i_max_power = i_min_detect + detect_power_list.index(max_power) # indice du max
-                    prof_max_power = i_max_power * sample_int * sound_vel / 2 # profondeur du max
-
-
-                    # - - - Stockage des donnees dans les dictionnaires d_param et d_power - - - #
-                    
-                    # sauvegarde de Power dans un dictionnaire dont la clef est le nom de la ligne
-                    # sous forme de dataframe dont l'index est le numero du ping  
-     
-
-                        
-                    if line not in d_power: # lorsqu'on traite un nouveau fichier, on crée un nouveau DataFrame dans d_power
-                        # Initialisation du DataFrame pour d_param, definition des variables
-                        d_param[line] = pandas.DataFrame( columns= ['SurveyName','TransectName','SounderName','TransducerCount',
-                                                                    'Frequency_38','Gain_38','EquivalentBeamAngle_38',
-                                                                    'Frequency_200','Gain_200','EquivalentBeamAngle_200',
-                                                                    'Channel','Frequency','Angle',
-                                                                    'SampleInterval','SoundVelocity','PulseLength',
-                                                                    'BandWidth','AbsorptionCoefficient','Count',
-                                                                    'Mode','DepthMaxSave','DepthMinDetect','DepthMaxDetect'])
-                        
-                        # Enregistrement des metedonnees dans d_param
-                        d_param[line].loc['param'] = [decoded_CON0['SurveyName'],decoded_CON0['TransectName'],decoded_CON0['SounderName'],decoded_CON0['TransducerCount'],
-                                  decoded_CON0['Frequency_38'],decoded_CON0['Gain_38'],decoded_CON0['EquivalentBeamAngle_38'],
-                                  decoded_CON0['Frequency_200'],decoded_CON0['Gain_200'],decoded_CON0['EquivalentBeamAngle_200'],  
-                                  channel,decoded_RAW0["Frequency"],angle[line],
-                                  decoded_RAW0['SampleInterval'],decoded_RAW0['SoundVelocity'],decoded_RAW0['PulseLength'],
-                                  decoded_RAW0['BandWidth'],decoded_RAW0['AbsorptionCoefficient'],decoded_RAW0['Count'],
-                                  decoded_RAW0['Mode'],depth_max_toSave,range_detection[0],range_detection[1]]
-
-                    
-                        # Initialisation du DataFrame pour d_power, definition des variables
-                        d_power[line] = pandas.DataFrame( columns= ['DateTime','Angle','Power','PowerDetectInterval','PowerMax','Depth',
-                                                                    'TransmitPower','Mode','TransducerDepth',
-                                                                    'Heave','Tx_Roll','Tx_Pitch','Spare1','Spare2',
-                                                                    'Rx_Roll','Rx_Pitch','Offset'])
-                            
-                        # Enregistrement des donnees dans d_power
-                        d_power[line].loc[ping,'DateTime'] = origine_1601 + dt.timedelta(microseconds = dateTime_ms)
-                        d_power[line].loc[ping,'Angle'] = angle[line]
-                        d_power[line].loc[ping,'Power'] = save_power_list
-                        d_power[line].loc[ping,'PowerDetectInterval'] = detect_power_list
-                        d_power[line].loc[ping,'PowerMax'] = max_power
-                        d_power[line].loc[ping,'Depth'] = prof_max_power
-                        d_power[line].loc[ping,'TransmitPower'] = decoded_RAW0['TransmitPower']
-                        d_power[line].loc[ping,'Mode'] = decoded_RAW0['Mode']
-                        d_power[line].loc[ping,'TransducerDepth'] = decoded_RAW0['TransducerDepth']
-                        d_power[line].loc[ping,'Heave'] = decoded_RAW0['Heave']
-                        d_power[line].loc[ping,'Tx_Roll'] = decoded_RAW0['Tx_Roll']
-                        d_power[line].loc[ping,'Tx_Pitch'] = decoded_RAW0['Tx_Pitch']  
-                        d_power[line].loc[ping,'Spare1'] = decoded_RAW0['Spare1']  
-                        d_power[line].loc[ping,'Spare2'] = decoded_RAW0['Spare2']  
-                        d_power[line].loc[ping,'Rx_Roll'] = decoded_RAW0['Rx_Roll']
-                        d_power[line].loc[ping,'Rx_Pitch'] = decoded_RAW0['Rx_Pitch']     
-                        d_power[line].loc[ping,'Offset'] = decoded_RAW0['Offset']
-                        
-
-                    # - - - end Stockage - - - #   
+            if decoded_CON0 is None: # parametres d'acquisition inconnus : ping ignore
+                nb_raw_ignored+=1
+                continue
+            # trame conservee puis decodee en bloc avec les suivantes (entetes et echantillons en une fois)
+            RAW0_datagrams.append(data)
+            if len(RAW0_datagrams) == RAW0_BLOCK:
+                add_RAW0_pings(pings,RAW0_datagrams,line,channels,d_param,decoded_CON0,range_detection,depth_max_toSave,angle)
+                RAW0_datagrams = []
                    
                
-        data = f.read(4 * 1)  # Poursuite de la lecture
-        # on lit la longueur de la trame precisee à la fin
-        lengthf, = struct.unpack('<l', data)
-        
-        if lengthf != lengths: # on vérifie que l'identifiant est le même au début et à la fin
-            raise Exception('Length problem') 
-        data = f.read(4 * 1) # Poursuite de la lecture
-        
-        #----------------- FIN BOUCLE WHILE -----------------
+        #----------------- FIN BOUCLE FOR -----------------
+
+    # Decodage des dernieres trames RAW0
+    add_RAW0_pings(pings,RAW0_datagrams,line,channels,d_param,decoded_CON0,range_detection,depth_max_toSave,angle)
+
+    
+    # - - - Construction du DataFrame d_power en une seule fois - - - #
+    for channel in channels:
+        if pings[channel].n_ping == 0:
+            continue
+        # Detection du fond en une fois sur la matrice (ping x echantillon), dans l'intervalle de detection de chaque ping
+        columns, samples, n_samples = pings[channel].to_arrays()
+        i_detect, columns['PowerMax'][:] = detect_bottom(samples['Power'], columns['DetectFirst'], columns['DetectLast'], **BOTTOM_DETECTION)
+        columns['Depth'][:] = i_detect * columns['SampleInterval'] * columns['SoundVelocity'] / 2
+        # DataFrame dont l'index est le numero du ping
+        d_power[channel][line] = pings[channel].to_dataframe(columns= ['DateTime','Angle','Power','PowerDetectInterval','PowerMax','Depth','DetectFirst','DetectLast',
+                                                                      'TransmitPower','Mode','TransducerDepth',
+                                                                      'Heave','Tx_Roll','Tx_Pitch','Spare1','Spare2',
+                                                                      'Rx_Roll','Rx_Pitch','Offset'],
+                                                             index = np.arange(1, pings[channel].n_ping+1))
+        # conversion en une fois des dates FILETIME en datetime64
+        d_power[channel][line]['DateTime'] = filetime_to_datetime64(d_power[channel][line]['DateTime'].values)
 
-    
     # Nombre de trames au total
     nb_tot = nb_con + nb_tag + nb_nme + nb_raw + nb_svp + nb_dep 
     # Affiche le nom du fichier traité et le nombre de trames qu'il contient
     print('\nFichier : ',f.name)
     print('nb_tot : ',nb_tot,'\nnb_con : ' ,nb_con, '\nnb_tag : ',nb_tag , '\nnb_nme : ',nb_nme , '\nnb_raw : ',nb_raw ,'\nnb_svp : ', nb_svp,'\nnb_dep : ',nb_dep)
+    if report:
+        print('octets ignores : ',report['skipped_bytes'],' (',report['n_resync'],' zones corrompues)')
+    if nb_raw_ignored:
+        print('trames RAW0 ignorees (aucune trame CON0 valide avant elles) : ',nb_raw_ignored)
     
     return d_param , d_power
 
 
+def add_RAW0_pings(pings,datagrams,line,channels,d_param,decoded_CON0,range_detection,depth_max_toSave,angle):
+    """
+    Cette fonction permet d'ajouter un bloc de trames RAW0 aux donnees des pings de chaque canal.
+    Les entetes et les echantillons du bloc sont decodes en une fois (cf. ea400_datagrams.decode_RAW0_datagrams),
+    puis les indices de sauvegarde et de l'intervalle de detection du fond sont calcules pour tous les pings du bloc.
+
+    Parametres
+    ----------
+    pings : dictionary
+        accumulateur des donnees des pings de chaque canal (PingAccumulator), complete
+    datagrams : list of bytes
+        trames RAW0 du bloc, dans l'ordre du fichier
+    line : string
+        identifiant de la ligne de leve, par ex : 'L0006'
+    channels : list of int
+        liste des canaux que l'on souhaite lire, par ex : [1,2] avec {1:38kHz ; 2:200kHz}
+    d_param : dictionary
+        parametres d'acquisition de chaque canal, completes au premier ping de la ligne : d_param[channel][line]
+    decoded_CON0 : dictionary
+        parametres d'acquisition de la trame CON0, cf. decode_CON0
+    range_detection : list of int
+        intervalle de profondeur utilise pour la detection du fond, par ex : [5,100]
+    depth_max_toSave : int
+        profondeur seuil pour la sauvegarde des donnees
+    angle : dictionary
+        angle du faisceau de chaque ligne de leve, par ex : {'L0006': 0}
+
+    """
+    headers, counts, n_count = decode_RAW0_datagrams(datagrams)
+
+    # Conversion des profondeurs en indices
+    step = headers['SampleInterval'].astype(np.float64) * headers['SoundVelocity'].astype(np.float64)
+    i_max_save = np.rint(2*depth_max_toSave / step).astype(np.int64) # i_borne_prof
+    i_min_detect = np.rint(2*range_detection[0] / step).astype(np.int64)
+    i_max_detect = np.rint(2*range_detection[1] / step).astype(np.int64)
+
+    for channel in channels:
+        keep = (headers['Channel'] == channel) & (n_count > 0) # pings du canal ayant des echantillons
+        if not np.any(keep):
+            continue
+        h = headers[keep]
+
+        # Puissance sauvegardee, jusqu'a la plus grande des profondeurs depth_max_toSave et range_detection[1] :
+        # l'intervalle de detection du fond (PowerDetectInterval) est une vue sur ce signal.
+        # La detection du fond est faite sur tous les pings a la fin de la lecture
+        n_save = np.minimum(n_count[keep], np.maximum(i_max_save[keep], i_max_detect[keep]) + 1)
+        power = counts[keep, :n_save.max()].astype(np.float32) * POWER_SCALE
+        power[np.arange(power.shape[1]) >= n_save[:, None]] = np.nan
+
+        if line not in d_param[channel]: # lorsqu'on traite un nouveau fichier, on enregistre les metadonnees du premier ping
+            first = {name: h[name][0].item() for name in RAW0_HEADER_DTYPE.names}
+            # Initialisation du DataFrame pour d_param, definition des variables
+            d_param[channel][line] = pandas.DataFrame( columns= ['SurveyName','TransectName','SounderName','TransducerCount',
+                                                        'Frequency_38','Gain_38','EquivalentBeamAngle_38',
+                                                        'Frequency_200','Gain_200','EquivalentBeamAngle_200',
+                                                        'Channel','Frequency','Angle',
+                                                        'SampleInterval','SoundVelocity','PulseLength',
+                                                        'BandWidth','AbsorptionCoefficient','Count',
+                                                        'Mode','DepthMaxSave','DepthMinDetect','DepthMaxDetect'])
+            
+            # Enregistrement des metedonnees dans d_param
+            d_param[channel][line].loc['param'] = [decoded_CON0['SurveyName'],decoded_CON0['TransectName'],decoded_CON0['SounderName'],decoded_CON0['TransducerCount'],
+                      decoded_CON0['Frequency_38'],decoded_CON0['Gain_38'],decoded_CON0['EquivalentBeamAngle_38'],
+                      decoded_CON0['Frequency_200'],decoded_CON0['Gain_200'],decoded_CON0['EquivalentBeamAngle_200'],  
+                      channel,first["Frequency"],angle[line],
+                      first['SampleInterval'],first['SoundVelocity'],first['PulseLength'],
+                      first['BandWidth'],first['AbsorptionCoefficient'],first['Count'],
+                      first['Mode'],depth_max_toSave,range_detection[0],range_detection[1]]
+
+        # Enregistrement des donnees des pings dans l'accumulateur
+        pings[channel].extend({'DateTime': h['DateTime'], 'Angle': angle[line],
+                               'SampleInterval': h['SampleInterval'], 'SoundVelocity': h['SoundVelocity'],
+                               'DetectFirst': i_min_detect[keep], 'DetectLast': i_max_detect[keep],
+                               'TransmitPower': h['TransmitPower'], 'Mode': h['Mode'],
+                               'TransducerDepth': h['TransducerDepth'], 'Heave': h['Heave'],
+                               'Tx_Roll': h['Tx_Roll'], 'Tx_Pitch': h['Tx_Pitch'],
+                               'Spare1': h['Spare1'], 'Spare2': h['Spare2'],
+                               'Rx_Roll': h['Rx_Roll'], 'Rx_Pitch': h['Rx_Pitch'],
+                               'Offset': h['Offset']},
+                              {'Power': (power, n_save)})
+    return None
+
+
 def getTrajectory(qinsy_path,line):
     """
     Cette fonction permet de lire les donnees de positionnement et d'attitude enregistrees par Qinsy
     et de les rassembler dans un dictionnaire consacre aux donnees de positionnement.
+    Les fichiers texte sont lus par ea400_qinsy.read_qinsy : les colonnes lues sont sauvegardees dans un fichier
+    annexe (.nav.npz) relu tant que les fichiers texte n'ont pas change.
     
     Parametres
     ----------
@@ -345,26 +314,13 @@ def getTrajectory(qinsy_path,line):
     """
     # dictionnaire a remplir    
     d_traj = {}
-    # fichiers a traiter
-    gyro = glob.glob(qinsy_path+line+'*.Ekinox2_gyro.txt')[0] # gyrometres
-    pos = glob.glob(qinsy_path+line+'*.Ekinox2_pos.txt')[0] # position
-    prh = glob.glob(qinsy_path+line+'*.Ekinox2_PRH.txt')[0] # attitude
-    
-    # donnees des gyrometres
-    pd_gyro = pandas.read_csv(gyro,skiprows=4,sep=',',names=['DateTime','Gyro','a'])
-    pd_gyro = pd_gyro[['DateTime','Gyro']]
-    pd_gyro['DateTime'] = pandas.to_datetime(pd_gyro['DateTime'], format='%d/%m/%Y %H:%M:%S.%f')
-    # donnees de position
-    pd_pos = pandas.read_csv(pos,skiprows=10,sep=',',names=['DateTime','Latitude','Longitude','Easting','Northing','Height','a','b','c'])
-    pd_pos = pd_pos[['DateTime','Latitude','Longitude','Easting','Northing','Height']]
-    pd_pos['DateTime'] = pandas.to_datetime(pd_pos['DateTime'], format='%d/%m/%Y %H:%M:%S.%f')
-    # donnees d'attitude des accelerometres
-    pd_prh = pandas.read_csv(prh,skiprows=8,sep=',',names=['DateTime','Pitch','a','Roll','b','Heave','c'])
-    pd_prh = pd_prh[['DateTime','Pitch','Roll','Heave']]
-    pd_prh['DateTime'] = pandas.to_datetime(pd_prh['DateTime'], format='%d/%m/%Y %H:%M:%S.%f')
-    
-    merge1 = pd_gyro.merge(pd_pos, on=['DateTime'])
-    allTrajData = merge1.merge(pd_prh, on=['DateTime'])
+    # lecture des fichiers gyrometres, position et attitude des accelerometres
+    nav = read_qinsy(qinsy_path, line)
+    # appariement des trois flux sur les dates des positions, a la mesure la plus proche (tolerance ALIGN_TOLERANCE)
+    allTrajData, report = align_streams({'pos': nav['pos'], 'gyro': nav['gyro'], 'prh': nav['prh']}, reference='pos')
+    if report['dropped'] > 0 or report['gyro']['unused'] > 0 or report['prh']['unused'] > 0:
+        print('Ligne '+line+' : '+str(report['dropped'])+' positions sans gyro ou attitude, mesures non utilisees : '
+              +str(report['gyro']['unused'])+' gyro, '+str(report['prh']['unused'])+' attitude')
     
     if line not in d_traj:
             
@@ -408,31 +364,13 @@ def interpolate(d_power,d_traj,line):
     # Recuperation des donnees
     df1 = d_power[line]
     df2 = d_traj[line]
-    origine = dt.datetime(year=2020, month=10, day=1)  # origine arbitraire fixée au 1 er octobre
-    # Liste des dates de mesures de positions GNSS
-    temps_pos = df2[['DateTime', 'X', 'Y','Height','Gyro','Pitch','Roll','Heave']].copy()
-    temps_pos['DateTime'] = temps_pos['DateTime']- origine
-    temps_pos['DateTime'] = temps_pos['DateTime'].dt.total_seconds()
-    # Liste des dates de mesures acoustiques
-    temps_ping = df1['DateTime']
-    temps_ping = temps_ping - origine
-    temps_ping = temps_ping.dt.total_seconds()
-    df1['DateTime'] = temps_ping
-    
-    # Initialisation de DataFrame
-    f1 = pandas.DataFrame(np.array(temps_ping.values), columns=['DateTime']) # donnees EA400
-    temp = np.array(temps_pos.values)
-    f2 = pandas.DataFrame(temp, columns=['DateTime', 'X', 'Y','Height','Gyro','Pitch','Roll','Heave']) # donnees trajectoire
-    # Interpolation des donnees
-    F = f1.append(f2)
-    F.set_index('DateTime', inplace=True)
-    F = F.sort_index()
-    F.interpolate(method='linear', limit_direction='backward', inplace=True)
-    F.index.names = ['time']
-    F['DateTime'] = F.index
-    # Donnees en sortie
-    result = pandas.merge(df1, F, on=['DateTime'])
-    result['DateTime'] = pandas.to_datetime(result['DateTime'], unit='s', origin=origine)
+    # Interpolation aux dates des pings (angles deroules, attitude par SLERP), cf. ea400_nav.interpolate_nav
+    nav = interpolate_nav(df1['DateTime'].values, df2['DateTime'].values, df2, NAV_COLUMNS)
+    # Donnees en sortie : les attributs presents dans les deux tables (Heave) sont suffixes _x (EA400) et _y (trajectoire)
+    common = [name for name in NAV_COLUMNS if name in df1.columns]
+    result = df1.rename(columns={name: name+'_x' for name in common})
+    nav = pandas.DataFrame({name+'_y' if name in common else name: nav[name] for name in NAV_COLUMNS}, index=df1.index)
+    result = pandas.concat([result, nav], axis=1)
     d_power[line] = result
     return d_power
 
@@ -456,27 +394,8 @@ def addZone(d_power,line):
 
     """
     data = d_power[line]
-    data['Zone'] = np.zeros((data.shape[0]))
-    # Definition des zones d'etude
-    zone1 = Polygon([[147932, 6830864], [147826, 6830989], [148120, 6831205], [148214, 6831077]])
-    zone2 = Polygon([[148026, 6830005], [147945, 6830093], [148170, 6830312], [148255, 6830225]])
-    zone3 = Polygon([[147591, 6829582], [147512, 6829661], [147741, 6829883], [147819, 6829805]])
-    zone4 = Polygon([[147099, 6829122], [147027, 6829206], [147227, 6829382], [147299, 6829303]])
-    zone5 = Polygon([[146456, 6830591], [146434, 6830713], [146726, 6830760], [146754, 6830635 ]])
-    # Valeur de l'attribut Zone en fonction de la position des sondes
-    for index, row in data.iterrows():
-        ping = Point(row['X'],row['Y'])
-        if zone1.contains(ping):
-            row['Zone']=1
-        elif zone2.contains(ping):
-            row['Zone']=2
-        elif zone3.contains(ping):
-            row['Zone']=3
-        elif zone4.contains(ping):
-            row['Zone']=4
-        elif zone5.contains(ping):
-            row['Zone']=5
-        data.at[index]=row
+    # Valeur de l'attribut Zone en fonction de la position des sondes (int8, 0 hors des zones)
+    data = add_zone(data, ZONES, 'ship')
 
     d_power[line] = data
     return d_power
@@ -503,57 +422,25 @@ def read_OUTfile(f,line):
     """
     #-------------Definition des variables -----------
     
-    nb_con , nb_tag , nb_nme , nb_raw , nb_svp , nb_dep = 0,0,0,0,0,0 # compteurs de trames
-    # Initialisation des listes
-    L_time , L_depth38, L_depth200, L_BS38, L_BS200 = [],[],[],[],[]
-    # Origine des dates
-    origine_1601 = dt.datetime(year=1601,month=1,day=1,hour = 0,minute = 0,second = 0)
     # Dictionnaire a remplir
     d_out = {}
     
     #-------------------------------------------------
     
-    data = f.read(4 * 1) # Debut de la lecture des donnees 
+    # Index des trames du fichier (relu depuis le fichier annexe s'il est a jour)
+    report = {} # octets ignores dans les zones corrompues du fichier
+    index = load_index(f.name, recover=RECOVER_CORRUPT, report=report)
+    # compteurs de trames
+    counts = count_datagrams(index)
+    nb_con , nb_tag , nb_nme , nb_raw , nb_svp , nb_dep = [counts.get(t,0) for t in ['CON0','TAG0','NME0','RAW0','SVP0','DEP0']]
     
-    while len(data)==4 : # Tant qu'il y a toujours des donnees a lire
-        
-        # on lit la longueur de la trame precisee au debut
-        lengths, = struct.unpack('<l', data)
-        # on isole la trame dans data
-        data = f.read(lengths*1)
-        
-        trame = data[:4]
-
-        if trame == b'CON0':
-            nb_con+=1      
-        elif trame == b'TAG0':
-            nb_tag+=1
-        elif trame == b'NME0':
-            nb_nme+=1
-        elif trame == b'RAW0':
-            nb_raw+=1
-        elif trame == b'SVP0':
-            nb_svp+=1
-        elif trame == b'DEP0':
-            nb_dep+=1
-            # on decode la trame DEP0
-            decoded_DEP0 = decode_DEP0(data)
-            time_ms = (decoded_DEP0['DateTime']) //10 # conversion des dates en ms
-            L_time.append(origine_1601 + dt.timedelta(microseconds = time_ms))
-            L_depth38.append(decoded_DEP0['Depth_38'])
-            L_depth200.append(decoded_DEP0['Depth_200'])
-            L_BS38.append(decoded_DEP0['BS_38'])
-            L_BS200.append(decoded_DEP0['BS_200'])
-            
-        data = f.read(4 * 1)  # Poursuite de la lecture
-        # on lit la longueur de la trame precisee à la fin
-        lengthf, = struct.unpack('<l', data)
-        
-        if lengthf != lengths: # on vérifie que l'identifiant est le même au début et à la fin
-            raise Exception('Length problem') 
-        data = f.read(4 * 1) # Poursuite de la lecture
-        
-        #----------------- FIN BOUCLE WHILE -----------------
+    # Lecture directe des trames DEP0 : decodage de toutes les trames en un seul tableau
+    decoded_DEP0 = read_headers(f.name, select_datagrams(index, types=['DEP0']), DEP0_DTYPE)
+    L_time = filetime_to_datetime64(decoded_DEP0['DateTime']) # conversion en une fois des dates FILETIME en datetime64
+    L_depth38 = decoded_DEP0['Depth_38']
+    L_depth200 = decoded_DEP0['Depth_200']
+    L_BS38 = decoded_DEP0['BS_38']
+    L_BS200 = decoded_DEP0['BS_200']
     
 
     if line not in d_out:
@@ -570,12 +457,87 @@ def read_OUTfile(f,line):
     # Affiche le nom du fichier traité et le nombre de trames qu'il contient
     print('\nFichier : ',f.name)
     print('nb_tot : ',nb_tot,'\nnb_con : ' ,nb_con, '\nnb_tag : ',nb_tag , '\nnb_nme : ',nb_nme , '\nnb_raw : ',nb_raw ,'\nnb_svp : ', nb_svp,'\nnb_dep : ',nb_dep)
+    if report:
+        print('octets ignores : ',report['skipped_bytes'],' (',report['n_resync'],' zones corrompues)')
     
     return d_out
     
    
     
-def save_RAWbdd(outpath,channel,d_param,d_power,d_traj):
+def read_REFfile(fileRAW,line):
+    """
+    Cette fonction permet de lire les references Kongsberg (trames DEP0) du fichier .out associe a un fichier .raw
+    (meme nom, extension .out).
+
+    Parametres
+    ----------
+    fileRAW : string
+        chemin vers le fichier .raw
+    line : string
+        identifiant de la ligne de leve, par ex : 'L0006'
+
+    Sortie
+    -------
+    d_out : dictionary
+        dictionnaire comprenant les donnees des trames DEP0, cf. read_OUTfile ; None si le fichier .out est absent
+
+    """
+    fileOUT = os.path.splitext(fileRAW)[0] + '.out'
+    if not os.path.exists(fileOUT):
+        print('Pas de fichier .out associe a : '+fileRAW)
+        return None
+    with open(fileOUT, 'rb') as f:
+        d_out = read_OUTfile(f,line)
+    return d_out
+
+
+def addKongsbergRef(d_power,d_out,line,channel,tolerance=REF_TOLERANCE):
+    """
+    Cette fonction permet d'associer a chaque ping la detection du fond et le BS calcules par Kongsberg (trames DEP0 du fichier .out).
+    Pour chaque ping, on retient la trame DEP0 la plus proche dans le temps, si l'ecart est inferieur a la tolerance.
+
+    Parametres
+    ----------
+    d_power : dictionary
+        dictionnaire comprenant l'ensemble des donnees acoustiques pour chaque ping
+    d_out : dictionary
+        dictionnaire comprenant les donnees des trames DEP0, cf. read_OUTfile
+    line : string
+        identifiant de la ligne de leve
+    channel : int
+        canal des pings, par ex : 1->38kHz et 2->200kHz
+    tolerance : float
+        ecart de temps maximal entre un ping et la trame DEP0 associee (en s)
+
+    Sortie
+    -------
+    d_power : dictionary
+        dictionnaire fourni en entree avec les attributs supplementaires 'Depth_Kongsberg' et 'BS_Kongsberg'
+        (NaN si aucune trame DEP0 n'est assez proche)
+
+    """
+    # Prise en compte de la frequence
+    if channel ==1: str_freq = '_38'
+    else : str_freq = '_200'
+    
+    data = d_power[line]
+    ref = d_out[line][['DateTime','Depth'+str_freq,'BS'+str_freq]]
+    ref = ref.rename(columns={'Depth'+str_freq:'Depth_Kongsberg','BS'+str_freq:'BS_Kongsberg'})
+    ref['DateTime'] = pandas.to_datetime(ref['DateTime']).astype('datetime64[ns]')
+    
+    # Jointure sur la date la plus proche (donnees triees par date)
+    pings = data.drop(columns=['Depth_Kongsberg','BS_Kongsberg'], errors='ignore')
+    index_pings = pings.index
+    pings = pings.reset_index(drop=True)
+    pings['DateTime'] = pandas.to_datetime(pings['DateTime']).astype('datetime64[ns]')
+    result = pandas.merge_asof(pings, ref, on='DateTime', direction='nearest',
+                               tolerance=pandas.Timedelta(seconds=tolerance))
+    result.index = index_pings
+    d_power[line] = result
+    return d_power
+
+
+def save_RAWbdd(outpath,channel,d_param,d_power,d_traj,d_out=None):
     """
     Cette fonction permet de sauvegarder les donnees des fichiers .RAW rassemblees dans les dictionnaires dans des fichiers h5.
 
@@ -592,6 +554,9 @@ def save_RAWbdd(outpath,channel,d_param,d_power,d_traj):
     d_traj : dictionary
         dictionnaire comprenant l'ensemble des donnees de positionnement recueillies pendant une ligne
 
+    d_out : dictionary
+        dictionnaire comprenant les donnees des trames DEP0 (references Kongsberg), sauvegardees sous la clef 'ref' ; None si absent
+
     """
     # Prise en compte de la frequence
     if channel ==1: str_freq = '_38kHz'
@@ -607,9 +572,11 @@ def save_RAWbdd(outpath,channel,d_param,d_power,d_traj):
             
         # Creation d'un fichier de sortie h5
         store = pandas.HDFStore(outpath + fic_h5_data)
-        store['data'] = d_power[ligne]
+        put_pings(store, 'data', d_power[ligne], counts=STORE_COUNTS)
         store['trajectoire'] = d_traj[ligne]
         store['param'] = d_param[ligne]
+        if d_out is not None and ligne in d_out:
+            store['ref'] = d_out[ligne]
         store.close()
             
     return None
@@ -644,14 +611,17 @@ def check_FileExists(filepath):
     return Save
 
 
-def runDECODEandSAVE_RAWfiles(filesRAW_to_read,out_path,channels,range_detection,depth_max_toSave,angle):
+def runDECODEandSAVE_RAWfiles(filesRAW_to_read,out_path,channels,range_detection,depth_max_toSave,angle,qinsy_path):
     """
     Cette fonction permet d'executer la lecture et la sauvegarde des fichiers .RAW dans des fichiers h5.
+    Chaque fichier n'est lu qu'une seule fois, les canaux demandes sont separes pendant la lecture.
+    Si le fichier .out de la ligne est present a cote du fichier .raw, ses trames DEP0 (references Kongsberg)
+    sont associees a chaque ping et enregistrees dans le meme fichier h5 (clef 'ref').
 
     Parametres
     ----------
     filesRAW_to_read : list of string
-        liste des chemins vers les fichiers .raw a lire
+        liste des chemins vers les fichiers .raw (ou .dg) a lire
     out_path : string
         chemin vers le repertoire de sortie
     channels : list of int
@@ -662,32 +632,84 @@ def runDECODEandSAVE_RAWfiles(filesRAW_to_read,out_path,channels,range_detection
         profondeur seuil pour la sauvegarde des donnees, ne pas sauvegarder si la profondeur est superieure au seuil
     angle : dictionary
         dictionnaire associant a chaque ligne de leve, l'angle de depointage applique
+    qinsy_path : string
+        chemin vers le repertoire des donnees Qinsy
         
     """
-    for channel in channels : # on parcourt les canaux
-        for file in filesRAW_to_read : # on parcourt les fichiers de donnees .raw
-            line = os.path.basename(file)[:5]
-            print('-> Lecture du fichier RAW, Ligne : '+line+' Canal : '+str(channel))
+    for file in filesRAW_to_read : # on parcourt les fichiers de donnees .raw
+        line = os.path.basename(file)[:5]
+        print('-> Lecture du fichier RAW, Ligne : '+line+' Canaux : '+str(channels))
+        if file.endswith('.dg'): # fichier .dg : memes donnees par ping que les fichiers .raw
+            d_param,d_power = read_DGfile(file,line,channels,range_detection,depth_max_toSave,angle=angle,detection=BOTTOM_DETECTION)
+        else:
             # Ouverture du fichier
             f = open(file, 'rb')
-            # lecture des .raw et remplissage des dictionnaires d_power et d_param :
-            d_power,d_param = read_RAWfile(f,line,channel,range_detection,depth_max_toSave,angle)
-            # lecture des fichiers qinsy et remplissage de d_traj
-            d_traj = getTrajectory(qinsy_path,line)
-            print('Lecture achevee')
+            # lecture des .raw en une seule passe pour tous les canaux et remplissage des dictionnaires d_power et d_param :
+            d_param,d_power = read_RAWfile(f,line,channels,range_detection,depth_max_toSave,angle)
+            f.close()
+        # lecture des references Kongsberg du fichier .out associe
+        d_out = read_REFfile(file,line)
+        # lecture des fichiers qinsy et remplissage de d_traj
+        d_traj = getTrajectory(qinsy_path,line)
+        print('Lecture achevee')
+        for channel in channels : # on parcourt les canaux
+            if line not in d_power[channel]: # aucun ping dans ce canal
+                continue
+            if d_out is not None:
+                # association des references Kongsberg a chaque ping
+                d_power[channel] = addKongsbergRef(d_power[channel],d_out,line,channel)
             # interpolation des donnees de position
-            interpolate(d_power,d_traj,line)
+            interpolate(d_power[channel],d_traj,line)
             print('Interpolation achevee')
             # ajout de la zone
-            d_power = addZone(d_power,line)
+            d_power[channel] = addZone(d_power[channel],line)
             print('Ajout Zone achevee')
             print('-> Sauvegarde du fichier RAW, Ligne : '+line+' Canal : '+str(channel))
             # Enregistrement des donnees dans des fichiers h5
-            save_RAWbdd(out_path,channel,d_param,d_power,d_traj)
+            save_RAWbdd(out_path,channel,d_param[channel],d_power[channel],d_traj,d_out)
             print('Sauvegarde achevee')
     return None
 
 
+def runDECODEandSAVE_RAWfiles_parallel(filesRAW_to_read,out_path,channels,range_detection,depth_max_toSave,angle,qinsy_path,n_workers=None):
+    """
+    Cette fonction permet d'executer la lecture et la sauvegarde des fichiers .RAW en parallele, une ligne de leve par processus.
+    Les fichiers d'une meme ligne sont traites dans l'ordre par le meme processus : les noms des fichiers de sortie
+    (_data.h5 puis _data2.h5) ne dependent donc pas de l'ordre d'execution. Une ligne en erreur est signalee sans interrompre les autres.
+
+    Parametres
+    ----------
+    filesRAW_to_read : list of string
+        liste des chemins vers les fichiers .raw a lire
+    out_path : string
+        chemin vers le repertoire de sortie
+    channels : list of int
+        liste des canaux que l'on souhaite lire, par ex : [1,2] [1], ou [2] avec {1:38kHz ; 2:200kHz}
+    range_detection : list of int
+        intervalle de profondeur utilise pour la detection du fond, par ex : [5,100]
+    depth_max_toSave : int
+        profondeur seuil pour la sauvegarde des donnees, ne pas sauvegarder si la profondeur est superieure au seuil
+    angle : dictionary
+        dictionnaire associant a chaque ligne de leve, l'angle de depointage applique
+    qinsy_path : string
+        chemin vers le repertoire des donnees Qinsy
+    n_workers : int
+        nombre de processus, None pour utiliser tous les coeurs disponibles
+
+    Sortie
+    -------
+    d_report : dictionary
+        temps de calcul et erreur eventuelle pour chaque ligne, cf. ea400_batch.run_tasks
+
+    """
+    # Regroupement des fichiers par ligne de leve
+    d_files = {}
+    for file in sorted(filesRAW_to_read):
+        d_files.setdefault(os.path.basename(file)[:5], []).append(file)
+    tasks = {line: (files,out_path,channels,range_detection,depth_max_toSave,angle,qinsy_path) for line, files in d_files.items()}
+    return run_tasks(runDECODEandSAVE_RAWfiles, tasks, n_workers)
+
+
 def runDECODEandSAVE_OUTfiles(filesOUT_to_read,out_path):
     """
     Cette fonction permet d'executer la lecture et la sauvegarde des fichiers .out dans des fichiers h5.
@@ -725,7 +747,7 @@ if __name__ == '__main__':
     
     # Chemins vers les repertoires de donnees
     dir_path = './data/' # repertoire d'entree   ->>> A SPECIFIER
-    filesRAW_to_read = glob.glob(dir_path+'*.raw') # Ensemble des fichiers RAW a traiter
+    filesRAW_to_read = glob.glob(dir_path+'*.raw') # Ensemble des fichiers RAW a traiter (ou glob.glob(dir_path+'*.dg') pour les fichiers .dg)
     filesOUT_to_read = glob.glob(dir_path+'*.out') # Ensemble des fichiers OUT a traiter
     out_path = './fic_h5/' # repertoire de sortie   ->>> A SPECIFIER
     
@@ -746,11 +768,17 @@ if __name__ == '__main__':
              'L0041':25,'L0042':45,'L0043':15,'L0044':65,'L0045':5,'L0046':25,'L0047':25,'L0048':25
              }
       
-    # Lecture et Sauvegarde des fichiers .RAW
-    runDECODEandSAVE_RAWfiles(filesRAW_to_read,out_path,channels,range_detection,depth_max_toSave,angle)
+    n_workers = 1 # nombre de processus pour le decodage des fichiers .RAW (1 : lecture sequentielle)
     
-    # Lecture et Sauvegarde des fichiers .OUT
-    runDECODEandSAVE_OUTfiles(filesOUT_to_read,out_path)
+    # Lecture et Sauvegarde des fichiers .RAW
+    if n_workers == 1:
+        runDECODEandSAVE_RAWfiles(filesRAW_to_read,out_path,channels,range_detection,depth_max_toSave,angle,qinsy_path)
+    else:
+        runDECODEandSAVE_RAWfiles_parallel(filesRAW_to_read,out_path,channels,range_detection,depth_max_toSave,angle,qinsy_path,n_workers)
+    
+    # Les fichiers .OUT sont lus avec les fichiers .RAW de la meme ligne (references Kongsberg dans les fichiers h5)
+    # Export optionnel des fichiers _ref.txt
+    # runDECODEandSAVE_OUTfiles(filesOUT_to_read,out_path)
     
     # Affichage du temps de calcul
     t_end = time.time() # Fin du temps de calcul
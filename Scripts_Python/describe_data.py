@@ -10,9 +10,10 @@ import matplotlib.pyplot as plt
 import glob
 import scipy.signal as scs
 from sklearn.cluster import KMeans
-from shapely.geometry import Point, Polygon
 # Scripts
 import analyse_data as an
+from ea400_store import split_samples
+from ea400_zones import add_zone
 import script_romain as scr
 
 
@@ -50,30 +51,9 @@ def changeZone(d,line):
 
     """
     data = d[line]['data']
-    data['Zone'] = np.zeros((data.shape[0]))
-
-    # new zones
-    # zone1 = Polygon([[148111, 6831022], [148059, 6831120], [148137, 6831177], [148200, 6831088]])
-    zone2 = Polygon([[148097, 6830111], [148039, 6830173], [148119, 6830245], [148173, 6830177]])
-    zone3 = Polygon([[147665, 6829667], [147586, 6829740], [147663, 6829810], [147727, 6829746]])
-    zone4 = Polygon([[147197, 6829228], [147130, 6829306], [147200, 6829366], [147258, 6829301]])
-    zone5 = Polygon([[146527, 6830611], [146510, 6830712], [146694, 6830745], [146723, 6830635]])
-    
-    zone1 = Polygon([[147909, 6831018], [147970, 6831058], [148045, 6830968], [147981, 6830911]])
-    
-    for index, row in data.iterrows():
-        ping = Point(row['X_Beam'], row['Y_Beam'])
-        if zone1.contains(ping):
-            row['Zone'] = 1
-        elif zone2.contains(ping):
-            row['Zone'] = 2
-        elif zone3.contains(ping):
-            row['Zone'] = 3
-        elif zone4.contains(ping):
-            row['Zone'] = 4
-        elif zone5.contains(ping):
-            row['Zone'] = 5
-        data.at[index] = row
+
+    # Valeur de l'attribut Zone en fonction de la position des sondes (zones reduites, int8, 0 hors des zones)
+    data = add_zone(data, 'reduites_zone1bis', 'beam')
 
     d[line]['data'] = data
     return d
@@ -297,8 +277,9 @@ def computeDescriptors(d,lines,dref,n_moy,Freq200,NewZone,ProfRef):
 
         # données
         data = d[line]['data']
-        Power = data['Power']
         Depth = data['Depth'].values
+        # puissance en W, lue directement sous forme de matrice (ping x echantillon)
+        i, n_samples = d[line].signal('Power', linear=True)
         # paramètres
         Celerite = d[line]['param']['SoundVelocity'].values
         PulseLenght = d[line]['param']['PulseLength'].values
@@ -308,20 +289,17 @@ def computeDescriptors(d,lines,dref,n_moy,Freq200,NewZone,ProfRef):
 
         exc = False # cas L0024
 
-        # gérer l'exception de la ligne 24
-        power = np.array([np.array(li) for li in Power]).T
-        if line=='L0024' or len(power.shape)==1:
-            Power = Power[1:]
+        # gérer l'exception de la ligne 24 (pings de longueurs differentes)
+        if line=='L0024' or np.any(n_samples != n_samples[0]):
+            i = i[1:]
             Depth = Depth[1:]
             exc = True
 
-        Power = np.array([np.array(li[:]) for li in Power[:]]).T
-        nbSmp , nbPing = Power.shape[0] , Power.shape[1]
+        i = i.T
+        nbSmp , nbPing = i.shape[0] , i.shape[1]
 
         time = np.arange(0, int(nbSmp), 1) * SampleInterval
 
-        # conversion de dB en W
-        i = 10 ** (Power / 10)
         if ProfRef:
             # calcul profondeur de reference
             i_filtred = scr.compute_Pref(i,Depth,time,nbPing,nbSmp,dref,n_moy)
@@ -332,20 +310,18 @@ def computeDescriptors(d,lines,dref,n_moy,Freq200,NewZone,ProfRef):
         # calcul de la pente
         P = scr.compute_pente(i_filtred, Celerite, PulseLenght, time, nbPing, dref)
 
-        i_filtred = 10 * np.log10(i_filtred)
-        i_filtred = [list(i_filtred[:, i]) for i in range(nbPing)]
+        i_filtred = (10 * np.log10(i_filtred)).T
 
-        if exc:
-            i_filtred.insert(0, [0] * nbSmp)
-            Power = [list(Power[:, i]) for i in range(nbPing)]
-            Power.insert(0, [0] * nbSmp)
-            data['Power'] = Power
+        if exc: # premier ping ecarte : puissance nulle
+            i_filtred = np.vstack([np.zeros((1, nbSmp), dtype=i_filtred.dtype), i_filtred])
             E1.insert(0,0)
             E2.insert(0,0)
             E3.insert(0,0)
             P.insert(0, 0)
 
-        data['Power_ProfRef'] = i_filtred
+        n_ProfRef = np.full(len(i_filtred), nbSmp, dtype=np.int32)
+        d[line].set_signal('Power_ProfRef', i_filtred, n_ProfRef)
+        data['Power_ProfRef'] = split_samples(i_filtred, n_ProfRef)
         data['E1'] = E1
         data['E2'] = E2
         data['E3'] = E3
@@ -394,17 +370,56 @@ def getDictZone(d,lines):
 
 
 
+def getZoneSignals(d,lines,value):
+    """
+    Cette fonction permet de regrouper les pings d'un signal selon les zones d'etude, dans le meme ordre que getDictZone,
+    sous forme d'une matrice (ping x echantillon) par zone lue directement pour chaque ligne (cf. ea400_survey.SurveyLine.signal).
+
+    Parametres
+    ----------
+    d : dictionary
+        base de donnees organisee selon les lignes de leve
+    lines : list of string
+        lignes de leves a regrouper
+    value : string
+        signal a regrouper, soit 'Power' (sans correction) soit 'Power_ProfRef' (avec correction)
+
+    Sortie
+    -------
+    zone_signals : list of np.array
+        matrice (ping x echantillon) du signal pour chaque zone d'etude, completee par des NaN
+
+    """
+    l_matrix = []
+    for line in lines:
+        matrix, n_samples = d[line].signal(value)
+        l_matrix.append((matrix, d[line]['data']['Zone'].values))
+    nbSmp = max([matrix.shape[1] for matrix, _ in l_matrix] + [0])
+    dtype = np.result_type(np.float32, *[matrix.dtype for matrix, _ in l_matrix])
+    zone_signals = []
+    for z in range(5):
+        l_zone = [matrix[zone==z+1] for matrix, zone in l_matrix]
+        power = np.full((sum(len(m) for m in l_zone), nbSmp), np.nan, dtype=dtype)
+        i_ping = 0
+        for m in l_zone:
+            power[i_ping:i_ping+len(m), :m.shape[1]] = m
+            i_ping += len(m)
+        zone_signals.append(power)
+    return zone_signals
+
+
+
 #-------------- FONCTIONS D'AFFICHAGE --------------
 
 
-def plotPingMean(d_zone,xmin,xmax,n_Ping,colors,title):
+def plotPingMean(zone_signals,xmin,xmax,n_Ping,colors,title):
     """
     Cette fonction permet de visualiser les premiers echos moyens caracteristiques de chaque zone d'etude'
 
     Parametres
     ----------
-    d_zone : dictionary
-        base de donnees
+    zone_signals : list of np.array
+        matrices (ping x echantillon) de Power_ProfRef de chaque zone, cf. getZoneSignals
     xmin : int
         echantillon minimal pour l'affichage
     xmax : int
@@ -421,8 +436,7 @@ def plotPingMean(d_zone,xmin,xmax,n_Ping,colors,title):
     plt.suptitle(title)
     plt.title('Moyenne sur 300pings avec correction à une prof de réf')
     for z in range(5):
-        power = d_zone[z].loc[:,'Power_ProfRef']
-        power = np.array([np.array(li) for li in power]).T
+        power = zone_signals[z].T
         # calcul du ping moyen
         ping_mean = np.mean(power[:,:n_Ping],axis=1)
         # affichage du ping moyen
@@ -435,25 +449,23 @@ def plotPingMean(d_zone,xmin,xmax,n_Ping,colors,title):
 
 
 
-def plotAllEchogram(d_zone,value,n_Ping):
+def plotAllEchogram(zone_signals,n_Ping):
     """
     Cette fonction permet d'afficher les echogrammes des donnees considerees sur chaque zone
     Cela permet notamment de visualiser l'effet de la correction a une profondeur de reference
 
     Parametres
     ----------
-    d_zone : dictionary
-        base de donnees
-    value : string
-        attribut a visualiser, soit 'Power' (sans correction) soit 'Power_ProfRef' (avec correction)
+    zone_signals : list of np.array
+        matrices (ping x echantillon) de chaque zone du signal a visualiser, soit 'Power' (sans correction)
+        soit 'Power_ProfRef' (avec correction), cf. getZoneSignals
     n_Ping : int
         Dnombre de pings a prendre en compte
 
     """
     plt.figure()
     for z in range(5):
-        power = d_zone[z].loc[:,value]
-        power = np.array([np.array(li) for li in power]).T
+        power = zone_signals[z].T
         plt.subplot(1,5,z+1)
         plt.imshow(power[:,:n_Ping])
         plt.title('Zone '+str(z+1))
@@ -673,7 +685,8 @@ if __name__=='__main__':
     # hist_min,hist_max = E1_lim
     # plotHistDescripteur(E1_38, 'Histogrammes E1 - 38kHz','E1', colors, hist_min, hist_max)
 
-    # plotPingMean(d_38_zone, 40, 140, n_ping, colors, 'Echo moyen - 38kHz')
+    # d_38_ProfRef = getZoneSignals(d_38, lines, 'Power_ProfRef')
+    # plotPingMean(d_38_ProfRef, 40, 140, n_ping, colors, 'Echo moyen - 38kHz')
     
     # hist_min, hist_max = (2,6)
     # plotHistDescripteur(P_38, 'Histogrammes Pente - 38kHz\n pente en dB/sec','Pente', colors, hist_min, hist_max)
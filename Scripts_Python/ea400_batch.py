@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Auteur : Aelaig COURNEZ - Flora GUES - Yann LAMBRECHTS - Romain SAFRAN
+
+# Librairies importee
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+#--------------------------------------------------------------------------------#
+#                   TRAITEMENT PARALLELE D'UN ENSEMBLE DE LIGNES                 #
+#                                                                                #
+#   Ce code permet d'executer une meme fonction (par ex : decodage et            #
+#   sauvegarde d'une ligne de leve) sur plusieurs lignes en parallele, dans      #
+#   un ensemble de processus. Une erreur sur une ligne est signalee sans         #
+#   interrompre le traitement des autres lignes, et le temps de calcul de        #
+#   chaque ligne est mesure.                                                     #
+#--------------------------------------------------------------------------------#
+
+
+def run_task(function, args):
+    """
+    Cette fonction permet d'executer une tache en mesurant son temps de calcul et en capturant les erreurs.
+
+    Parametres
+    ----------
+    function : function
+        fonction a executer
+    args : tuple
+        arguments de la fonction
+
+    Sorties
+    -------
+    duration : float
+        temps de calcul (en s)
+    error : string
+        trace de l'erreur rencontree, None si la tache s'est bien deroulee
+
+    """
+    t_start = time.time()
+    error = None
+    try:
+        function(*args)
+    except Exception:
+        error = traceback.format_exc()
+    return time.time() - t_start, error
+
+
+def run_tasks(function, tasks, n_workers=None):
+    """
+    Cette fonction permet d'executer une fonction sur un ensemble de taches, en parallele dans un ensemble de processus.
+
+    Parametres
+    ----------
+    function : function
+        fonction a executer, definie au niveau d'un module (pour pouvoir etre transmise aux processus)
+    tasks : dictionary
+        arguments de la fonction pour chaque tache, par ex : {'L0024': (files, out_path, ...)}
+    n_workers : int
+        nombre de processus, None pour utiliser tous les coeurs disponibles, 1 pour un traitement sequentiel
+
+    Sortie
+    -------
+    d_report : dictionary
+        pour chaque tache (dans l'ordre des noms) : {'Time': temps de calcul en s, 'Error': trace de l'erreur ou None}
+
+    """
+    d_report = {}
+    if n_workers is None:
+        n_workers = os.cpu_count()
+
+    if n_workers == 1: # traitement sequentiel dans le processus courant
+        for name, args in tasks.items():
+            d_report[name] = dict(zip(['Time','Error'], run_task(function, args)))
+            print_task(name, d_report[name])
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = {pool.submit(run_task, function, args): name for name, args in tasks.items()}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    duration, error = future.result()
+                except Exception: # arret brutal du processus (memoire, signal...)
+                    duration, error = float('nan'), traceback.format_exc()
+                d_report[name] = {'Time': duration, 'Error': error}
+                print_task(name, d_report[name])
+
+    d_report = {name: d_report[name] for name in sorted(d_report)}
+    print_report(d_report)
+    return d_report
+
+
+def print_task(name, report):
+    """
+    Cette fonction permet d'afficher le resultat d'une tache.
+    """
+    if report['Error'] is None:
+        print('-> '+name+' : traitement acheve en '+str(round(report['Time'],1))+' s')
+    else:
+        print('-> '+name+' : ERREUR\n'+report['Error'])
+
+
+def print_report(d_report):
+    """
+    Cette fonction permet d'afficher le bilan d'un traitement : temps de calcul de chaque tache et taches en erreur.
+    """
+    print('\nBilan du traitement :')
+    for name, report in d_report.items():
+        status = 'ok' if report['Error'] is None else 'ERREUR'
+        print(name+' : '+str(round(report['Time'],1))+' s - '+status)
+    errors = [name for name, report in d_report.items() if report['Error'] is not None]
+    print('Taches en erreur : '+str(len(errors))+'/'+str(len(d_report))+(' '+str(errors) if errors else ''))
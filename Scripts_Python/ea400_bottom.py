@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Auteur : Aelaig COURNEZ - Flora GUES - Yann LAMBRECHTS - Romain SAFRAN
+
+# Librairies importee
+import numpy as np
+import warnings
+from numpy.lib.stride_tricks import sliding_window_view
+# Autres codes python
+from ea400_store import stack_samples, slice_samples
+
+#--------------------------------------------------------------------------------#
+#                           DETECTION DU FOND                                    #
+#                                                                                #
+#   Ce code permet de detecter le fond sur une matrice de puissance              #
+#   (ping x echantillon) en un seul calcul, pour l'ensemble des pings d'une      #
+#   ligne. Plusieurs detecteurs sont disponibles (maximum de puissance, front    #
+#   montant a un seuil, gradient maximal), avec un affinage sub-echantillon      #
+#   par parabole et un suivi du fond d'un ping a l'autre qui restreint la        #
+#   fenetre de recherche. La detection peut etre relancee sur les donnees        #
+#   sauvegardees (fichiers h5) sans decoder a nouveau les fichiers .raw.         #
+#--------------------------------------------------------------------------------#
+
+# Seuil du detecteur de front montant : ecart au maximum de puissance de la fenetre (en dB)
+THRESHOLD_DB = 10.
+
+# Nombre de pings de la mediane glissante utilisee comme fond de reference pour le suivi
+TRACK_PINGS = 11
+
+# Nombre de pings traites par bloc (memoire utilisee)
+BLOCK_PINGS = 4096
+
+
+#-------- DETECTEURS : indice du fond dans chaque ligne d'une matrice fenetree --------
+# Les echantillons hors de la fenetre de recherche valent -inf
+
+def detect_argmax(window, **options):
+    """
+    Detecteur par maximum de puissance : indice du premier maximum de chaque ping.
+    """
+    return np.argmax(window, axis=1)
+
+
+def detect_threshold(window, threshold=THRESHOLD_DB, **options):
+    """
+    Detecteur de front montant : indice du premier echantillon dont la puissance depasse (maximum - threshold) dB.
+    """
+    level = np.max(window, axis=1) - threshold
+    return np.argmax(window >= level[:, None], axis=1)
+
+
+def detect_gradient(window, **options):
+    """
+    Detecteur par gradient : indice de l'echantillon qui suit la plus forte hausse de puissance.
+    """
+    with np.errstate(invalid='ignore'):
+        gradient = np.diff(window, axis=1)
+    gradient[~np.isfinite(gradient)] = -np.inf
+    return np.argmax(gradient, axis=1) + 1
+
+
+# Detecteurs disponibles, par nom (un detecteur supplementaire peut etre ajoute a ce dictionnaire)
+DETECTORS = {'argmax': detect_argmax, 'threshold': detect_threshold, 'gradient': detect_gradient}
+
+
+#-------- FONCTIONS DE DETECTION --------
+
+def refine_parabolic(power, index):
+    """
+    Cette fonction permet d'affiner la position du fond entre deux echantillons : une parabole est ajustee
+    sur l'echantillon detecte et ses deux voisins, et la position de son sommet est retenue.
+
+    Parametres
+    ----------
+    power : np.array
+        matrice de puissance (ping x echantillon)
+    index : np.array of float
+        indice du fond de chaque ping (NaN si pas de detection)
+
+    Sortie
+    -------
+    refined : np.array of float
+        indice sub-echantillon du fond
+
+    """
+    refined = index.astype(np.float64)
+    n_sample = power.shape[1]
+    valid = np.isfinite(index) & (index >= 1) & (index <= n_sample - 2)
+    rows = np.flatnonzero(valid)
+    i = index[valid].astype(np.int64)
+    left, centre, right = power[rows, i-1], power[rows, i], power[rows, i+1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        delta = 0.5 * (left - right) / (left - 2*centre + right)
+    delta = np.where(np.isfinite(delta), np.clip(delta, -0.5, 0.5), 0.)
+    refined[rows] = i + delta
+    return refined
+
+
+def running_median(values, n_pings=TRACK_PINGS):
+    """
+    Cette fonction renvoie la mediane glissante (sur n_pings pings, en ignorant les NaN) d'une serie de valeurs par ping.
+    """
+    half = n_pings // 2
+    padded = np.pad(values.astype(np.float64), half, mode='edge')
+    with warnings.catch_warnings(): # fenetre sans detection
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanmedian(sliding_window_view(padded, 2*half + 1), axis=1)
+
+
+def detect_window(power, i_min, i_max, method, **options):
+    """
+    Cette fonction applique un detecteur sur une fenetre de recherche (propre a chaque ping) d'une matrice de puissance.
+
+    Parametres
+    ----------
+    power : np.array
+        matrice de puissance (ping x echantillon), completee par des NaN
+    i_min, i_max : np.array of int
+        indices du premier et du dernier echantillon de la fenetre de recherche de chaque ping
+    method : string
+        nom du detecteur, cf. DETECTORS
+    options : dictionary
+        options du detecteur, par ex : threshold=10
+
+    Sortie
+    -------
+    index : np.array of float
+        indice du fond de chaque ping (NaN si la fenetre ne contient aucun echantillon)
+
+    """
+    detector = DETECTORS[method]
+    n_ping, n_sample = power.shape
+    index = np.full(n_ping, np.nan)
+    columns = np.arange(n_sample)
+    for start in range(0, n_ping, BLOCK_PINGS): # traitement par blocs de pings
+        rows = slice(start, start + BLOCK_PINGS)
+        inside = (columns >= i_min[rows, None]) & (columns <= i_max[rows, None]) & ~np.isnan(power[rows])
+        window = np.where(inside, power[rows], -np.inf)
+        i = detector(window, **options)
+        index[rows] = np.where(inside.any(axis=1), i, np.nan)
+    return index
+
+
+def detect_bottom(power, i_min=0, i_max=None, method='argmax', refine=False, track=None, track_pings=TRACK_PINGS, **options):
+    """
+    Cette fonction permet de detecter le fond sur l'ensemble des pings d'une matrice de puissance en un seul calcul.
+
+    Parametres
+    ----------
+    power : np.array
+        matrice de puissance (ping x echantillon) en dB, completee par des NaN, cf. ea400_store.stack_samples
+    i_min, i_max : int or np.array of int
+        indices du premier et du dernier echantillon de la fenetre de recherche (pour tous les pings ou pour chaque ping) ;
+        i_max = None pour le dernier echantillon
+    method : string
+        detecteur : 'argmax' (maximum de puissance), 'threshold' (front montant), 'gradient' (plus forte hausse), cf. DETECTORS
+    refine : boolean
+        True pour affiner la position du fond entre deux echantillons (parabole)
+    track : float
+        suivi du fond : demi-largeur (en echantillons) de la fenetre de recherche centree sur le fond de reference
+        (mediane glissante d'une premiere detection) ; None pour ne pas suivre le fond
+    track_pings : int
+        nombre de pings de la mediane glissante du suivi
+    options : dictionary
+        options du detecteur, par ex : threshold=10 pour 'threshold'
+
+    Sorties
+    -------
+    index : np.array of float
+        indice (eventuellement sub-echantillon) du fond de chaque ping, NaN si pas de detection
+    power_max : np.array of float32
+        puissance de l'echantillon detecte (NaN si pas de detection)
+
+    """
+    power = np.asarray(power, dtype=np.float32)
+    if power.ndim != 2:
+        power = power.reshape(power.shape[0], -1)
+    n_ping, n_sample = power.shape
+    i_min = np.broadcast_to(np.asarray(i_min, dtype=np.int64), (n_ping,))
+    i_max = np.broadcast_to(np.asarray(n_sample - 1 if i_max is None else i_max, dtype=np.int64), (n_ping,))
+
+    index = detect_window(power, i_min, i_max, method, **options)
+    if track is not None: # deuxieme detection dans une fenetre centree sur le fond de reference
+        reference = running_median(index, track_pings)
+        known = np.isfinite(reference)
+        i_min = np.where(known, np.maximum(i_min, np.floor(np.nan_to_num(reference) - track)), i_min).astype(np.int64)
+        i_max = np.where(known, np.minimum(i_max, np.ceil(np.nan_to_num(reference) + track)), i_max).astype(np.int64)
+        index = detect_window(power, i_min, i_max, method, **options)
+
+    power_max = np.full(n_ping, np.nan, dtype=np.float32)
+    detected = np.isfinite(index)
+    power_max[detected] = power[np.flatnonzero(detected), index[detected].astype(np.int64)]
+    if refine:
+        index = refine_parabolic(power, index)
+    return index, power_max
+
+
+def redetect_bottom(data, param, range_detection=None, **detection):
+    """
+    Cette fonction permet de relancer la detection du fond sur les donnees d'une ligne deja decodees (fichier h5),
+    par ex. avec un autre detecteur ou un autre intervalle de profondeur, sans relire le fichier .raw.
+    La recherche se fait sur le signal Power sauvegarde (jusqu'a la plus grande des profondeurs DepthMaxSave et DepthMaxDetect).
+
+    Parametres
+    ----------
+    data : DataFrame
+        donnees des pings d'une ligne (d[line]['data'])
+    param : DataFrame
+        parametres d'acquisition de la ligne (d[line]['param'])
+    range_detection : list of float
+        intervalle de profondeur pour la detection du fond, par ex : [5,100] ; None pour l'intervalle du decodage
+    detection : dictionary
+        options de detection, cf. detect_bottom ; la demi-largeur du suivi track est donnee en m
+
+    Sortie
+    -------
+    data : DataFrame
+        copie des donnees avec les attributs Depth, PowerMax, DetectFirst, DetectLast et PowerDetectInterval recalcules
+
+    """
+    step = float(param['SampleInterval'].iloc[0]) * float(param['SoundVelocity'].iloc[0]) / 2 # pas des echantillons (en m)
+    start = float(param['PelagicStart'].iloc[0]) if 'PelagicStart' in param else 0. # profondeur du premier echantillon
+    if range_detection is None:
+        range_detection = [float(param['DepthMinDetect'].iloc[0]), float(param['DepthMaxDetect'].iloc[0])]
+    if detection.get('track') is not None:
+        detection['track'] = detection['track'] / step
+
+    power = stack_samples(data['Power'])
+    i_min = max(int(round((range_detection[0] - start) / step)), 0)
+    i_max = int(round((range_detection[1] - start) / step))
+    index, power_max = detect_bottom(power, i_min, i_max, **detection)
+
+    data = data.copy()
+    data['Depth'] = start + index * step
+    data['PowerMax'] = power_max
+    data['DetectFirst'] = np.int32(i_min)
+    data['DetectLast'] = np.int32(i_max)
+    data['PowerDetectInterval'] = slice_samples(data['Power'], data['DetectFirst'], data['DetectLast'])
+    return data
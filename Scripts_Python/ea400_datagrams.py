@@ -0,0 +1,600 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Auteur : Aelaig COURNEZ - Flora GUES - Yann LAMBRECHTS - Romain SAFRAN
+
+# Librairies importee
+import numpy as np
+import struct
+import mmap
+import os
+import datetime as dt
+
+#--------------------------------------------------------------------------------#
+#               LECTURE BAS NIVEAU DES FICHIERS EA400 (.raw / .out)              #
+#                                                                                #
+#   Ce code regroupe les outils communs aux scripts decode_and_save : il         #
+#   permet d'indexer les trames (datagrammes) d'un fichier EA400 afin de         #
+#   pouvoir acceder directement aux trames utiles sans relire tout le fichier.   #
+#   L'index est sauvegarde a cote du fichier source (fichier .idx.npz) et        #
+#   reutilise tant que la taille et la date de modification du fichier source    #
+#   ne changent pas. Il decrit aussi la structure des entetes des trames, ce     #
+#   qui permet de decoder en bloc les entetes de toutes les trames d'un fichier. #
+#--------------------------------------------------------------------------------#
+
+# Origine des dates des trames EA400 (FILETIME : dixiemes de microseconde depuis le 01/01/1601)
+origine_1601 = dt.datetime(year=1601,month=1,day=1,hour = 0,minute = 0,second = 0)
+
+# Date FILETIME de l'origine des dates Unix (01/01/1970)
+FILETIME_EPOCH = 116444736000000000
+
+# Description d'une entree de l'index
+# Type : type de trame ; DateTime : date FILETIME ; Channel : canal (0 si la trame n'a pas de canal)
+# Offset : position du debut de la trame (apres la longueur) ; Length : longueur de la trame
+INDEX_DTYPE = np.dtype([('Type','S4'),('DateTime','<u8'),('Channel','<i2'),('Offset','<i8'),('Length','<i4')])
+
+# Version du format de l'index sauvegarde
+INDEX_VERSION = 2
+
+# Extension du fichier d'index
+INDEX_EXT = '.idx.npz'
+
+
+# Types de trames d'un fichier EA400 (utilises pour retrouver le debut d'une trame apres une zone corrompue)
+DATAGRAM_TYPES = (b'CON0', b'RAW0', b'NME0', b'DEP0', b'TAG0', b'SVP0')
+
+# Longueur minimale d'une trame : type et date
+DATAGRAM_MIN_LENGTH = 12
+
+# Taille des blocs lus pour rechercher la trame suivante apres une zone corrompue
+RESYNC_CHUNK = 1 << 20
+
+
+#-------- STRUCTURES DES TRAMES (compilees une seule fois) --------
+
+# Entete de la trame CON0 : Type, DateTime, SurveyName, TransectName, SounderName, Version, Spare, TransducerCount
+CON0_HEADER = struct.Struct('<4sQ128s128s128s30s98sI')
+# Description d'un transducteur dans la trame CON0 : ChannelId, BeamType, Frequency, Gain, EquivalentBeamAngle
+CON0_TRANSDUCER = struct.Struct('<128slfff')
+# Position des descriptions des transducteurs dans la trame CON0 (1 = 38kHz ; 2 = 200kHz)
+CON0_TRANSDUCER_OFFSETS = {'38':528, '200':848}
+
+# Entete de la trame RAW0 (84 octets), suivie de Count echantillons de puissance int16
+RAW0_HEADER_DTYPE = np.dtype([('Type','S4'),('DateTime','<u8'),('Channel','<i2'),('Mode','<i2'),
+                              ('TransducerDepth','<f4'),('Frequency','<f4'),('TransmitPower','<f4'),
+                              ('PulseLength','<f4'),('BandWidth','<f4'),('SampleInterval','<f4'),
+                              ('SoundVelocity','<f4'),('AbsorptionCoefficient','<f4'),('Heave','<f4'),
+                              ('Tx_Roll','<f4'),('Tx_Pitch','<f4'),('Temperature','<f4'),
+                              ('Spare1','<i2'),('Spare2','<i2'),('Rx_Roll','<f4'),('Rx_Pitch','<f4'),
+                              ('Offset','<i4'),('Count','<i4')])
+RAW0_HEADER = struct.Struct('<4sQhh12fhhffll')
+# Facteur de conversion des echantillons de puissance (int16) en dB
+POWER_SCALE = np.float32(10*np.log10(2)/256)
+
+# Trame DEP0 (2 canaux) : Type, DateTime, NbChannel puis Depth, BS, Param2 pour chaque canal
+DEP0_DTYPE = np.dtype([('Type','S4'),('DateTime','<u8'),('NbChannel','<u4'),
+                       ('Depth_38','<f4'),('BS_38','<f4'),('Param2_38','<f4'),
+                       ('Depth_200','<f4'),('BS_200','<f4'),('Param2_200','<f4')])
+DEP0_HEADER = struct.Struct('<4sQI6f')
+
+
+#-------- REPRISE APRES UNE ZONE CORROMPUE --------
+
+def is_datagram(read_at, size, pos):
+    """
+    Cette fonction permet de verifier qu'une trame valide commence a la position pos d'un fichier :
+    longueur plausible, type de trame connu et longueur identique en fin de trame.
+
+    Parametres
+    ----------
+    read_at : function
+        fonction read_at(position, nombre d'octets) renvoyant les octets du fichier
+    size : int
+        taille du fichier (en octets)
+    pos : int
+        position de la longueur de la trame a verifier
+
+    Sortie
+    -------
+    valid : boolean
+        True si une trame complete et valide commence a la position pos
+
+    """
+    head = read_at(pos, 8)
+    if len(head) < 8 or head[4:] not in DATAGRAM_TYPES:
+        return False
+    lengths, = struct.unpack_from('<l', head)
+    if lengths < DATAGRAM_MIN_LENGTH or pos + lengths + 8 > size:
+        return False
+    return read_at(pos + 4 + lengths, 4) == head[:4]
+
+
+def find_next_datagram(read_at, size, start):
+    """
+    Cette fonction permet de rechercher la prochaine trame valide d'un fichier a partir de la position start,
+    en cherchant les types de trames connus (cf. DATAGRAM_TYPES) puis en verifiant chaque candidat (cf. is_datagram).
+
+    Parametres
+    ----------
+    read_at : function
+        fonction read_at(position, nombre d'octets) renvoyant les octets du fichier
+    size : int
+        taille du fichier (en octets)
+    start : int
+        position a partir de laquelle rechercher
+
+    Sortie
+    -------
+    pos : int
+        position de la longueur de la prochaine trame valide ; None s'il n'y en a plus
+
+    """
+    pos = start
+    while pos + 8 <= size:
+        # le type est precede de 4 octets de longueur ; les blocs se chevauchent de 3 octets
+        chunk = read_at(pos + 4, RESYNC_CHUNK + 3)
+        candidates = sorted(i for i in (chunk.find(t) for t in DATAGRAM_TYPES) if i >= 0)
+        while candidates:
+            i = candidates.pop(0)
+            if is_datagram(read_at, size, pos + i):
+                return pos + i
+            # meme type plus loin dans le bloc
+            j = chunk.find(chunk[i:i+4], i + 1)
+            if j >= 0:
+                candidates = sorted(candidates + [j])
+        pos += RESYNC_CHUNK
+    return None
+
+
+def report_skipped(report, pos, skipped, source=''):
+    """
+    Cette fonction permet de signaler une zone corrompue ignoree et de la comptabiliser dans report.
+    """
+    print('Trame invalide a l\'octet '+str(pos)+' '+source+' : '+str(skipped)+' octets ignores')
+    if report is not None:
+        report['skipped_bytes'] = report.get('skipped_bytes', 0) + skipped
+        report['n_resync'] = report.get('n_resync', 0) + 1
+    return None
+
+
+#-------- FONCTIONS PERMETTANT D'INDEXER LES TRAMES --------
+
+def build_index(filepath, recover=False, report=None):
+    """
+    Cette fonction permet de parcourir un fichier .raw ou .out et de lister l'ensemble de ses trames.
+    Le fichier est projete en memoire (mmap) : seuls les entetes des trames sont lus.
+
+    Parametres
+    ----------
+    filepath : string
+        chemin vers le fichier .raw ou .out issu de l'EA400
+    recover : boolean
+        False pour s'arreter sur une trame invalide (longueurs differentes, trame tronquee) ;
+        True pour ignorer la zone corrompue et reprendre a la trame valide suivante
+    report : dictionary
+        dictionnaire complete par le nombre d'octets ignores ('skipped_bytes') et de reprises ('n_resync') ; None si inutile
+
+    Sortie
+    -------
+    index : np.array (INDEX_DTYPE)
+        tableau structure avec pour chaque trame : Type, DateTime, Channel, Offset, Length
+
+    """
+    L_type, L_time, L_channel, L_offset, L_length = [],[],[],[],[]
+
+    with open(filepath, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0: # mmap impossible sur un fichier vide
+            return np.zeros(0, dtype=INDEX_DTYPE)
+
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        read_at = lambda p, n: mm[p:p+n]
+        try:
+            pos = 0
+            while pos + 4 <= size: # Tant qu'il y a toujours des donnees a lire
+                # on lit la longueur de la trame precisee au debut
+                lengths, = struct.unpack_from('<l', mm, pos)
+                offset = pos + 4
+                # on verifie que la trame est complete et que la longueur est la même au début et à la fin
+                if (lengths < DATAGRAM_MIN_LENGTH or offset + lengths + 4 > size
+                        or struct.unpack_from('<l', mm, offset+lengths)[0] != lengths):
+                    if not recover:
+                        raise Exception('Length problem')
+                    next_pos = find_next_datagram(read_at, size, pos + 1)
+                    if next_pos is None:
+                        next_pos = size
+                    report_skipped(report, pos, next_pos - pos, filepath)
+                    pos = next_pos
+                    continue
+
+                trame = mm[offset:offset+4]
+                time, = struct.unpack_from('<Q', mm, offset+4)
+                channel = 0
+                if trame == b'RAW0' and lengths >= 14:
+                    channel, = struct.unpack_from('<h', mm, offset+12)
+
+                L_type.append(trame)
+                L_time.append(time)
+                L_channel.append(channel)
+                L_offset.append(offset)
+                L_length.append(lengths)
+
+                pos = offset + lengths + 4 # trame suivante
+            if 0 < size - pos < 4: # quelques octets isoles en fin de fichier
+                if not recover:
+                    raise Exception('Length problem')
+                report_skipped(report, pos, size - pos, filepath)
+        finally:
+            mm.close()
+
+    index = np.zeros(len(L_type), dtype=INDEX_DTYPE)
+    index['Type'] = L_type
+    index['DateTime'] = L_time
+    index['Channel'] = L_channel
+    index['Offset'] = L_offset
+    index['Length'] = L_length
+    return index
+
+
+def save_index(filepath, index, skipped_bytes=0):
+    """
+    Cette fonction permet de sauvegarder l'index d'un fichier EA400 dans un fichier annexe (filepath + INDEX_EXT).
+    La taille et la date de modification du fichier source sont enregistrees avec l'index.
+
+    Parametres
+    ----------
+    filepath : string
+        chemin vers le fichier .raw ou .out indexe
+    index : np.array (INDEX_DTYPE)
+        index du fichier, cf. build_index
+    skipped_bytes : int
+        nombre d'octets corrompus ignores lors de l'indexation
+
+    """
+    stat = os.stat(filepath)
+    with open(filepath + INDEX_EXT, 'wb') as f_idx:
+        np.savez(f_idx, index=index, size=stat.st_size, mtime_ns=stat.st_mtime_ns, version=INDEX_VERSION,
+                 skipped_bytes=skipped_bytes)
+    return None
+
+
+def load_index(filepath, use_cache=True, recover=False, report=None):
+    """
+    Cette fonction permet de recuperer l'index d'un fichier EA400.
+    Si un index sauvegarde existe et que le fichier source n'a pas change (taille et date de modification),
+    il est relu ; sinon le fichier est indexe puis l'index est sauvegarde.
+
+    Parametres
+    ----------
+    filepath : string
+        chemin vers le fichier .raw ou .out issu de l'EA400
+    use_cache : boolean
+        True pour relire/sauvegarder l'index dans le fichier annexe, False pour toujours reindexer
+    recover : boolean
+        True pour ignorer les zones corrompues du fichier, cf. build_index
+    report : dictionary
+        dictionnaire complete par le nombre d'octets ignores, cf. build_index
+
+    Sortie
+    -------
+    index : np.array (INDEX_DTYPE)
+        tableau structure avec pour chaque trame : Type, DateTime, Channel, Offset, Length
+
+    """
+    idx_path = filepath + INDEX_EXT
+    if use_cache and os.path.exists(idx_path):
+        stat = os.stat(filepath)
+        with np.load(idx_path) as saved:
+            if (int(saved['version']) == INDEX_VERSION and int(saved['size']) == stat.st_size
+                    and int(saved['mtime_ns']) == stat.st_mtime_ns):
+                skipped = int(saved['skipped_bytes'])
+                if skipped > 0: # index construit en ignorant des zones corrompues
+                    if not recover:
+                        raise Exception('Length problem')
+                    report_skipped(report, 0, skipped, '(index sauvegarde) '+filepath)
+                return saved['index']
+
+    report_file = {}
+    index = build_index(filepath, recover, report_file)
+    if report is not None:
+        for key, value in report_file.items():
+            report[key] = report.get(key, 0) + value
+    if use_cache:
+        try:
+            save_index(filepath, index, report_file.get('skipped_bytes', 0))
+        except OSError: # repertoire en lecture seule par ex., on continue sans sauvegarde
+            print('Index non sauvegarde pour le fichier : '+filepath)
+    return index
+
+
+def to_filetime(date):
+    """
+    Cette fonction permet de convertir une date en date FILETIME (dixiemes de microseconde depuis le 01/01/1601).
+
+    Parametres
+    ----------
+    date : datetime or int
+        date a convertir, un entier est considere comme deja au format FILETIME
+
+    Sortie
+    -------
+    filetime : int
+        date au format FILETIME
+
+    """
+    if isinstance(date, dt.datetime):
+        return ((date - origine_1601) // dt.timedelta(microseconds=1)) * 10
+    return int(date)
+
+
+def filetime_to_datetime64(filetime):
+    """
+    Cette fonction permet de convertir en une seule operation un tableau de dates FILETIME en dates numpy datetime64[ns].
+
+    Parametres
+    ----------
+    filetime : array of int
+        dates au format FILETIME (dixiemes de microseconde depuis le 01/01/1601)
+
+    Sortie
+    -------
+    dates : np.array of datetime64[ns]
+        dates converties
+
+    """
+    return ((np.asarray(filetime, dtype=np.int64) - FILETIME_EPOCH) * 100).astype('datetime64[ns]')
+
+
+def filetime_to_seconds(filetime):
+    """
+    Cette fonction permet de convertir un tableau de dates FILETIME en secondes depuis le 01/01/1970 (float64).
+    """
+    return (np.asarray(filetime, dtype=np.int64) - FILETIME_EPOCH) / 1e7
+
+
+def select_datagrams(index, types=None, channel=None, t_start=None, t_end=None):
+    """
+    Cette fonction permet de selectionner des trames dans l'index d'un fichier.
+
+    Parametres
+    ----------
+    index : np.array (INDEX_DTYPE)
+        index du fichier, cf. load_index
+    types : list of string
+        types de trames a conserver, par ex : ['RAW0','NME0'] ; None pour tous les types
+    channel : int
+        canal a conserver pour les trames RAW0, par ex : 1->38kHz et 2->200kHz ; None pour tous les canaux
+        (les trames sans canal sont toujours conservees)
+    t_start, t_end : datetime or int
+        bornes de la fenetre temporelle (incluses) ; None pour ne pas borner
+
+    Sortie
+    -------
+    selection : np.array (INDEX_DTYPE)
+        entrees de l'index correspondant aux criteres
+
+    """
+    mask = np.ones(index.shape[0], dtype=bool)
+    if types is not None:
+        mask &= np.isin(index['Type'], [t.encode('ascii') if isinstance(t, str) else t for t in types])
+    if channel is not None:
+        mask &= (index['Channel'] == channel) | (index['Channel'] == 0)
+    if t_start is not None:
+        mask &= index['DateTime'] >= to_filetime(t_start)
+    if t_end is not None:
+        mask &= index['DateTime'] <= to_filetime(t_end)
+    return index[mask]
+
+
+def count_datagrams(index):
+    """
+    Cette fonction permet de compter les trames de chaque type presentes dans l'index.
+
+    Parametres
+    ----------
+    index : np.array (INDEX_DTYPE)
+        index du fichier, cf. load_index
+
+    Sortie
+    -------
+    counts : dictionary
+        nombre de trames par type, par ex : {'RAW0': 1200, 'NME0': 5294, ...}
+
+    """
+    types, counts = np.unique(index['Type'], return_counts=True)
+    return {t.decode('ascii'): int(n) for t, n in zip(types, counts)}
+
+
+def read_datagrams(filepath, selection):
+    """
+    Cette fonction permet de lire directement les trames selectionnees dans un fichier, sans parcourir le reste du fichier.
+
+    Parametres
+    ----------
+    filepath : string
+        chemin vers le fichier .raw ou .out issu de l'EA400
+    selection : np.array (INDEX_DTYPE)
+        entrees de l'index a lire, cf. select_datagrams
+
+    Sortie
+    -------
+    data : generator of bytes
+        trames lues (portion de fichier binaire commencant par le type de trame)
+
+    """
+    if selection.shape[0] == 0:
+        return
+    with open(filepath, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for offset, length in zip(selection['Offset'], selection['Length']):
+                yield mm[offset:offset+length]
+        finally:
+            mm.close()
+
+
+def read_headers(filepath, selection, dtype):
+    """
+    Cette fonction permet de decoder en une seule fois les entetes de plusieurs trames d'un fichier
+    dans un tableau structure : une ligne par trame, une colonne par champ de l'entete.
+
+    Parametres
+    ----------
+    filepath : string
+        chemin vers le fichier .raw ou .out issu de l'EA400
+    selection : np.array (INDEX_DTYPE)
+        entrees de l'index des trames a decoder, toutes du meme type, cf. select_datagrams
+    dtype : np.dtype
+        description de l'entete, par ex : RAW0_HEADER_DTYPE ou DEP0_DTYPE
+
+    Sortie
+    -------
+    headers : np.array (dtype)
+        entetes des trames selectionnees
+
+    """
+    if selection.shape[0] == 0:
+        return np.zeros(0, dtype=dtype)
+    if np.any(selection['Length'] < dtype.itemsize):
+        raise Exception('Length problem')
+    with open(filepath, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            buffer = np.frombuffer(mm, dtype=np.uint8)
+            # indices des octets de chaque entete : une ligne par trame
+            i_bytes = selection['Offset'][:, None] + np.arange(dtype.itemsize)
+            headers = buffer[i_bytes].view(dtype)[:, 0]
+            del buffer
+        finally:
+            mm.close()
+    return headers
+
+
+def decode_RAW0_datagrams(datagrams):
+    """
+    Cette fonction permet de decoder en bloc des trames RAW0 : toutes les entetes sont decodees en un seul tableau
+    structure (les metadonnees de chaque ping, Heave, Tx_Roll, TransmitPower, Offset..., sont directement en colonnes)
+    et tous les echantillons de puissance en une seule lecture, ranges dans une matrice (ping x echantillon).
+
+    Parametres
+    ----------
+    datagrams : list of bytes
+        trames RAW0 completes, par ex : conservees au fil de la lecture par iter_datagrams
+
+    Sorties
+    -------
+    headers : np.array (RAW0_HEADER_DTYPE)
+        entetes des trames, un ping par ligne
+    counts : np.array of int16
+        matrice (ping x echantillon) des comptes de puissance (puissance en dB = counts * POWER_SCALE), completee par des 0
+    n_samples : np.array of int
+        nombre d'echantillons de chaque ping
+
+    """
+    size = RAW0_HEADER_DTYPE.itemsize
+    if len(datagrams) == 0:
+        return np.zeros(0, dtype=RAW0_HEADER_DTYPE), np.zeros((0, 0), dtype=np.int16), np.zeros(0, dtype=np.int64)
+    headers = np.frombuffer(b''.join([data[:size] for data in datagrams]), dtype=RAW0_HEADER_DTYPE)
+    # nombre d'echantillons, borne par la longueur de la trame
+    lengths = np.array([len(data) for data in datagrams], dtype=np.int64)
+    n_samples = np.clip(headers['Count'].astype(np.int64), 0, (lengths - size) // 2)
+    samples = np.frombuffer(b''.join([data[size:size+2*n] for data, n in zip(datagrams, n_samples.tolist())]), dtype='<i2')
+    counts = np.zeros((len(datagrams), int(n_samples.max())), dtype=np.int16)
+    counts[np.arange(counts.shape[1]) < n_samples[:, None]] = samples
+    return headers, counts, n_samples
+
+
+#-------- LECTURE SEQUENTIELLE DES TRAMES --------
+
+def iter_datagrams(source, types=None, channel=None, recover=False, report=None, stop_at_eof=False):
+    """
+    Cette fonction permet de parcourir les trames d'un fichier .raw ou .out au fil de la lecture (generateur).
+    Les trames non demandees sont sautees sans etre lues : la memoire utilisee ne depend pas de la taille du fichier,
+    et un fichier de plusieurs Go peut etre filtre ou reduit pendant sa lecture.
+
+    Parametres
+    ----------
+    source : string or file
+        chemin vers le fichier .raw ou .out, ou fichier deja ouvert grace a : open(filepath, 'rb')
+    types : set of string
+        types de trames a conserver, par ex : {'RAW0','NME0'} ; None pour tous les types
+    channel : int
+        canal a conserver pour les trames RAW0, par ex : 1->38kHz et 2->200kHz ; None pour tous les canaux
+    recover : boolean
+        False pour s'arreter sur une trame invalide (longueurs differentes, trame tronquee) ;
+        True pour ignorer la zone corrompue et reprendre a la trame valide suivante
+    report : dictionary
+        dictionnaire complete par le nombre d'octets ignores ('skipped_bytes') et de reprises ('n_resync') ; None si inutile
+    stop_at_eof : boolean
+        True pour un fichier en cours d'enregistrement : la lecture s'arrete avant une trame incomplete en fin de fichier
+        et le fichier est positionne au debut de cette trame (la lecture pourra reprendre a cette position)
+
+    Sorties
+    -------
+    trame : bytes
+        type de la trame, par ex : b'RAW0'
+    data : bytes
+        trame complete (portion de fichier binaire commencant par le type de trame)
+
+    """
+    if isinstance(source, str):
+        f = open(source, 'rb')
+    else:
+        f = source
+    if types is not None:
+        types = {t.encode('ascii') if isinstance(t, str) else t for t in types}
+
+    def read_at(p, n):
+        f.seek(p)
+        return f.read(n)
+
+    try:
+        pos = f.tell()
+        data = f.read(4 * 1) # Debut de la lecture des donnees
+        while len(data) > 0 : # Tant qu'il y a toujours des donnees a lire
+            valid = len(data) == 4
+            if valid:
+                # on lit la longueur de la trame precisee au debut
+                lengths, = struct.unpack('<l', data)
+                valid = lengths >= DATAGRAM_MIN_LENGTH
+            if valid:
+                # on lit uniquement le debut de la trame : type, date et canal
+                head = f.read(min(lengths, 14))
+                trame = head[:4]
+
+                keep = types is None or trame in types
+                if keep and channel is not None and trame == b'RAW0':
+                    keep = len(head) == 14 and struct.unpack_from('<h', head, 12)[0] == channel
+
+                if keep: # on isole la trame dans data
+                    data = head + f.read(lengths - len(head))
+                else: # on saute la trame
+                    f.seek(lengths - len(head), 1)
+
+                # on lit la longueur de la trame precisee a la fin
+                # on verifie que l'identifiant est le même au début et à la fin et que la trame est complete
+                tail = f.read(4 * 1)
+                valid = len(tail) == 4 and struct.unpack('<l', tail)[0] == lengths and (not keep or len(data) == lengths)
+
+            if not valid:
+                size = os.fstat(f.fileno()).st_size
+                if stop_at_eof and (len(data) < 4 or pos + lengths + 8 > size): # trame pas encore entierement ecrite
+                    f.seek(pos)
+                    break
+                if not recover:
+                    raise Exception('Length problem')
+                next_pos = find_next_datagram(read_at, size, pos + 1)
+                report_skipped(report, pos, (size if next_pos is None else next_pos) - pos, getattr(f, 'name', ''))
+                if next_pos is None:
+                    break
+                f.seek(next_pos)
+                pos = next_pos
+                data = f.read(4 * 1)
+                continue
+
+            if keep:
+                yield trame, data
+            pos = f.tell()
+            data = f.read(4 * 1) # Poursuite de la lecture
+    finally:
+        if isinstance(source, str):
+            f.close()
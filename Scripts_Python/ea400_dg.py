@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Auteur : Aelaig COURNEZ - Flora GUES - Yann LAMBRECHTS - Romain SAFRAN
+
+# Librairies importee
+import numpy as np
+import pandas
+import mmap
+import os
+import re
+import struct
+import datetime as dt
+# Autres codes python
+from ea400_datagrams import POWER_SCALE, RAW0_HEADER_DTYPE
+from ea400_bottom import detect_bottom
+from ea400_store import stack_samples, slice_samples
+
+#--------------------------------------------------------------------------------#
+#                       LECTURE DES FICHIERS .DG DE L'EA400                      #
+#                                                                                #
+#   Ce code permet de lire les fichiers .dg exportes par l'EA400 (telegrammes    #
+#   d'echantillons 'Q'). Chaque enregistrement est encadre par sa longueur,      #
+#   comme les trames des fichiers .raw, et contient : 'Q<canal>,hhmmsscc,'      #
+#   puis une entete binaire et deux blocs d'echantillons de puissance int16 :    #
+#   la colonne d'eau (bloc pelagique) et une fenetre centree sur le fond.        #
+#   Les entetes sont decodees en bloc et les echantillons sont lus directement   #
+#   dans le fichier (np.frombuffer), pour produire les memes donnees par ping    #
+#   que la lecture des trames RAW0.                                              #
+#--------------------------------------------------------------------------------#
+
+# Entete d'un enregistrement 'Q' (44 octets) : texte 'Q1,hhmmsscc,' puis entete binaire
+# Depth : profondeur detectee par le sondeur ; Pelagic* : bloc colonne d'eau (debut, portee en m, nombre d'echantillons)
+# Bottom* : fenetre autour du fond (portee en m, debut en m par rapport au fond, nombre d'echantillons)
+DG_HEADER_DTYPE = np.dtype([('Type','S1'),('Channel','S1'),('Sep1','S1'),('Time','S8'),('Sep2','S1'),
+                            ('Spare','<f4'),('Depth','<f4'),('PelagicStart','<f4'),('PelagicRange','<f4'),
+                            ('PelagicCount','<i4'),('BottomRange','<f4'),('BottomStart','<f4'),('BottomCount','<i4')])
+
+# Frequence de chaque canal (1 = 38kHz ; 2 = 200kHz)
+DG_FREQUENCY = {1: 38000., 2: 200000.}
+
+# Celerite nominale : les echantillons .dg sont deja exprimes en profondeur, la celerite sert seulement
+# a renseigner SampleInterval et SoundVelocity de facon coherente avec le pas des echantillons (cf. read_DGfile)
+DG_SOUND_VELOCITY = 1500.
+
+# Colonnes des donnees des pings, identiques a la lecture des trames RAW0, puis attributs propres aux fichiers .dg
+DG_COLUMNS = ['DateTime','Power','PowerDetectInterval','PowerMax','Depth','DetectFirst','DetectLast',
+              'TransmitPower','Mode','TransducerDepth',
+              'Heave','Tx_Roll','Tx_Pitch','Spare1','Spare2',
+              'Rx_Roll','Rx_Pitch','Offset',
+              'DepthSounder','PowerBottom']
+
+# Parametres d'acquisition, identiques a la lecture des trames RAW0 (NaN si absents des fichiers .dg), puis geometrie des blocs .dg
+DG_PARAM_COLUMNS = ['SurveyName','TransectName','SounderName','TransducerCount',
+                    'Frequency_38','Gain_38','EquivalentBeamAngle_38',
+                    'Frequency_200','Gain_200','EquivalentBeamAngle_200',
+                    'Channel','Frequency',
+                    'SampleInterval','SoundVelocity','PulseLength',
+                    'BandWidth','AbsorptionCoefficient','Count',
+                    'Mode','DepthMaxSave','DepthMinDetect','DepthMaxDetect',
+                    'PelagicStart','BottomStart','BottomRange','BottomCount']
+
+# Types des colonnes des pings absentes des fichiers .dg, identiques a la lecture des trames RAW0
+DG_MISSING_DTYPES = {name: RAW0_HEADER_DTYPE[name] for name in ['TransmitPower','Mode','TransducerDepth','Heave','Tx_Roll','Tx_Pitch',
+                                                                'Spare1','Spare2','Rx_Roll','Rx_Pitch','Offset']}
+
+# Types des parametres d'acquisition absents des fichiers .dg, identiques a la lecture des trames CON0 et RAW0
+DG_MISSING_PARAM_DTYPES = {'SurveyName': np.str_, 'SounderName': np.str_, 'TransducerCount': np.int64,
+                           'Frequency_38': np.float64, 'Gain_38': np.float64, 'EquivalentBeamAngle_38': np.float64,
+                           'Frequency_200': np.float64, 'Gain_200': np.float64, 'EquivalentBeamAngle_200': np.float64,
+                           'PulseLength': np.float64, 'BandWidth': np.float64, 'AbsorptionCoefficient': np.float64,
+                           'Mode': np.int64}
+
+
+def missing_column(dtype, n):
+    """
+    Cette fonction renvoie une colonne de n valeurs manquantes du type dtype :
+    NaN pour un reel, 0 pour un entier (pas de valeur manquante pour un entier), chaine vide pour un texte.
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'f':
+        return np.full(n, np.nan, dtype=dtype)
+    if dtype.kind == 'U':
+        return np.full(n, '', dtype=object)
+    return np.zeros(n, dtype=dtype)
+
+
+def index_DGfile(buffer):
+    """
+    Cette fonction permet de lister les enregistrements d'un fichier .dg (position et longueur).
+    Lorsque tous les enregistrements ont la meme longueur (cas courant), l'index est construit sans parcourir le fichier.
+
+    Parametres
+    ----------
+    buffer : mmap or bytes
+        contenu du fichier .dg
+
+    Sorties
+    -------
+    offsets : np.array of int
+        position du debut de chaque enregistrement (apres la longueur)
+    lengths : np.array of int
+        longueur de chaque enregistrement
+
+    """
+    size = len(buffer)
+    if size < 8:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    data = np.frombuffer(buffer, dtype=np.uint8)
+
+    # enregistrements de longueur constante : verification en bloc des longueurs de debut et de fin
+    length, = struct.unpack_from('<l', buffer, 0)
+    if length > 0 and size % (length + 8) == 0:
+        starts = np.arange(size // (length + 8), dtype=np.int64) * (length + 8)
+        heads = data[starts[:, None] + np.arange(4)].copy().view('<i4')[:, 0]
+        tails = data[starts[:, None] + 4 + length + np.arange(4)].copy().view('<i4')[:, 0]
+        if (heads == length).all() and (tails == length).all():
+            return starts + 4, np.full(starts.shape[0], length, dtype=np.int64)
+
+    # cas general : parcours des longueurs
+    L_offset, L_length = [], []
+    pos = 0
+    while pos + 4 <= size:
+        length, = struct.unpack_from('<l', buffer, pos)
+        if length <= 0 or pos + length + 8 > size or struct.unpack_from('<l', buffer, pos + 4 + length)[0] != length:
+            raise Exception('Length problem')
+        L_offset.append(pos + 4)
+        L_length.append(length)
+        pos += length + 8
+    return np.array(L_offset, dtype=np.int64), np.array(L_length, dtype=np.int64)
+
+
+def read_DGheaders(buffer, offsets):
+    """
+    Cette fonction permet de decoder en bloc les entetes des enregistrements 'Q' d'un fichier .dg.
+
+    Parametres
+    ----------
+    buffer : mmap or bytes
+        contenu du fichier .dg
+    offsets : np.array of int
+        position du debut de chaque enregistrement, cf. index_DGfile
+
+    Sortie
+    -------
+    headers : np.array (DG_HEADER_DTYPE)
+        entete de chaque enregistrement
+
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    raw = data[offsets[:, None] + np.arange(DG_HEADER_DTYPE.itemsize)]
+    return raw.view(DG_HEADER_DTYPE)[:, 0]
+
+
+def read_DGsamples(buffer, offsets, first, count):
+    """
+    Cette fonction permet de lire un bloc d'echantillons int16 de meme taille dans plusieurs enregistrements et de le convertir en dB.
+
+    Parametres
+    ----------
+    buffer : mmap or bytes
+        contenu du fichier .dg
+    offsets : np.array of int
+        position du debut de chaque enregistrement
+    first : int
+        indice du premier echantillon du bloc (apres l'entete)
+    count : int
+        nombre d'echantillons du bloc
+
+    Sortie
+    -------
+    power : np.array of float32
+        matrice (enregistrement x echantillon) de puissance en dB
+
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    start = offsets + DG_HEADER_DTYPE.itemsize + 2*first
+    counts = data[start[:, None] + np.arange(2*count)].view('<i2')
+    return counts.astype(np.float32) * POWER_SCALE
+
+
+def DG_date(filepath, survey_date=None):
+    """
+    Cette fonction renvoie le jour du leve : survey_date s'il est donne, sinon la date du nom du fichier (par ex : 'L0024-D20201007-T140952-...').
+    """
+    if survey_date is not None:
+        return dt.datetime(survey_date.year, survey_date.month, survey_date.day)
+    match = re.search(r'-D(\d{8})-', os.path.basename(filepath))
+    if match is None:
+        raise Exception('Date du leve absente du nom du fichier : '+filepath)
+    return dt.datetime.strptime(match.group(1), '%Y%m%d')
+
+
+def DG_times(times, day):
+    """
+    Cette fonction convertit les heures des enregistrements (b'hhmmsscc') en dates absolues (np.datetime64[ns]).
+    Le passage de minuit est detecte par le retour en arriere de l'heure.
+    """
+    value = times.astype(np.int64)
+    seconds = (value // 1000000)*3600 + (value // 10000 % 100)*60 + (value % 10000)/100
+    tod = np.round(seconds*1e9).astype('timedelta64[ns]')
+    days = np.concatenate([[0], np.cumsum(np.diff(tod) < -np.timedelta64(12, 'h'))]).astype('timedelta64[D]')
+    return np.datetime64(day, 'ns') + days + tod
+
+
+def read_DGfile(filepath, line, channels, range_detection, depth_max_toSave, survey_date=None, angle=None, detection=None):
+    """
+    Cette fonction permet de lire un fichier .dg, puis elle enregistre les donnees dans des dictionnaires,
+    sous la meme forme que la lecture des fichiers .raw (cf. read_RAWfile des scripts decode_and_save).
+    Le signal Power est le bloc colonne d'eau ; la fenetre autour du fond est conservee dans PowerBottom
+    et la profondeur detectee par le sondeur dans DepthSounder. Les attributs absents des fichiers .dg
+    (TransmitPower, Heave, Tx_Roll...) valent NaN.
+
+    Parametres
+    ----------
+    filepath : string
+        chemin vers le fichier .dg issu de l'EA400
+    line : string
+        identifiant du fichier de donnees, ici nom de la ligne, par ex : 'L0006'
+    channels : list of int
+        liste des canaux que l'on souhaite lire, par ex : [1,2] [1], ou [2] avec {1:38kHz ; 2:200kHz}
+    range_detection : list of int
+        intervalle de profondeur utilise pour la detection du fond, par ex : [5,100]
+    depth_max_toSave : int
+        profondeur seuil pour la sauvegarde des donnees, ne pas sauvegarder si la profondeur est superieure au seuil
+    survey_date : datetime
+        jour du leve ; None pour la date du nom du fichier
+    angle : dictionary
+        angle du transducteur pour chaque ligne (colonne Angle), par ex : {'L0006':0} ; None si inutile
+    detection : dictionary
+        options de detection du fond, cf. ea400_bottom.detect_bottom, par ex : {'method': 'threshold', 'refine': True} ;
+        None pour le maximum de puissance
+
+    Sorties
+    -------
+    d_param : dictionary
+        dictionnaire comprenant les parametres d'acquisition de la ligne, pour chaque canal : d_param[channel][line]
+    d_power : dictionary
+        dictionnaire comprenant l'ensemble des donnees acoustiques mesurees pendant une ligne, pour chaque canal : d_power[channel][line]
+
+    """
+    d_power = {channel: {} for channel in channels}
+    d_param = {channel: {} for channel in channels}
+    day = DG_date(filepath, survey_date)
+
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return d_param, d_power
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            offsets, lengths = index_DGfile(mm)
+            # seuls les enregistrements d'echantillons 'Q' complets sont lus
+            keep = lengths >= DG_HEADER_DTYPE.itemsize
+            offsets, lengths = offsets[keep], lengths[keep]
+            headers = read_DGheaders(mm, offsets)
+            n_sample = headers['PelagicCount'].astype(np.int64) + headers['BottomCount']
+            keep = (headers['Type'] == b'Q') & (lengths >= DG_HEADER_DTYPE.itemsize + 2*n_sample)
+            offsets, headers = offsets[keep], headers[keep]
+
+            for channel in channels:
+                select = headers['Channel'] == str(channel).encode()
+                if not select.any():
+                    continue
+                h = headers[select]
+                o = offsets[select]
+                n_ping = h.shape[0]
+                power_col = np.empty(n_ping, dtype=object)
+                bottom_col = np.empty(n_ping, dtype=object)
+                ping_start = np.zeros(n_ping, dtype=np.float64) # profondeur du premier echantillon
+                ping_step = np.zeros(n_ping, dtype=np.float64) # pas des echantillons
+                ping_first = np.zeros(n_ping, dtype=np.int32) # indices du premier et du dernier echantillon de l'intervalle de detection
+                ping_last = np.zeros(n_ping, dtype=np.int32)
+
+                # les pings sont traites par groupes de meme geometrie (nombre d'echantillons, debut et portee du bloc colonne d'eau)
+                geometry = np.stack([h['PelagicCount'], h['BottomCount'], h['PelagicStart'].view('<i4'), h['PelagicRange'].view('<i4')], axis=1)
+                groups, group_id = np.unique(geometry, axis=0, return_inverse=True)
+                for g in range(groups.shape[0]):
+                    rows = np.flatnonzero(group_id.reshape(-1) == g)
+                    first = h[rows[0]]
+                    n_pelagic, n_bottom = int(first['PelagicCount']), int(first['BottomCount'])
+                    start, step = float(first['PelagicStart']), float(first['PelagicRange']) / max(n_pelagic, 1)
+
+                    pelagic = read_DGsamples(mm, o[rows], 0, n_pelagic)
+                    bottom = read_DGsamples(mm, o[rows], n_pelagic, n_bottom)
+
+                    # Conversion des profondeurs en indices
+                    i_max_save = min(round((depth_max_toSave - start) / step), n_pelagic - 1)
+                    i_min_detect = max(round((range_detection[0] - start) / step), 0)
+                    i_max_detect = min(round((range_detection[1] - start) / step), n_pelagic - 1)
+
+                    ping_start[rows], ping_step[rows] = start, step
+                    ping_first[rows], ping_last[rows] = i_min_detect, i_max_detect
+
+                    # puissance sauvegardee jusqu'a la plus grande des profondeurs depth_max_toSave et range_detection[1]
+                    for k, i in enumerate(rows):
+                        power_col[i] = pelagic[k, :max(i_max_save, i_max_detect)+1]
+                        bottom_col[i] = bottom[k]
+
+                # Detection du fond en une fois sur l'ensemble des pings du canal
+                i_detect, power_max = detect_bottom(stack_samples(power_col), ping_first, ping_last, **(detection or {}))
+                depth = ping_start + i_detect * ping_step
+
+                # - - - Stockage des donnees dans les dictionnaires d_param et d_power - - - #
+                data = {'DateTime': DG_times(h['Time'], day), 'Power': power_col,
+                        'PowerDetectInterval': slice_samples(power_col, ping_first, ping_last),
+                        'PowerMax': power_max, 'Depth': depth, 'DetectFirst': ping_first, 'DetectLast': ping_last, 'DepthSounder': h['Depth'].astype(np.float64), 'PowerBottom': bottom_col}
+                # colonnes des trames RAW0 absentes des fichiers .dg, avec les memes types
+                for name, dtype in DG_MISSING_DTYPES.items():
+                    data[name] = missing_column(dtype, n_ping)
+                columns = list(DG_COLUMNS)
+                param_columns = list(DG_PARAM_COLUMNS)
+                if angle is not None:
+                    data['Angle'] = angle[line]
+                    columns.insert(columns.index('DateTime')+1, 'Angle')
+                    param_columns.insert(param_columns.index('Frequency')+1, 'Angle')
+                # DataFrame dont l'index est le numero du ping
+                d_power[channel][line] = pandas.DataFrame(data, columns=columns, index=np.arange(1, n_ping+1))
+
+                # metadonnees du premier ping ; SampleInterval et SoundVelocity donnent le pas des echantillons du bloc colonne d'eau
+                first = h[0]
+                step = float(first['PelagicRange']) / max(int(first['PelagicCount']), 1)
+                param = {'TransectName': line, 'Channel': channel, 'Frequency': DG_FREQUENCY.get(channel, np.nan),
+                         'SampleInterval': 2*step / DG_SOUND_VELOCITY, 'SoundVelocity': DG_SOUND_VELOCITY,
+                         'Count': int(first['PelagicCount']), 'DepthMaxSave': depth_max_toSave,
+                         'DepthMinDetect': range_detection[0], 'DepthMaxDetect': range_detection[1],
+                         'PelagicStart': float(first['PelagicStart']), 'BottomStart': float(first['BottomStart']),
+                         'BottomRange': float(first['BottomRange']), 'BottomCount': int(first['BottomCount'])}
+                for name, dtype in DG_MISSING_PARAM_DTYPES.items():
+                    param[name] = missing_column(dtype, 1)
+                if angle is not None:
+                    param['Angle'] = angle[line]
+                d_param[channel][line] = pandas.DataFrame(param, index=['param'], columns=param_columns)
+        finally:
+            mm.close()
+
+    return d_param, d_power
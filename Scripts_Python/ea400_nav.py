@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Auteur : Aelaig COURNEZ - Flora GUES - Yann LAMBRECHTS - Romain SAFRAN
+
+# Librairies importee
+import numpy as np
+from scipy.spatial.transform import Rotation as R
+
+#--------------------------------------------------------------------------------#
+#                   INTERPOLATION DE LA NAVIGATION AUX PINGS                     #
+#                                                                                #
+#   Ce code permet d'interpoler les donnees de positionnement et d'attitude      #
+#   (Qinsy) aux dates des pings, sans fusionner ni trier les deux tables : les   #
+#   deux mesures encadrant chaque ping sont trouvees par recherche dichotomique  #
+#   (np.searchsorted) sur les dates en nanosecondes. Les angles sont deroules    #
+#   avant interpolation (pas de saut 359 -> 0 degres) et l'attitude complete     #
+#   (cap, tangage, roulis) peut etre interpolee par SLERP. Les limites           #
+#   d'extrapolation et l'ecart maximal entre deux mesures sont explicites.       #
+#   Les flux des differents capteurs (gyro, position, attitude) sont rassembles  #
+#   sur une meme base de temps avec une tolerance (align_streams).               #
+#--------------------------------------------------------------------------------#
+
+# Colonnes de la trajectoire interpolees aux pings
+NAV_COLUMNS = ['X', 'Y', 'Height', 'Gyro', 'Pitch', 'Roll', 'Heave']
+
+# Colonnes angulaires (en degres), deroulees avant interpolation
+NAV_ANGLES = ['Gyro', 'Pitch', 'Roll']
+
+# Attitude interpolee par SLERP : colonnes du cap, du tangage et du roulis (en degres) ; None pour une interpolation angle par angle
+NAV_ATTITUDE = ('Gyro', 'Pitch', 'Roll')
+
+# Extrapolation autorisee (en s) avant la premiere et apres la derniere mesure : la valeur extreme est reprise, au-dela NaN
+NAV_EXTRAPOLATION = 1.
+
+# Ecart maximal (en s) entre les deux mesures encadrant un ping ; au-dela NaN (None : pas de limite)
+NAV_MAX_GAP = None
+
+# Tolerance (en s) de l'appariement des mesures de deux capteurs par la mesure la plus proche
+ALIGN_TOLERANCE = 0.005
+
+# Ecart maximal (en s) entre les deux mesures encadrant une date pour l'appariement par interpolation lineaire
+ALIGN_MAX_GAP = 1.
+
+
+def to_nanoseconds(times):
+    """
+    Cette fonction convertit des dates (datetime64, Series ou DatetimeIndex) en entiers int64 de nanosecondes depuis 1970.
+    """
+    return np.asarray(times, dtype='datetime64[ns]').astype(np.int64)
+
+
+def wrap_degrees(angles, signed):
+    """
+    Cette fonction ramene des angles (en degres) dans [-180,180[ si signed est True, dans [0,360[ sinon.
+    """
+    if signed:
+        return (angles + 180.) % 360. - 180.
+    return angles % 360.
+
+
+def unwrap_degrees(angles):
+    """
+    Cette fonction deroule une serie d'angles (en degres) : les sauts de plus de 180 degres entre deux mesures
+    successives sont corriges de 360 degres. Les mesures manquantes (NaN) sont ignorees.
+    """
+    unwrapped = angles.copy()
+    known = np.isfinite(angles)
+    unwrapped[known] = np.rad2deg(np.unwrap(np.deg2rad(angles[known])))
+    return unwrapped
+
+
+def nav_weights(t_nav, t_ping, max_extrapolation=NAV_EXTRAPOLATION, max_gap=NAV_MAX_GAP):
+    """
+    Cette fonction permet de trouver, pour chaque ping, les deux mesures de navigation qui l'encadrent
+    et le poids de l'interpolation lineaire entre ces deux mesures.
+
+    Parametres
+    ----------
+    t_nav : np.array of int64
+        dates des mesures de navigation (en ns), triees
+    t_ping : np.array of int64
+        dates des pings (en ns)
+    max_extrapolation : float
+        extrapolation autorisee (en s) avant la premiere et apres la derniere mesure ; None pour ne pas limiter
+    max_gap : float
+        ecart maximal (en s) entre les deux mesures encadrant un ping ; None pour ne pas limiter
+
+    Sorties
+    -------
+    i0, i1 : np.array of int
+        indices des mesures encadrant chaque ping
+    weight : np.array of float
+        poids de la mesure i1 (entre 0 et 1)
+    valid : np.array of boolean
+        True si la navigation est disponible pour le ping
+
+    """
+    n_nav = len(t_nav)
+    if n_nav == 0:
+        zeros = np.zeros(len(t_ping), dtype=np.int64)
+        return zeros, zeros, np.zeros(len(t_ping)), np.zeros(len(t_ping), dtype=bool)
+    i1 = np.searchsorted(t_nav, t_ping, side='right')
+    i0 = np.clip(i1 - 1, 0, n_nav - 1)
+    i1 = np.clip(i1, 0, n_nav - 1)
+    span = t_nav[i1] - t_nav[i0]
+    # hors de la navigation, i0 = i1 : la valeur extreme est reprise
+    weight = (t_ping - t_nav[i0]) / np.where(span > 0, span, 1)
+    weight = np.where(span > 0, np.clip(weight, 0., 1.), 0.)
+
+    valid = np.ones(len(t_ping), dtype=bool)
+    if max_extrapolation is not None:
+        limit = int(max_extrapolation * 1e9)
+        valid &= (t_ping >= t_nav[0] - limit) & (t_ping <= t_nav[-1] + limit)
+    if max_gap is not None:
+        valid &= span <= int(max_gap * 1e9)
+    return i0, i1, weight, valid
+
+
+def slerp_attitude(heading, pitch, roll, i0, i1, weight):
+    """
+    Cette fonction permet d'interpoler l'attitude (cap, tangage, roulis en degres) par SLERP entre les mesures i0 et i1 :
+    la rotation est interpolee sur le plus court chemin, sans saut au passage 359 -> 0 degres ni couplage errone des angles.
+
+    Sorties
+    -------
+    heading, pitch, roll : np.array of float
+        angles interpoles (en degres), cap dans [-180,180[
+    """
+    angles = np.column_stack([heading, pitch, roll])
+    known = np.isfinite(angles).all(axis=1)
+    attitude = R.from_euler('ZYX', np.where(known[:, None], angles, 0.), degrees=True)
+    start = attitude[i0]
+    delta = (start.inv() * attitude[i1]).as_rotvec()
+    interpolated = start * R.from_rotvec(delta * weight[:, None])
+    angles = interpolated.as_euler('ZYX', degrees=True)
+    angles[~(known[i0] & known[i1])] = np.nan # mesure d'attitude manquante
+    return angles[:, 0], angles[:, 1], angles[:, 2]
+
+
+def interpolate_nav(t_ping, t_nav, nav, columns=NAV_COLUMNS, angles=NAV_ANGLES, attitude=NAV_ATTITUDE,
+                    max_extrapolation=NAV_EXTRAPOLATION, max_gap=NAV_MAX_GAP):
+    """
+    Cette fonction permet d'interpoler les donnees de navigation aux dates des pings, en O(n_ping log n_nav),
+    sans construire de table intermediaire.
+
+    Parametres
+    ----------
+    t_ping : np.array of datetime64
+        dates des pings
+    t_nav : np.array of datetime64
+        dates des mesures de navigation (pas forcement triees)
+    nav : DataFrame or dictionary
+        donnees de navigation, une colonne par attribut
+    columns : list of string
+        colonnes a interpoler
+    angles : list of string
+        colonnes angulaires (en degres), deroulees avant l'interpolation lineaire puis ramenees dans leur intervalle
+        ([0,360[ si toutes les mesures sont positives, [-180,180[ sinon)
+    attitude : tuple of string
+        colonnes (cap, tangage, roulis) interpolees ensemble par SLERP ; None pour les interpoler angle par angle
+    max_extrapolation : float
+        extrapolation autorisee (en s) avant la premiere et apres la derniere mesure, la valeur extreme etant reprise ;
+        None pour ne pas limiter
+    max_gap : float
+        ecart maximal (en s) entre les deux mesures encadrant un ping ; None pour ne pas limiter
+
+    Sortie
+    -------
+    result : dictionary
+        colonnes numpy interpolees (float64), NaN pour les pings sans navigation
+
+    """
+    t_nav = to_nanoseconds(t_nav)
+    t_ping = to_nanoseconds(t_ping)
+    order = np.argsort(t_nav, kind='stable')
+    t_nav = t_nav[order]
+    values = {name: np.asarray(nav[name], dtype=np.float64)[order] for name in columns}
+    i0, i1, weight, valid = nav_weights(t_nav, t_ping, max_extrapolation, max_gap)
+
+    result = {}
+    for name in columns:
+        v = values[name]
+        signed = name in angles and bool(np.nanmin(v, initial=0.) < 0)
+        if name in angles:
+            v = unwrap_degrees(v)
+        interpolated = v[i0] + weight * (v[i1] - v[i0]) if len(v) else np.full(len(t_ping), np.nan)
+        result[name] = wrap_degrees(interpolated, signed) if name in angles else interpolated
+
+    if attitude is not None and len(t_nav) and all(name in columns for name in attitude):
+        heading, pitch, roll = slerp_attitude(*(values[name] for name in attitude), i0, i1, weight)
+        signed = bool(np.nanmin(values[attitude[0]], initial=0.) < 0)
+        result[attitude[0]] = wrap_degrees(heading, signed)
+        result[attitude[1]] = pitch
+        result[attitude[2]] = roll
+
+    for name in result:
+        result[name] = np.where(valid, result[name], np.nan)
+    return result
+
+
+def align_streams(streams, reference=None, methods=None, tolerance=ALIGN_TOLERANCE, max_gap=ALIGN_MAX_GAP,
+                  angles=NAV_ANGLES, dropna=True):
+    """
+    Cette fonction permet de rassembler les mesures de plusieurs capteurs (par ex. gyro, position et attitude de la
+    centrale inertielle) sur la base de temps d'un flux de reference, sans egalite exacte des dates : chaque flux est
+    apparie par la mesure la plus proche a moins de tolerance secondes ('nearest') ou interpole lineairement entre
+    les deux mesures qui encadrent la date ('linear'). Les flux sont tries une fois puis apparies par recherche
+    dichotomique, sans fusion de tables.
+
+    Parametres
+    ----------
+    streams : dictionary
+        flux de mesures, par nom : dictionnaire (ou DataFrame) de colonnes avec une colonne 'DateTime' (datetime64) ;
+        les colonnes portent des noms differents d'un flux a l'autre
+    reference : string
+        nom du flux qui fournit la base de temps ; None pour le premier flux
+    methods : dictionary
+        appariement de chaque flux, 'nearest' (par defaut) ou 'linear', par ex : {'gyro': 'linear'}
+    tolerance : float
+        ecart maximal (en s) a la mesure la plus proche pour 'nearest', et extrapolation autorisee pour 'linear'
+    max_gap : float
+        ecart maximal (en s) entre les deux mesures encadrantes pour 'linear' ; None pour ne pas limiter
+    angles : list of string
+        colonnes angulaires (en degres), deroulees avant l'interpolation lineaire
+    dropna : boolean
+        True pour supprimer les dates de reference ou un flux n'a pas de mesure (comme une jointure interne)
+
+    Sorties
+    -------
+    aligned : dictionary
+        colonnes numpy de tous les flux sur la base de temps de reference (colonne 'DateTime' triee)
+    report : dictionary
+        pour chaque flux : 'missing' (dates de reference sans mesure), 'unused' (mesures non utilisees) ;
+        et 'dropped' (dates de reference supprimees si dropna)
+
+    """
+    methods = methods or {}
+    names = list(streams)
+    reference = reference or names[0]
+    t_ref = to_nanoseconds(streams[reference]['DateTime'])
+    order = np.argsort(t_ref, kind='stable')
+    t_ref = t_ref[order]
+    aligned = {'DateTime': t_ref.astype('datetime64[ns]')}
+    found = np.ones(len(t_ref), dtype=bool)
+    report = {}
+    for name in names:
+        columns = [column for column in streams[name] if column != 'DateTime']
+        if name == reference:
+            for column in columns:
+                aligned[column] = np.asarray(streams[name][column])[order]
+            continue
+        t = to_nanoseconds(streams[name]['DateTime'])
+        sort = np.argsort(t, kind='stable')
+        t = t[sort]
+        values = {column: np.asarray(streams[name][column], dtype=np.float64)[sort] for column in columns}
+        if methods.get(name, 'nearest') == 'linear':
+            i0, i1, weight, valid = nav_weights(t, t_ref, tolerance, max_gap)
+            used = np.concatenate([i0[valid], i1[valid]])
+            for column in columns:
+                v = values[column]
+                signed = column in angles and bool(np.nanmin(v, initial=0.) < 0)
+                if column in angles:
+                    v = unwrap_degrees(v)
+                interpolated = v[i0] + weight * (v[i1] - v[i0]) if len(t) else np.full(len(t_ref), np.nan)
+                aligned[column] = np.where(valid, wrap_degrees(interpolated, signed) if column in angles else interpolated, np.nan)
+        else:
+            i0, i1, weight, valid = nav_weights(t, t_ref, None, None)
+            nearest = np.where(weight > 0.5, i1, i0)
+            if len(t):
+                valid &= np.abs(t_ref - t[nearest]) <= int(tolerance * 1e9)
+            used = nearest[valid]
+            for column in columns:
+                aligned[column] = np.where(valid, values[column][nearest], np.nan) if len(t) else np.full(len(t_ref), np.nan)
+        found &= valid
+        is_used = np.zeros(len(t), dtype=bool)
+        is_used[used] = True
+        report[name] = {'missing': int(np.count_nonzero(~valid)), 'unused': int(np.count_nonzero(~is_used))}
+
+    report[reference] = {'missing': 0, 'unused': int(np.count_nonzero(~found)) if dropna else 0}
+    report['dropped'] = int(np.count_nonzero(~found)) if dropna else 0
+    if dropna:
+        aligned = {column: values[found] for column, values in aligned.items()}
+    return aligned, report
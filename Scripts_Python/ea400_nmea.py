@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Auteur : Aelaig COURNEZ - Flora GUES - Yann LAMBRECHTS - Romain SAFRAN
+
+# Librairies importee
+import numpy as np
+# Autres codes python
+from ea400_datagrams import filetime_to_datetime64
+
+#--------------------------------------------------------------------------------#
+#                   DECODAGE EN BLOC DES PHRASES NMEA (TRAMES NME0)              #
+#                                                                                #
+#   Ce code permet de decoder en une seule fois l'ensemble des phrases NMEA      #
+#   enregistrees dans les trames NME0 d'un fichier EA400. Les phrases GGA, RMC,  #
+#   ZDA, HDT et VTG (quel que soit l'emetteur : $GP, $GN, $IN...) sont           #
+#   converties en colonnes numpy. Les dates sont absolues : le jour est donne    #
+#   par les phrases ZDA/RMC, ce qui gere le passage de minuit.                   #
+#--------------------------------------------------------------------------------#
+
+# Numero des champs utiles de chaque phrase (le champ 0 est l'identifiant, ex : $GPGGA)
+# et nombre minimal de champs pour que la phrase soit decodee
+NMEA_FIELDS = {
+    'GGA': ({'time':1, 'lat':2, 'lat_hemi':3, 'lon':4, 'lon_hemi':5, 'quality':6, 'n_sat':7, 'hdop':8, 'alt':9, 'geoid':11}, 12),
+    'RMC': ({'time':1, 'status':2, 'lat':3, 'lat_hemi':4, 'lon':5, 'lon_hemi':6, 'sog':7, 'cog':8, 'date':9}, 10),
+    'ZDA': ({'time':1, 'day':2, 'month':3, 'year':4}, 5),
+    'HDT': ({'heading':1}, 2),
+    'VTG': ({'cog':1, 'sog':5, 'sog_kmh':7}, 8),
+}
+
+# Ecart maximal entre l'heure d'une phrase et sa date de reference (au dela, on change de jour)
+DEMI_JOURNEE = np.timedelta64(12*3600, 's')
+
+
+def split_sentences(payloads):
+    """
+    Cette fonction permet de separer en phrases NMEA le contenu d'un ensemble de trames NME0.
+
+    Parametres
+    ----------
+    payloads : list of bytes
+        contenu des trames NME0 (texte NMEA, apres l'entete de 12 octets)
+
+    Sorties
+    -------
+    sentences : np.array of bytes
+        phrases NMEA, sans fin de ligne ni somme de controle
+    owner : np.array of int
+        numero de la trame NME0 contenant chaque phrase
+
+    """
+    if len(payloads) == 0:
+        return np.array([], dtype='S1'), np.array([], dtype=np.int64)
+    # un separateur de ligne est ajoute entre les trames pour que chaque phrase appartienne a une seule trame
+    text = b'\n'.join(payloads).replace(b'\x00', b'').replace(b'\r', b'')
+    lines = text.split(b'\n')
+    # numero de trame de chaque ligne : nombre de separateurs avant la ligne
+    n_lines = np.fromiter((p.count(b'\n') + 1 for p in payloads), dtype=np.int64, count=len(payloads))
+    owner = np.repeat(np.arange(len(payloads)), n_lines)
+    sentences = np.array(lines)
+    keep = np.char.startswith(sentences, b'$')
+    # suppression de la somme de controle (*hh)
+    sentences = np.char.partition(sentences[keep], b'*')[:, 0]
+    return sentences, owner[keep]
+
+
+def sentence_types(sentences):
+    """
+    Cette fonction renvoie le type de chaque phrase NMEA (ex : b'GGA' pour $GPGGA), sans l'identifiant de l'emetteur.
+    """
+    if sentences.shape[0] == 0:
+        return np.array([], dtype='S3')
+    width = max(sentences.dtype.itemsize, 6)
+    chars = np.ascontiguousarray(sentences.astype('S%d' % width)).view('S1').reshape(-1, width)
+    return np.ascontiguousarray(chars[:, 3:6]).view('S3')[:, 0]
+
+
+def split_fields(sentences, n_min):
+    """
+    Cette fonction permet de decouper en champs un ensemble de phrases NMEA de meme type.
+
+    Parametres
+    ----------
+    sentences : np.array of bytes
+        phrases NMEA d'un meme type
+    n_min : int
+        nombre minimal de champs, les phrases plus courtes sont ignorees
+
+    Sorties
+    -------
+    fields : np.array of bytes
+        matrice (phrase x champ) des champs, limitee aux n_min premiers champs
+    keep : np.array of bool
+        phrases decodees
+
+    """
+    n_fields = np.char.count(sentences, b',') + 1
+    keep = n_fields >= n_min
+    fields = np.empty((sentences.shape[0], n_min), dtype=sentences.dtype)
+    # les phrases sont regroupees par nombre de champs pour etre decoupees en un seul bloc
+    for n in np.unique(n_fields[keep]):
+        rows = np.flatnonzero(n_fields == n)
+        split = b','.join(sentences[rows]).split(b',')
+        fields[rows] = np.array(split, dtype=sentences.dtype).reshape(-1, n)[:, :n_min]
+    return fields[keep], keep
+
+
+def to_float(column):
+    """
+    Cette fonction convertit une colonne de champs NMEA en reels (NaN pour les champs vides).
+    """
+    column = np.char.strip(column)
+    return np.where(column == b'', b'nan', column).astype(np.float64)
+
+
+def to_degrees(column, hemisphere, negative):
+    """
+    Cette fonction convertit des coordonnees NMEA (ddmm.mmmm) en degres decimaux, negatifs pour l'hemisphere negative (b'S' ou b'W').
+    """
+    value = to_float(column)
+    degrees = np.floor(value / 100)
+    degrees = degrees + (value - degrees*100) / 60
+    return np.where(hemisphere == negative, -degrees, degrees)
+
+
+def to_time_of_day(column):
+    """
+    Cette fonction convertit des heures NMEA (hhmmss.ss) en duree depuis minuit (np.timedelta64 en ns).
+    """
+    value = to_float(column)
+    seconds = np.floor(value/10000)*3600 + np.floor(value/100 % 100)*60 + value % 100
+    return np.round(seconds*1e9).astype('timedelta64[ns]')
+
+
+def to_date(year, month, day):
+    """
+    Cette fonction construit des dates (np.datetime64 au jour) a partir de colonnes reelles annee, mois, jour (NaT si un champ est vide).
+    """
+    valid = ~(np.isnan(year) | np.isnan(month) | np.isnan(day))
+    year, month, day = [np.where(valid, c, 1).astype(np.int64) for c in (year, month, day)]
+    date = (year - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (month - 1).astype('timedelta64[M]')
+    date = date.astype('datetime64[D]') + (day - 1).astype('timedelta64[D]')
+    return np.where(valid, date, np.datetime64('NaT'))
+
+
+def absolute_time(time_of_day, ref_time):
+    """
+    Cette fonction construit des dates absolues a partir de l'heure de chaque phrase et d'une date de reference proche.
+    Le jour de la reference est retenu, puis decale d'un jour si l'ecart depasse une demi-journee (passage de minuit).
+
+    Parametres
+    ----------
+    time_of_day : np.array of timedelta64
+        heure de chaque phrase (duree depuis minuit)
+    ref_time : np.array of datetime64
+        date de reference de chaque phrase
+
+    Sortie
+    -------
+    time : np.array of datetime64[ns]
+        dates absolues
+
+    """
+    ref_time = ref_time.astype('datetime64[ns]')
+    time = ref_time.astype('datetime64[D]').astype('datetime64[ns]') + time_of_day
+    time = np.where(time - ref_time > DEMI_JOURNEE, time - np.timedelta64(1, 'D'), time)
+    time = np.where(ref_time - time > DEMI_JOURNEE, time + np.timedelta64(1, 'D'), time)
+    return time
+
+
+def nearest_previous(position, ref_position):
+    """
+    Cette fonction renvoie, pour chaque position, l'indice de la reference precedente (ou de la premiere reference s'il n'y en a pas).
+    """
+    i = np.searchsorted(ref_position, position, side='right') - 1
+    return np.maximum(i, 0)
+
+
+def parse_NMEA(payloads, datagram_times=None, survey_date=None):
+    """
+    Cette fonction permet de decoder en bloc les phrases NMEA d'un ensemble de trames NME0.
+
+    La date de chaque phrase est construite a partir de son heure et de la phrase ZDA/RMC la plus proche
+    qui la precede dans le fichier. En l'absence de phrase ZDA/RMC, le jour est donne par survey_date,
+    ou a defaut par la date des trames NME0 (horloge du PC d'acquisition).
+    Les phrases sans heure (HDT, VTG) prennent la date de la derniere phrase datee qui les precede.
+
+    Parametres
+    ----------
+    payloads : list of bytes
+        contenu des trames NME0 (texte NMEA, apres l'entete de 12 octets)
+    datagram_times : np.array of uint64
+        dates FILETIME des trames NME0, une par trame
+    survey_date : datetime
+        jour du leve, utilise seulement si le fichier ne contient pas de phrase ZDA/RMC ; None pour la date des trames
+
+    Sortie
+    -------
+    nav : dictionary
+        pour chaque type de phrase ('GGA','RMC','ZDA','HDT','VTG'), dictionnaire de colonnes numpy :
+        GGA : DateTime, lat, lon, z (altitude ellipsoidale), quality, n_sat, hdop
+        RMC : DateTime, lat, lon, sog (noeuds), cog (deg), valid
+        ZDA : DateTime
+        HDT : DateTime, heading (deg)
+        VTG : DateTime, cog (deg), sog (noeuds), sog_kmh
+
+    """
+    sentences, owner = split_sentences(payloads)
+    kinds = sentence_types(sentences)
+    position = np.arange(sentences.shape[0])
+
+    # - - - Decoupage des champs de chaque type de phrase - - - #
+    fields, positions = {}, {}
+    for kind, (columns, n_min) in NMEA_FIELDS.items():
+        rows = np.flatnonzero(kinds == kind.encode())
+        matrix, keep = split_fields(sentences[rows], n_min)
+        fields[kind] = {name: matrix[:, i] for name, i in columns.items()}
+        positions[kind] = rows[keep]
+
+    # - - - Dates de reference : phrases ZDA et RMC - - - #
+    ref_dates = []
+    if positions['ZDA'].shape[0] > 0:
+        f = fields['ZDA']
+        date = to_date(to_float(f['year']), to_float(f['month']), to_float(f['day']))
+        ref_dates.append((positions['ZDA'], date.astype('datetime64[ns]') + to_time_of_day(f['time'])))
+    if positions['RMC'].shape[0] > 0:
+        ddmmyy = to_float(fields['RMC']['date'])
+        date = to_date(2000 + ddmmyy % 100, ddmmyy // 100 % 100, ddmmyy // 10000)
+        ref_dates.append((positions['RMC'], date.astype('datetime64[ns]') + to_time_of_day(fields['RMC']['time'])))
+
+    fixed_day = False # jour fixe par l'utilisateur
+    if ref_dates:
+        ref_position = np.concatenate([p for p, _ in ref_dates])
+        ref_time = np.concatenate([t for _, t in ref_dates])
+        order = np.argsort(ref_position, kind='stable')
+        ref_position, ref_time = ref_position[order], ref_time[order]
+        # les dates incompletes (champs vides) ne servent pas de reference
+        valid = ~np.isnat(ref_time)
+        ref_position, ref_time = ref_position[valid], ref_time[valid]
+    if not ref_dates or ref_position.shape[0] == 0:
+        if survey_date is not None:
+            fixed_day = True
+            ref_position = np.array([0])
+            ref_time = np.array([np.datetime64(survey_date, 'ns') + np.timedelta64(12, 'h')])
+        else:
+            ref_position = position
+            ref_time = filetime_to_datetime64(np.asarray(datagram_times, dtype=np.uint64)[owner])
+
+    # - - - Dates absolues des phrases datees - - - #
+    times = np.full(sentences.shape[0], np.datetime64('NaT'), dtype='datetime64[ns]')
+    for kind in ['GGA', 'RMC', 'ZDA']:
+        rows = positions[kind]
+        if rows.shape[0] == 0:
+            continue
+        ref = ref_time[nearest_previous(rows, ref_position)]
+        if fixed_day:
+            # date fixee par l'utilisateur : le passage de minuit est detecte par le retour en arriere de l'heure
+            tod = to_time_of_day(fields[kind]['time'])
+            days = np.concatenate([[0], np.cumsum(np.diff(tod) < -DEMI_JOURNEE)])
+            times[rows] = ref.astype('datetime64[D]').astype('datetime64[ns]') + days.astype('timedelta64[D]') + tod
+        else:
+            times[rows] = absolute_time(to_time_of_day(fields[kind]['time']), ref)
+
+    # - - - Phrases sans heure : date de la derniere phrase datee - - - #
+    dated = np.flatnonzero(~np.isnat(times))
+    for kind in ['HDT', 'VTG']:
+        rows = positions[kind]
+        if rows.shape[0] == 0:
+            continue
+        if dated.shape[0] > 0:
+            times[rows] = times[dated[nearest_previous(rows, dated)]]
+        elif datagram_times is not None:
+            times[rows] = filetime_to_datetime64(np.asarray(datagram_times, dtype=np.uint64)[owner[rows]])
+
+    # - - - Colonnes de sortie - - - #
+    nav = {}
+    f = fields['GGA']
+    nav['GGA'] = {'DateTime': times[positions['GGA']],
+                  'lat': to_degrees(f['lat'], f['lat_hemi'], b'S'),
+                  'lon': to_degrees(f['lon'], f['lon_hemi'], b'W'),
+                  'z': to_float(f['alt']) + to_float(f['geoid']),
+                  'quality': to_float(f['quality']),
+                  'n_sat': to_float(f['n_sat']),
+                  'hdop': to_float(f['hdop'])}
+    f = fields['RMC']
+    nav['RMC'] = {'DateTime': times[positions['RMC']],
+                  'lat': to_degrees(f['lat'], f['lat_hemi'], b'S'),
+                  'lon': to_degrees(f['lon'], f['lon_hemi'], b'W'),
+                  'sog': to_float(f['sog']),
+                  'cog': to_float(f['cog']),
+                  'valid': f['status'] == b'A'}
+    nav['ZDA'] = {'DateTime': times[positions['ZDA']]}
+    nav['HDT'] = {'DateTime': times[positions['HDT']],
+                  'heading': to_float(fields['HDT']['heading'])}
+    f = fields['VTG']
+    nav['VTG'] = {'DateTime': times[positions['VTG']],
+                  'cog': to_float(f['cog']),
+                  'sog': to_float(f['sog']),
+                  'sog_kmh': to_float(f['sog_kmh'])}
+    return nav
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Auteur : Aelaig COURNEZ - Flora GUES - Yann LAMBRECHTS - Romain SAFRAN
+
+# Librairies importee
+import numpy as np
+from pyproj import Transformer
+
+#--------------------------------------------------------------------------------#
+#                   CHANGEMENT DE SYSTEME DE COORDONNEES                         #
+#                                                                                #
+#   Ce code regroupe les conversions de coordonnees utilisees par les scripts    #
+#   de decodage et d'analyse (par ex : WGS84 -> Lambert93). Les objets           #
+#   Transformer de pyproj sont couteux a construire : ils sont crees une seule   #
+#   fois par processus pour chaque couple (systeme source, systeme cible) puis   #
+#   reutilises. Les coordonnees sont converties par blocs de tableaux numpy.     #
+#--------------------------------------------------------------------------------#
+
+# Systeme de coordonnees geographiques des donnees de positionnement (WGS84)
+SOURCE_CRS = 'EPSG:4326'
+
+# Systeme de coordonnees projetees des donnees sauvegardees (Lambert93 par defaut)
+TARGET_CRS = 'EPSG:2154'
+
+# Nombre de points convertis par bloc
+CHUNK_SIZE = 1000000
+
+# Transformer deja construits, par couple (systeme source, systeme cible)
+_transformers = {}
+
+
+def set_target_crs(crs):
+    """
+    Cette fonction permet de changer le systeme de coordonnees projetees utilise par defaut, par ex : 'EPSG:32630' (UTM 30N).
+    """
+    global TARGET_CRS
+    TARGET_CRS = crs
+
+
+def get_transformer(src=None, dst=None):
+    """
+    Cette fonction renvoie le Transformer pyproj du couple (src, dst), construit au premier appel puis reutilise.
+    Les coordonnees sont toujours dans l'ordre (x, y), c'est-a-dire (lon, lat) pour un systeme geographique.
+
+    Parametres
+    ----------
+    src : string
+        systeme de coordonnees source, None pour SOURCE_CRS
+    dst : string
+        systeme de coordonnees cible, None pour TARGET_CRS
+
+    Sortie
+    -------
+    transformer : pyproj.Transformer
+        objet permettant de convertir les coordonnees de src vers dst
+
+    """
+    key = (src or SOURCE_CRS, dst or TARGET_CRS)
+    if key not in _transformers:
+        _transformers[key] = Transformer.from_crs(key[0], key[1], always_xy=True)
+    return _transformers[key]
+
+
+def transform_coords(x, y, src=None, dst=None, inplace=False, chunk_size=CHUNK_SIZE):
+    """
+    Cette fonction permet de convertir des coordonnees d'un systeme a un autre.
+
+    Parametres
+    ----------
+    x, y : np.array
+        coordonnees a convertir, par ex : longitudes et latitudes en WGS84
+    src : string
+        systeme de coordonnees source, None pour SOURCE_CRS
+    dst : string
+        systeme de coordonnees cible, None pour TARGET_CRS
+    inplace : bool
+        True pour ecrire le resultat dans x et y (tableaux numpy float64 contigus), False pour travailler sur une copie
+    chunk_size : int
+        nombre de points convertis par bloc
+
+    Sorties
+    -------
+    X, Y : np.array
+        coordonnees converties
+
+    """
+    transformer = get_transformer(src, dst)
+    if inplace:
+        X, Y = x, y
+    else:
+        X = np.array(x, dtype=np.float64)
+        Y = np.array(y, dtype=np.float64)
+    X_flat, Y_flat = X.reshape(-1), Y.reshape(-1)
+    for start in range(0, X_flat.shape[0], chunk_size):
+        transformer.transform(X_flat[start:start+chunk_size], Y_flat[start:start+chunk_size], inplace=True)
+    return X, Y
+
+
+def to_projected(lon, lat, dst=None):
+    """
+    Cette fonction permet de convertir des coordonnees WGS84 (lon, lat) dans le systeme projete dst (par defaut TARGET_CRS, Lambert93).
+    """
+    return transform_coords(lon, lat, SOURCE_CRS, dst)
+
+
+def to_geographic(X, Y, src=None):
+    """
+    Cette fonction permet de convertir des coordonnees projetees (systeme src, par defaut TARGET_CRS) en coordonnees WGS84 (lon, lat).
+    """
+    return transform_coords(X, Y, src or TARGET_CRS, SOURCE_CRS)
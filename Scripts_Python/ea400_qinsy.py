@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Auteur : Aelaig COURNEZ - Flora GUES - Yann LAMBRECHTS - Romain SAFRAN
+
+# Librairies importee
+import numpy as np
+import pandas
+import glob
+import os
+import importlib.util
+# Autres codes python
+from ea400_nmea import to_date
+
+#--------------------------------------------------------------------------------#
+#                   LECTURE DES FICHIERS TEXTE QINSY (EKINOX2)                   #
+#                                                                                #
+#   Ce code permet de lire les exports texte de la centrale inertielle Ekinox2   #
+#   enregistres par Qinsy (fichiers _gyro, _pos et _PRH d'une ligne) en          #
+#   colonnes numpy. Seules les colonnes utiles sont lues, avec le moteur csv     #
+#   multithread pyarrow s'il est installe, et les dates au format fixe           #
+#   jj/mm/aaaa hh:mm:ss.fff sont converties en un seul calcul vectorise. Les     #
+#   colonnes lues sont sauvegardees dans un fichier annexe (.nav.npz) par ligne, #
+#   relu tant que les fichiers texte n'ont pas change.                           #
+#--------------------------------------------------------------------------------#
+
+# Fichiers Qinsy d'une ligne : suffixe, nombre de lignes d'entete, noms des colonnes du fichier, colonnes conservees
+QINSY_FILES = {'gyro': ('.Ekinox2_gyro.txt', 4, ['DateTime','Gyro','a'], ['Gyro']),
+               'pos': ('.Ekinox2_pos.txt', 10, ['DateTime','Latitude','Longitude','Easting','Northing','Height','a','b','c'],
+                       ['Latitude','Longitude','Easting','Northing','Height']),
+               'prh': ('.Ekinox2_PRH.txt', 8, ['DateTime','Pitch','a','Roll','b','Heave','c'], ['Pitch','Roll','Heave'])}
+
+# Format des dates Qinsy (utilise si le format fixe n'est pas reconnu)
+QINSY_DATE_FORMAT = '%d/%m/%Y %H:%M:%S.%f'
+
+# Moteur de lecture des fichiers csv : 'pyarrow' (multithread) s'il est installe, sinon 'c'
+QINSY_ENGINE = 'pyarrow' if importlib.util.find_spec('pyarrow') is not None else 'c'
+
+# Extension du fichier annexe de la navigation d'une ligne
+NAV_EXT = '.nav.npz'
+
+# Version du format du fichier annexe
+NAV_VERSION = 1
+
+
+def parse_qinsy_time(column):
+    """
+    Cette fonction convertit des dates Qinsy au format fixe 'jj/mm/aaaa hh:mm:ss.fff' (nombre de decimales quelconque)
+    en np.datetime64[ns], en un seul calcul sur la matrice des caracteres. Si le format n'est pas reconnu,
+    la conversion est faite par pandas.to_datetime avec QINSY_DATE_FORMAT.
+
+    Parametres
+    ----------
+    column : np.array or Series of string
+        dates lues dans le fichier texte
+
+    Sortie
+    -------
+    time : np.array of datetime64[ns]
+        dates converties
+
+    """
+    text = np.char.strip(np.asarray(column, dtype='S'))
+    if len(text) == 0:
+        return np.zeros(0, dtype='datetime64[ns]')
+    width = text.dtype.itemsize
+    chars = np.frombuffer(text.tobytes(), dtype=np.uint8).reshape(len(text), width)
+    separators = {2: b'/', 5: b'/', 10: b' ', 13: b':', 16: b':', 19: b'.'}
+    if width < 20 or not all((chars[:, i] == ord(c)).all() for i, c in separators.items()):
+        return pandas.to_datetime(pandas.Series(column).astype(str), format=QINSY_DATE_FORMAT).values.astype('datetime64[ns]')
+
+    digits = chars.astype(np.int64) - ord('0')
+    def number(first, last):
+        value = np.zeros(len(text), dtype=np.int64)
+        for i in range(first, last):
+            value = value*10 + digits[:, i]
+        return value
+    date = to_date(number(6, 10).astype(np.float64), number(3, 5).astype(np.float64), number(0, 2).astype(np.float64))
+    seconds = number(11, 13)*3600 + number(14, 16)*60 + number(17, 19)
+    # partie decimale : caracteres apres le point, completes par des octets nuls
+    fraction = np.zeros(len(text), dtype=np.int64)
+    for i in range(20, min(width, 29)):
+        present = chars[:, i] != 0
+        fraction = np.where(present, fraction*10 + digits[:, i], fraction*10)
+    fraction *= 10**(29 - min(width, 29))
+    return date.astype('datetime64[ns]') + (seconds*10**9 + fraction).astype('timedelta64[ns]')
+
+
+def read_qinsy_file(filepath, skiprows, names, usecols, engine=None):
+    """
+    Cette fonction permet de lire un fichier texte Qinsy en colonnes numpy.
+
+    Parametres
+    ----------
+    filepath : string
+        chemin vers le fichier texte
+    skiprows : int
+        nombre de lignes d'entete
+    names : list of string
+        noms des colonnes du fichier
+    usecols : list of string
+        colonnes conservees (en plus de DateTime)
+    engine : string
+        moteur de lecture de pandas.read_csv ('pyarrow', 'c') ; None pour QINSY_ENGINE
+
+    Sortie
+    -------
+    columns : dictionary
+        colonnes 'DateTime' (datetime64[ns]) et usecols (float64)
+
+    """
+    table = pandas.read_csv(filepath, skiprows=skiprows, sep=',', names=names, usecols=['DateTime']+usecols,
+                            dtype={'DateTime': str}, engine=engine or QINSY_ENGINE)
+    columns = {'DateTime': parse_qinsy_time(table['DateTime'].values)}
+    for name in usecols:
+        columns[name] = pandas.to_numeric(table[name], errors='coerce').values.astype(np.float64)
+    return columns
+
+
+def qinsy_sources(qinsy_path, line):
+    """
+    Cette fonction renvoie le chemin des fichiers Qinsy d'une ligne de leve, par type de fichier (cf. QINSY_FILES).
+    """
+    return {kind: glob.glob(qinsy_path+line+'*'+suffix)[0] for kind, (suffix, _, _, _) in QINSY_FILES.items()}
+
+
+def read_qinsy(qinsy_path, line, use_cache=True, engine=None):
+    """
+    Cette fonction permet de lire les fichiers Qinsy (gyro, pos, PRH) d'une ligne de leve.
+    Si un fichier annexe (qinsy_path + line + NAV_EXT) existe et que les fichiers texte n'ont pas change
+    (taille et date de modification), les colonnes y sont relues ; sinon les fichiers texte sont lus puis sauvegardes.
+
+    Parametres
+    ----------
+    qinsy_path : string
+        chemin vers le repertoire des donnees Qinsy
+    line : string
+        identifiant de la ligne de leve, par ex : 'L0006'
+    use_cache : boolean
+        True pour relire/sauvegarder le fichier annexe, False pour toujours lire les fichiers texte
+    engine : string
+        moteur de lecture de pandas.read_csv, cf. read_qinsy_file
+
+    Sortie
+    -------
+    nav : dictionary
+        pour chaque type de fichier ('gyro', 'pos', 'prh'), dictionnaire des colonnes numpy (DateTime en datetime64[ns])
+
+    """
+    sources = qinsy_sources(qinsy_path, line)
+    stats = {kind: os.stat(filepath) for kind, filepath in sources.items()}
+    signature = np.array([[stats[kind].st_size, stats[kind].st_mtime_ns] for kind in QINSY_FILES], dtype=np.int64)
+    nav_path = qinsy_path + line + NAV_EXT
+    if use_cache and os.path.exists(nav_path):
+        with np.load(nav_path) as saved:
+            if int(saved['version']) == NAV_VERSION and np.array_equal(saved['signature'], signature):
+                nav = {kind: {} for kind in QINSY_FILES}
+                for key in saved.files:
+                    if '/' in key:
+                        kind, name = key.split('/')
+                        nav[kind][name] = saved[key]
+                return nav
+
+    nav = {}
+    for kind, (suffix, skiprows, names, usecols) in QINSY_FILES.items():
+        nav[kind] = read_qinsy_file(sources[kind], skiprows, names, usecols, engine)
+    if use_cache:
+        arrays = {kind+'/'+name: values for kind in nav for name, values in nav[kind].items()}
+        try:
+            with open(nav_path, 'wb') as f_nav:
+                np.savez(f_nav, version=NAV_VERSION, signature=signature, **arrays)
+        except OSError: # repertoire en lecture seule par ex., on continue sans sauvegarde
+            print('Navigation non sauvegardee pour la ligne : '+line)
+    return nav
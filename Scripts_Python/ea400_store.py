@@ -0,0 +1,598 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Auteur : Aelaig COURNEZ - Flora GUES - Yann LAMBRECHTS - Romain SAFRAN
+
+# Librairies importee
+import numpy as np
+import pandas
+import tables
+# Autres codes python
+from ea400_datagrams import POWER_SCALE
+
+#--------------------------------------------------------------------------------#
+#                       STOCKAGE DES PINGS EA400                                 #
+#                                                                                #
+#   Ce code regroupe les outils permettant de stocker les donnees des pings      #
+#   decodes par les scripts decode_and_save. Les donnees sont accumulees dans    #
+#   des tableaux numpy types (une colonne par attribut, une matrice par signal)  #
+#   puis converties en une seule fois en DataFrame a la fin de la lecture.       #
+#   Dans les fichiers h5, chaque signal est enregistre dans une matrice float32  #
+#   (ping x echantillon) compressee, avec le nombre d'echantillons valides de    #
+#   chaque ping, et les attributs scalaires dans un DataFrame type. Les          #
+#   puissances peuvent etre enregistrees sous forme de comptes int16 bruts de    #
+#   l'EA400 (facteur d'echelle en metadonnee), convertis en dB a la lecture.     #
+#   Les pings d'une ligne suivie pendant l'acquisition sont ajoutes au fichier   #
+#   (DataFrame au format table et matrices extensibles) sans le reecrire.        #
+#--------------------------------------------------------------------------------#
+
+# Suffixe du groupe h5 contenant les matrices des signaux d'un DataFrame, par ex : '/data_samples' pour la clef 'data'
+SAMPLES_SUFFIX = '_samples'
+
+# Compression des matrices des signaux
+SAMPLES_FILTERS = tables.Filters(complevel=4, complib='zlib', shuffle=True)
+
+# Nombre de pings par bloc (chunk) des matrices des signaux
+SAMPLES_CHUNK_PINGS = 256
+
+# Signaux restitues comme des vues sur un autre signal, sans etre stockes :
+# nom -> (signal source, colonne de l'indice du premier echantillon, colonne de l'indice du dernier echantillon)
+VIEW_SIGNALS = {'PowerDetectInterval': ('Power', 'DetectFirst', 'DetectLast')}
+
+
+class PingAccumulator:
+    """
+    Cette classe permet d'accumuler les donnees des pings d'une ligne de leve.
+    Chaque attribut scalaire est stocke dans un tableau numpy type et chaque signal (par ex : Power)
+    dans une matrice (ping x echantillon) completee par des NaN. La capacite des tableaux est doublee
+    lorsqu'ils sont pleins : l'ajout d'un ping a un cout constant.
+
+    Parametres
+    ----------
+    fields : list of tuple
+        attributs scalaires des pings et leur type, par ex : [('DateTime','<u8'),('Heave','<f4')]
+    sample_fields : list of string
+        noms des signaux stockes dans des matrices, par ex : ['Power','PowerDetectInterval']
+    capacity : int
+        nombre de pings alloues initialement
+    sample_dtype : np.dtype
+        type des echantillons des signaux
+
+    """
+
+    def __init__(self, fields, sample_fields=(), capacity=1024, sample_dtype=np.float32):
+        self.n_ping = 0
+        self.fields = [name for name, _ in fields]
+        self.sample_fields = list(sample_fields)
+        self.sample_dtype = np.dtype(sample_dtype)
+        self.capacity = capacity
+        # attributs scalaires : un tableau par attribut
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in fields}
+        # signaux : une matrice (ping x echantillon) et le nombre d'echantillons valides de chaque ping
+        self.samples = {name: np.full((capacity, 0), np.nan, dtype=self.sample_dtype) for name in self.sample_fields}
+        self.n_samples = {name: np.zeros(capacity, dtype=np.int32) for name in self.sample_fields}
+
+
+    def _grow_pings(self):
+        """
+        Double le nombre de pings alloues.
+        """
+        self.capacity *= 2
+        for name, column in self.columns.items():
+            new_column = np.zeros(self.capacity, dtype=column.dtype)
+            new_column[:self.n_ping] = column[:self.n_ping]
+            self.columns[name] = new_column
+        for name, matrix in self.samples.items():
+            new_matrix = np.full((self.capacity, matrix.shape[1]), np.nan, dtype=self.sample_dtype)
+            new_matrix[:self.n_ping] = matrix[:self.n_ping]
+            self.samples[name] = new_matrix
+            new_n = np.zeros(self.capacity, dtype=np.int32)
+            new_n[:self.n_ping] = self.n_samples[name][:self.n_ping]
+            self.n_samples[name] = new_n
+
+
+    def _grow_samples(self, name, n_sample):
+        """
+        Agrandit la matrice du signal name pour qu'elle puisse contenir n_sample echantillons par ping.
+        """
+        matrix = self.samples[name]
+        new_matrix = np.full((self.capacity, max(n_sample, 2*matrix.shape[1])), np.nan, dtype=self.sample_dtype)
+        new_matrix[:self.n_ping, :matrix.shape[1]] = matrix[:self.n_ping]
+        self.samples[name] = new_matrix
+
+
+    def append(self, values, samples=None):
+        """
+        Ajoute un ping.
+
+        Parametres
+        ----------
+        values : dictionary
+            valeur de chaque attribut scalaire du ping (les attributs absents valent 0)
+        samples : dictionary
+            signaux du ping, par ex : {'Power': np.array}
+
+        """
+        if self.n_ping == self.capacity:
+            self._grow_pings()
+        i = self.n_ping
+        for name in self.fields:
+            if name in values:
+                self.columns[name][i] = values[name]
+        for name, signal in (samples or {}).items():
+            n_sample = len(signal)
+            if n_sample > self.samples[name].shape[1]:
+                self._grow_samples(name, n_sample)
+            self.samples[name][i, :n_sample] = signal
+            self.n_samples[name][i] = n_sample
+        self.n_ping += 1
+
+
+    def extend(self, values, samples=None):
+        """
+        Ajoute un bloc de pings en une fois.
+
+        Parametres
+        ----------
+        values : dictionary
+            tableau des valeurs de chaque attribut scalaire des pings (les attributs absents valent 0)
+        samples : dictionary
+            pour chaque signal, matrice (ping x echantillon) et nombre d'echantillons valides de chaque ping,
+            par ex : {'Power': (matrix, n_samples)}
+
+        """
+        n = len(next(iter(values.values())))
+        while self.n_ping + n > self.capacity:
+            self._grow_pings()
+        i = self.n_ping
+        for name in self.fields:
+            if name in values:
+                self.columns[name][i:i+n] = values[name]
+        for name, (matrix, n_samples) in (samples or {}).items():
+            if matrix.shape[1] > self.samples[name].shape[1]:
+                self._grow_samples(name, matrix.shape[1])
+            self.samples[name][i:i+n, :matrix.shape[1]] = matrix
+            self.n_samples[name][i:i+n] = n_samples
+        self.n_ping += n
+
+
+    def to_arrays(self):
+        """
+        Renvoie les donnees accumulees sous forme de tableaux numpy ajustes au nombre de pings.
+
+        Sorties
+        -------
+        columns : dictionary
+            tableau de chaque attribut scalaire (n_ping)
+        samples : dictionary
+            matrice de chaque signal (n_ping x n_sample max), completee par des NaN
+        n_samples : dictionary
+            nombre d'echantillons valides de chaque ping pour chaque signal (n_ping)
+
+        """
+        n = self.n_ping
+        columns = {name: column[:n] for name, column in self.columns.items()}
+        samples = {}
+        n_samples = {}
+        for name, matrix in self.samples.items():
+            n_samples[name] = self.n_samples[name][:n]
+            n_max = int(n_samples[name].max()) if n > 0 else 0
+            samples[name] = matrix[:n, :n_max]
+        return columns, samples, n_samples
+
+
+    def to_dataframe(self, columns=None, index=None):
+        """
+        Convertit en une seule fois les donnees accumulees en DataFrame (un ping par ligne).
+        Les signaux sont stockes dans des colonnes dont chaque case est le np.array des echantillons valides du ping.
+
+        Parametres
+        ----------
+        columns : list of string
+            ordre des colonnes du DataFrame ; None pour les attributs scalaires puis les signaux
+        index : array
+            index du DataFrame ; None pour 0..n_ping-1
+
+        Sortie
+        -------
+        df : DataFrame
+            donnees des pings
+
+        """
+        d_columns, d_samples, d_n_samples = self.to_arrays()
+        data = dict(d_columns)
+        for name, matrix in d_samples.items():
+            data[name] = split_samples(matrix, d_n_samples[name])
+        add_views(data)
+        if columns is None:
+            columns = self.fields + self.sample_fields
+        return pandas.DataFrame(data, columns=columns, index=index)
+
+
+def stack_samples(signal, n_sample=None, dtype=np.float32):
+    """
+    Cette fonction permet de regrouper un signal stocke ping par ping (colonne d'un DataFrame dont chaque case est un np.array)
+    dans une matrice (ping x echantillon) completee par des NaN.
+
+    Parametres
+    ----------
+    signal : Series or list of np.array
+        echantillons de chaque ping, par ex : d[line]['data']['Power']
+    n_sample : int
+        nombre de colonnes de la matrice ; None pour le plus grand nombre d'echantillons
+    dtype : np.dtype
+        type des echantillons de la matrice
+
+    Sortie
+    -------
+    matrix : np.array
+        matrice (ping x echantillon) du signal
+
+    """
+    signal = list(signal)
+    lengths = np.array([len(s) for s in signal], dtype=np.int64)
+    if n_sample is None:
+        n_sample = int(lengths.max()) if len(signal) > 0 else 0
+    matrix = np.full((len(signal), n_sample), np.nan, dtype=dtype)
+    for i, s in enumerate(signal):
+        n = min(lengths[i], n_sample)
+        matrix[i, :n] = s[:n]
+    return matrix
+
+
+def split_samples(matrix, n_samples):
+    """
+    Cette fonction permet de decouper une matrice (ping x echantillon) en un tableau d'objets contenant,
+    pour chaque ping, le np.array de ses echantillons valides (vue sur la ligne de la matrice, sans copie).
+
+    Parametres
+    ----------
+    matrix : np.array
+        matrice (ping x echantillon) du signal
+    n_samples : np.array of int
+        nombre d'echantillons valides de chaque ping
+
+    Sortie
+    -------
+    signal : np.array of object
+        echantillons de chaque ping
+
+    """
+    signal = np.empty(matrix.shape[0], dtype=object)
+    for i, n in enumerate(n_samples):
+        signal[i] = matrix[i, :n]
+    return signal
+
+
+def slice_samples(signal, first, last):
+    """
+    Cette fonction renvoie, pour chaque ping, la vue (sans copie) sur ses echantillons d'indices first a last inclus.
+
+    Parametres
+    ----------
+    signal : Series or np.array of object
+        echantillons de chaque ping, par ex : d[line]['data']['Power']
+    first, last : array of int
+        indices du premier et du dernier echantillon de chaque ping
+
+    Sortie
+    -------
+    views : np.array of object
+        echantillons selectionnes de chaque ping
+
+    """
+    views = np.empty(len(signal), dtype=object)
+    for i, (s, i_first, i_last) in enumerate(zip(signal, first, last)):
+        views[i] = s[i_first:i_last+1]
+    return views
+
+
+def add_views(data, names=None):
+    """
+    Cette fonction ajoute aux donnees des pings (DataFrame ou dictionnaire de colonnes) les signaux de VIEW_SIGNALS
+    dont le signal source et les indices sont presents, par ex : PowerDetectInterval = Power[DetectFirst:DetectLast+1].
+    """
+    for name, (source, first, last) in VIEW_SIGNALS.items():
+        if (names is None or name in names) and all(column in data for column in (source, first, last)):
+            data[name] = slice_samples(data[source], data[first], data[last])
+    return data
+
+
+def to_counts(matrix, scale=POWER_SCALE):
+    """
+    Cette fonction permet de convertir une matrice de puissance (dB) en comptes int16 de l'EA400 (puissance = compte * scale).
+    La conversion n'est faite que si elle est exacte : les echantillons doivent provenir de comptes int16, sans modification.
+
+    Parametres
+    ----------
+    matrix : np.array
+        matrice (ping x echantillon) de puissance en dB, completee par des NaN
+    scale : float
+        facteur d'echelle des comptes (en dB), par defaut celui des trames RAW0
+
+    Sortie
+    -------
+    counts : np.array of int16
+        matrice des comptes (0 hors des echantillons valides) ; None si la conversion n'est pas exacte
+
+    """
+    if matrix.dtype != np.float32:
+        return None
+    valid = ~np.isnan(matrix)
+    counts = np.rint(np.where(valid, matrix, 0) / scale)
+    if counts.size > 0 and (counts.min() < np.iinfo(np.int16).min or counts.max() > np.iinfo(np.int16).max):
+        return None
+    counts = counts.astype(np.int16)
+    if not np.array_equal(counts[valid].astype(np.float32) * np.float32(scale), matrix[valid]):
+        return None
+    return counts
+
+
+def to_linear(matrix):
+    """
+    Cette fonction convertit une matrice de puissance en dB en valeurs naturelles (10**(P/10)), en float32.
+    """
+    return np.power(np.float32(10), matrix / np.float32(10), dtype=np.float32)
+
+
+def is_signal(column):
+    """
+    Cette fonction indique si une colonne de DataFrame contient un signal (un np.array ou une liste d'echantillons par ping).
+    """
+    if column.dtype != object or len(column) == 0:
+        return False
+    return isinstance(column.iloc[0], (np.ndarray, list, tuple))
+
+
+def put_pings(store, key, df, counts=False):
+    """
+    Cette fonction permet d'enregistrer les donnees des pings d'une ligne dans un fichier h5.
+    Les attributs scalaires sont enregistres dans un DataFrame type sous la clef key, et chaque signal
+    (colonne dont chaque case est un np.array, par ex : Power) dans une matrice float32 (ping x echantillon)
+    compressee du groupe key + SAMPLES_SUFFIX, avec le nombre d'echantillons valides de chaque ping.
+    Avec counts=True, les signaux de puissance issus des comptes de l'EA400 sont enregistres en int16
+    (2 fois moins de place), avec le facteur d'echelle en attribut 'scale' : la conversion est sans perte.
+
+    Parametres
+    ----------
+    store : pandas.HDFStore
+        fichier h5 ouvert en ecriture
+    key : string
+        clef des donnees, par ex : 'data'
+    df : DataFrame
+        donnees des pings (un ping par ligne) ; les signaux de VIEW_SIGNALS (par ex : PowerDetectInterval)
+        ne sont pas enregistres, ils sont reconstruits a la lecture a partir de leur signal source
+    counts : boolean
+        True pour enregistrer les puissances en comptes int16 lorsque la conversion est exacte (sinon en float32)
+
+    """
+    views = [name for name in df.columns if name in VIEW_SIGNALS and all(column in df for column in VIEW_SIGNALS[name])]
+    signals = [name for name in df.columns if name not in views and is_signal(df[name])]
+    store[key] = df.drop(columns=signals + views)
+
+    h5 = store._handle
+    path = '/' + key + SAMPLES_SUFFIX
+    if path in h5:
+        h5.remove_node(path, recursive=True)
+    group = h5.create_group('/', key + SAMPLES_SUFFIX)
+    group._v_attrs.signals = signals
+    group._v_attrs.views = views
+    group._v_attrs.columns = list(df.columns)
+    for name in signals:
+        matrix = stack_samples(df[name])
+        n_samples = np.array([len(s) for s in df[name]], dtype=np.int32)
+        matrix_counts = to_counts(matrix) if counts else None
+        if matrix_counts is not None:
+            matrix = matrix_counts
+        if matrix.size > 0:
+            chunkshape = (min(matrix.shape[0], SAMPLES_CHUNK_PINGS), matrix.shape[1])
+            node = h5.create_carray(group, name, obj=matrix, filters=SAMPLES_FILTERS, chunkshape=chunkshape)
+        else:
+            node = h5.create_array(group, name, obj=matrix)
+        if matrix_counts is not None:
+            node.attrs.scale = float(POWER_SCALE)
+        h5.create_array(group, name + '_length', obj=n_samples)
+
+
+def _pad_samples(matrix, n_sample):
+    """
+    Complete une matrice (ping x echantillon) jusqu'a n_sample echantillons par ping (NaN, ou 0 pour des comptes int16).
+    """
+    if matrix.shape[1] >= n_sample:
+        return matrix
+    fill = np.nan if matrix.dtype.kind == 'f' else 0
+    padded = np.full((matrix.shape[0], n_sample), fill, dtype=matrix.dtype)
+    padded[:, :matrix.shape[1]] = matrix
+    return padded
+
+
+def _create_signal(group, name, matrix):
+    """
+    Cree la matrice extensible (EArray, un ping par ligne) du signal name a partir de matrix.
+    """
+    n_sample = max(matrix.shape[1], 1)
+    node = group._v_file.create_earray(group, name, atom=tables.Atom.from_dtype(matrix.dtype), shape=(0, n_sample),
+                                       filters=SAMPLES_FILTERS, chunkshape=(SAMPLES_CHUNK_PINGS, n_sample))
+    node.append(_pad_samples(matrix, n_sample))
+    return node
+
+
+def _resize_signal(group, name, n_sample, to_float=False):
+    """
+    Recree la matrice extensible du signal name avec n_sample echantillons par ping, en float32 si to_float est True
+    (les comptes int16 deja enregistres sont alors convertis en dB).
+    """
+    node = group[name]
+    matrix = node[:]
+    if to_float and 'scale' in node.attrs:
+        matrix = matrix.astype(np.float32) * np.float32(node.attrs.scale)
+        matrix[np.arange(matrix.shape[1]) >= group[name + '_length'][:][:, None]] = np.nan
+    scale = None if to_float else node.attrs['scale'] if 'scale' in node.attrs else None
+    node._f_remove()
+    node = _create_signal(group, name, _pad_samples(matrix, n_sample))
+    if scale is not None:
+        node.attrs.scale = scale
+    return node
+
+
+def append_pings(store, key, df, counts=False):
+    """
+    Cette fonction permet d'ajouter des pings a la suite de ceux deja enregistres dans un fichier h5, sans relire ni
+    reecrire les pings precedents (suivi d'une ligne en cours d'acquisition). Les attributs scalaires sont ajoutes au
+    DataFrame au format table de la clef key, et chaque signal a sa matrice extensible (EArray) et au vecteur
+    extensible du nombre d'echantillons valides. Le fichier est relu par get_pings comme un fichier de put_pings.
+    Une matrice n'est recreee que si les nouveaux pings ont plus d'echantillons qu'elle (largeur doublee) ou si des
+    comptes int16 ne peuvent plus etre enregistres sans perte (passage en float32).
+
+    Parametres
+    ----------
+    store : pandas.HDFStore
+        fichier h5 ouvert en ecriture, vide ou cree par append_pings
+    key : string
+        clef des donnees, par ex : 'data'
+    df : DataFrame
+        nouveaux pings (un ping par ligne), cf. put_pings
+    counts : boolean
+        True pour enregistrer les puissances en comptes int16 lorsque la conversion est exacte, cf. put_pings
+
+    """
+    views = [name for name in df.columns if name in VIEW_SIGNALS and all(column in df for column in VIEW_SIGNALS[name])]
+    signals = [name for name in df.columns if name not in views and is_signal(df[name])]
+    store.append(key, df.drop(columns=signals + views), format='table', index=False)
+
+    h5 = store._handle
+    path = '/' + key + SAMPLES_SUFFIX
+    if path not in h5:
+        group = h5.create_group('/', key + SAMPLES_SUFFIX)
+        group._v_attrs.signals = signals
+        group._v_attrs.views = views
+        group._v_attrs.columns = list(df.columns)
+    group = h5.get_node(path)
+    for name in signals:
+        matrix = stack_samples(df[name])
+        n_samples = np.array([len(s) for s in df[name]], dtype=np.int32)
+        node = group[name] if name in group else None
+        matrix_counts = to_counts(matrix) if counts and (node is None or 'scale' in node.attrs) else None
+        if node is None:
+            node = _create_signal(group, name, matrix if matrix_counts is None else matrix_counts)
+            if matrix_counts is not None:
+                node.attrs.scale = float(POWER_SCALE)
+            h5.create_earray(group, name + '_length', atom=tables.Int32Atom(), shape=(0,))
+        else:
+            if 'scale' in node.attrs and matrix_counts is None:
+                node = _resize_signal(group, name, node.shape[1], to_float=True)
+            if matrix_counts is not None:
+                matrix = matrix_counts
+            if matrix.shape[1] > node.shape[1]:
+                node = _resize_signal(group, name, max(matrix.shape[1], 2*node.shape[1]))
+            node.append(_pad_samples(matrix, node.shape[1]))
+        group[name + '_length'].append(n_samples)
+
+
+def truncate_pings(store, key, n_ping):
+    """
+    Cette fonction permet de ne conserver que les n_ping premieres lignes d'un DataFrame enregistre au format table
+    (par ex : par append_pings) et des matrices de ses signaux, par ex : pings ajoutes apres le dernier point de controle.
+    """
+    if key not in store or store.get_storer(key).nrows <= n_ping:
+        return None
+    store.remove(key, start=n_ping, stop=store.get_storer(key).nrows)
+    path = '/' + key + SAMPLES_SUFFIX
+    if path in store._handle:
+        group = store._handle.get_node(path)
+        for name in group._v_attrs.signals:
+            group[name].truncate(n_ping)
+            group[name + '_length'].truncate(n_ping)
+    return None
+
+
+def get_signal(store, name, key='data', linear=False):
+    """
+    Cette fonction permet de lire la matrice d'un signal enregistre par put_pings, en une seule lecture.
+    Les signaux enregistres en comptes int16 sont convertis en dB a la lecture.
+
+    Parametres
+    ----------
+    store : pandas.HDFStore
+        fichier h5 ouvert
+    name : string
+        nom du signal, par ex : 'Power'
+    key : string
+        clef des donnees, par ex : 'data'
+    linear : boolean
+        True pour renvoyer la puissance en valeurs naturelles (10**(P/10)) plutot qu'en dB
+
+    Sorties
+    -------
+    matrix : np.array
+        matrice (ping x echantillon) du signal, completee par des NaN
+    n_samples : np.array of int
+        nombre d'echantillons valides de chaque ping
+
+    """
+    group = store._handle.get_node('/' + key + SAMPLES_SUFFIX)
+    node = group[name]
+    n_samples = group[name + '_length'][:]
+    # les matrices extensibles (append_pings) peuvent etre plus larges que le plus long ping
+    n_max = int(n_samples.max()) if len(n_samples) > 0 else 0
+    matrix = node[:, :n_max] if node.shape[1] > n_max else node[:]
+    if 'scale' in node.attrs:
+        matrix = matrix.astype(np.float32) * np.float32(node.attrs.scale)
+        matrix[np.arange(matrix.shape[1]) >= n_samples[:, None]] = np.nan
+    if linear:
+        matrix = to_linear(matrix)
+    return matrix, n_samples
+
+
+def read_signal(filepath, name, key='data', linear=False):
+    """
+    Cette fonction permet de lire la matrice d'un signal d'un fichier h5, cf. get_signal.
+    """
+    with pandas.HDFStore(filepath, mode='r') as store:
+        return get_signal(store, name, key, linear)
+
+
+def get_pings(store, key='data', columns=None):
+    """
+    Cette fonction permet de lire les donnees des pings d'une ligne enregistrees par put_pings.
+    Les signaux sont restitues dans des colonnes dont chaque case est le np.array des echantillons valides du ping.
+    Les fichiers enregistres avant put_pings (signaux stockes en colonnes d'objets) sont lus tels quels.
+
+    Parametres
+    ----------
+    store : pandas.HDFStore
+        fichier h5 ouvert
+    key : string
+        clef des donnees, par ex : 'data'
+    columns : list of string
+        colonnes a lire, par ex : ['DateTime','Depth'] ; None pour toutes les colonnes.
+        Les matrices des signaux absents de columns ne sont pas lues.
+
+    Sortie
+    -------
+    df : DataFrame
+        donnees des pings (un ping par ligne)
+
+    """
+    df = store[key]
+    path = '/' + key + SAMPLES_SUFFIX
+    if path not in store._handle:
+        return df if columns is None else df[list(columns)]
+    group = store._handle.get_node(path)
+    if columns is None:
+        columns = list(group._v_attrs.columns)
+    views = [name for name in getattr(group._v_attrs, 'views', []) if name in columns]
+    needed = set(columns) | {VIEW_SIGNALS[name][0] for name in views}
+    for name in group._v_attrs.signals:
+        if name in needed:
+            matrix, n_samples = get_signal(store, name, key)
+            df[name] = split_samples(matrix, n_samples)
+    add_views(df, views)
+    return df[list(columns)]
+
+
+def read_pings(filepath, key='data', columns=None):
+    """
+    Cette fonction permet de lire les donnees des pings d'un fichier h5, cf. get_pings.
+    """
+    with pandas.HDFStore(filepath, mode='r') as store:
+        return get_pings(store, key, columns)
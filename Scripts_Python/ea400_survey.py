@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Auteur : Aelaig COURNEZ - Flora GUES - Yann LAMBRECHTS - Romain SAFRAN
+
+# Librairies importee
+import os
+import numpy as np
+import pandas
+from collections import OrderedDict
+from collections.abc import MutableMapping
+# Autres codes python
+from ea400_store import SAMPLES_SUFFIX, get_pings, get_signal, stack_samples, to_linear
+
+#--------------------------------------------------------------------------------#
+#                   ACCES A LA BASE DE DONNEES D'UN LEVE                         #
+#                                                                                #
+#   Ce code remplace le chargement complet des fichiers h5 (load_data) par un    #
+#   acces a la demande : un objet Survey s'utilise comme le dictionnaire d       #
+#   (d[line]['data'], d[line]['trajectoire'], d[line]['param']) mais chaque      #
+#   table n'est lue dans son fichier h5 qu'au premier acces. Le nombre de        #
+#   lignes gardees en memoire peut etre borne : les lignes les moins recemment   #
+#   utilisees sont alors liberees et relues au besoin. Les signaux (Power...)    #
+#   peuvent etre lus directement sous forme de matrice (ping x echantillon).     #
+#--------------------------------------------------------------------------------#
+
+# Nombre maximal de lignes gardees en memoire (None : pas de limite)
+MAX_LINES = 16
+
+
+def line_name(filepath):
+    """
+    Cette fonction renvoie l'identifiant de la ligne de leve d'un fichier h5, par ex : 'L0006' pour L0006_38kHz_data.h5.
+    """
+    return os.path.basename(filepath)[:5]
+
+
+class SurveyLine(MutableMapping):
+    """
+    Cette classe donne acces aux tables d'une ligne de leve ('data', 'trajectoire', 'param', 'ref'...),
+    lues dans le fichier h5 au premier acces. Elle s'utilise comme un dictionnaire : d[line]['data'].
+
+    Parametres
+    ----------
+    survey : Survey
+        leve auquel appartient la ligne
+    filepath : string
+        chemin vers le fichier h5 de la ligne ; None pour une ligne creee en memoire
+    tables : dictionary
+        tables deja chargees, par ex : {'data': DataFrame}
+
+    """
+
+    def __init__(self, survey, filepath, tables=None):
+        self.survey = survey
+        self.filepath = filepath
+        self.tables = dict(tables or {})
+        self.modified = tables is not None
+        self._keys = None
+        self._shapes = {} # colonnes et nombre de lignes de chaque table a sa lecture
+        self.signals = {} # matrices des signaux calcules en memoire : (key, name) -> (matrix, n_samples)
+
+
+    def stored_keys(self):
+        """
+        Renvoie les clefs des tables enregistrees dans le fichier h5 (le fichier n'est ouvert qu'une fois).
+        """
+        if self._keys is None:
+            if self.filepath is None:
+                self._keys = []
+            else:
+                with pandas.HDFStore(self.filepath, mode='r') as store:
+                    self._keys = [key.lstrip('/') for key in store.keys()]
+        return self._keys
+
+
+    def __getitem__(self, key):
+        if key not in self.tables:
+            if key not in self.stored_keys():
+                raise KeyError(key)
+            table = self.survey.read(self.filepath, key)
+            self.tables[key] = table
+            self._shapes[key] = (list(table.columns), len(table)) if isinstance(table, pandas.DataFrame) else None
+            self.survey._release(keep=self)
+            return table
+        return self.tables[key]
+
+
+    def __setitem__(self, key, value):
+        self.tables[key] = value
+        self.modified = True
+
+
+    def __delitem__(self, key):
+        del self.tables[key]
+        self.modified = True
+        if key in self.stored_keys():
+            self._keys.remove(key)
+
+
+    def __iter__(self):
+        keys = list(self.stored_keys())
+        return iter(keys + [key for key in self.tables if key not in keys])
+
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+
+    def __contains__(self, key):
+        return key in self.tables or key in self.stored_keys()
+
+
+    def set_signal(self, name, matrix, n_samples, key='data'):
+        """
+        Garde en memoire la matrice (ping x echantillon) d'un signal calcule (par ex : Power_ProfRef), relue par signal.
+        """
+        self.signals[(key, name)] = (matrix, np.asarray(n_samples))
+        self.modified = True
+
+
+    def signal(self, name, key='data', linear=False):
+        """
+        Cette fonction renvoie la matrice (ping x echantillon) d'un signal de la ligne et le nombre d'echantillons valides
+        de chaque ping, sans passer par les np.array de chaque ping de la colonne du DataFrame.
+        La matrice est celle gardee par set_signal, sinon elle est lue en une fois dans le fichier h5 (cf. ea400_store.get_signal)
+        tant que la table n'a pas ete filtree ; a defaut, elle est construite a partir de la colonne de la table.
+
+        Parametres
+        ----------
+        name : string
+            nom du signal, par ex : 'Power'
+        key : string
+            clef de la table, par ex : 'data'
+        linear : boolean
+            True pour renvoyer la puissance en valeurs naturelles (10**(P/10)) plutot qu'en dB
+
+        Sorties
+        -------
+        matrix : np.array
+            matrice (ping x echantillon) du signal, completee par des NaN
+        n_samples : np.array of int
+            nombre d'echantillons valides de chaque ping
+
+        """
+        if (key, name) in self.signals:
+            matrix, n_samples = self.signals[(key, name)]
+            return (to_linear(matrix) if linear else matrix), n_samples
+        table = self.tables.get(key)
+        if self.filepath is not None and (table is None or (key in self._shapes and self._shapes[key][1] == len(table))):
+            with pandas.HDFStore(self.filepath, mode='r') as store:
+                path = '/' + key + SAMPLES_SUFFIX
+                if path in store._handle and name in store._handle.get_node(path)._v_attrs.signals:
+                    return get_signal(store, name, key, linear)
+        column = self[key][name]
+        matrix = stack_samples(column)
+        n_samples = np.array([len(s) for s in column], dtype=np.int32)
+        return (to_linear(matrix) if linear else matrix), n_samples
+
+
+    def is_modified(self):
+        """
+        Indique si les tables de la ligne ont ete modifiees depuis leur lecture (table remplacee, colonne ajoutee ou supprimee, lignes filtrees).
+        Une modification des valeurs d'une colonne existante n'est pas detectee.
+        """
+        if self.modified:
+            return True
+        for key, shape in self._shapes.items():
+            table = self.tables.get(key)
+            if shape is not None and (list(table.columns), len(table)) != shape:
+                return True
+        return False
+
+
+    def release(self):
+        """
+        Libere les tables chargees ; elles seront relues dans le fichier h5 au prochain acces.
+        """
+        self.tables.clear()
+        self._shapes.clear()
+        self.signals.clear()
+
+
+class Survey(MutableMapping):
+    """
+    Cette classe donne acces a la base de donnees d'un leve (un fichier h5 par ligne) sans la charger entierement.
+    Elle s'utilise comme le dictionnaire renvoye par load_data : d[line]['data'], for line in d...
+    Les tables sont lues a la demande, ligne par ligne et clef par clef, et seules les max_lines lignes
+    les plus recemment utilisees sont gardees en memoire. Les lignes modifiees (table remplacee, colonne ajoutee)
+    ne sont jamais liberees, pour ne pas perdre les calculs effectues.
+
+    Parametres
+    ----------
+    files : list of string
+        chemin vers les fichiers .h5 du leve
+    max_lines : int
+        nombre maximal de lignes gardees en memoire ; None pour ne jamais liberer les lignes lues
+    columns : dictionary
+        colonnes a lire pour chaque clef, par ex : {'data': ['DateTime','Depth','PowerMax']} ;
+        les signaux (Power...) absents de la selection ne sont pas lus
+
+    """
+
+    def __init__(self, files, max_lines=MAX_LINES, columns=None):
+        self.files = OrderedDict()
+        for f in files:
+            self.files[line_name(f)] = f
+        self.max_lines = max_lines
+        self.columns = dict(columns or {})
+        self._lines = OrderedDict() # lignes ouvertes, de la moins recemment utilisee a la plus recente
+
+
+    def read(self, filepath, key, columns=None):
+        """
+        Cette fonction permet de lire une table d'un fichier h5, sans la garder en memoire.
+
+        Parametres
+        ----------
+        filepath : string
+            chemin vers le fichier h5
+        key : string
+            clef de la table, par ex : 'data'
+        columns : list of string
+            colonnes a lire ; None pour la selection du leve (self.columns) ou toutes les colonnes
+
+        Sortie
+        -------
+        table : DataFrame
+            table lue
+
+        """
+        columns = columns or self.columns.get(key)
+        with pandas.HDFStore(filepath, mode='r') as store:
+            if key == 'data':
+                return get_pings(store, key, columns)
+            table = store[key]
+        return table if columns is None else table[list(columns)]
+
+
+    def _release(self, keep=None):
+        """
+        Libere les lignes les moins recemment utilisees au-dela de max_lines lignes chargees (sauf la ligne keep).
+        """
+        if self.max_lines is None:
+            return
+        loaded = [line for line, survey_line in self._lines.items() if survey_line.tables and survey_line is not keep]
+        for line in loaded[:max(len(loaded) + 1 - self.max_lines, 0)]:
+            if not self._lines[line].is_modified():
+                self._lines[line].release()
+
+
+    def __getitem__(self, line):
+        if line not in self._lines:
+            if line not in self.files:
+                raise KeyError(line)
+            self._lines[line] = SurveyLine(self, self.files[line])
+        self._lines.move_to_end(line)
+        return self._lines[line]
+
+
+    def __setitem__(self, line, tables):
+        if not isinstance(tables, SurveyLine):
+            tables = SurveyLine(self, None, tables)
+        tables.modified = True
+        self._lines[line] = tables
+        self._lines.move_to_end(line)
+        if line not in self.files:
+            self.files[line] = tables.filepath
+
+
+    def __delitem__(self, line):
+        del self.files[line]
+        self._lines.pop(line, None)
+
+
+    def __iter__(self):
+        return iter(self.files)
+
+
+    def __len__(self):
+        return len(self.files)
+
+
+    def __contains__(self, line):
+        return line in self.files
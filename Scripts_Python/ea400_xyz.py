@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Auteur : Aelaig COURNEZ - Flora GUES - Yann LAMBRECHTS - Romain SAFRAN
+
+# Librairies importee
+import numpy as np
+# Autres codes python
+from ea400_nmea import to_date, to_time_of_day
+from ea400_proj import to_projected
+
+#--------------------------------------------------------------------------------#
+#                       LECTURE DES FICHIERS .XYZ DE L'EA400                     #
+#                                                                                #
+#   Ce code permet de lire les sondes exportees par l'EA400 au format .xyz       #
+#   (une ligne par sonde : lat lon profondeur jjmmaaaa hhmmss.ss flag). Le       #
+#   fichier est lu par blocs et chaque bloc est converti directement en          #
+#   colonnes numpy typees, sans lecture ligne a ligne. Les sondes fournissent    #
+#   une trace de profondeur permettant de controler la profondeur detectee      #
+#   dans les fichiers .raw.                                                      #
+#--------------------------------------------------------------------------------#
+
+# Nombre de colonnes d'une ligne du fichier .xyz
+XYZ_NCOLUMNS = 6
+
+# Taille des blocs lus (en octets)
+XYZ_CHUNK = 1 << 24
+
+
+def parse_XYZ(tokens):
+    """
+    Cette fonction permet de convertir les champs d'un ensemble de lignes .xyz en colonnes numpy.
+
+    Parametres
+    ----------
+    tokens : list of bytes
+        champs des lignes, dans l'ordre (XYZ_NCOLUMNS champs par ligne)
+
+    Sortie
+    -------
+    columns : dictionary
+        colonnes 'lat', 'lon', 'depth' (float64), 'DateTime' (datetime64[ns]) et 'flag' (float64)
+
+    """
+    fields = np.array(tokens, dtype='S').reshape(-1, XYZ_NCOLUMNS)
+    ddmmyyyy = fields[:, 3].astype(np.float64)
+    date = to_date(ddmmyyyy % 10000, ddmmyyyy // 10000 % 100, ddmmyyyy // 1000000)
+    return {'lat': fields[:, 0].astype(np.float64),
+            'lon': fields[:, 1].astype(np.float64),
+            'depth': fields[:, 2].astype(np.float64),
+            'DateTime': date.astype('datetime64[ns]') + to_time_of_day(fields[:, 4]),
+            'flag': fields[:, 5].astype(np.float64)}
+
+
+def read_XYZfile(filepath, project=False, west=False, chunk_size=XYZ_CHUNK):
+    """
+    Cette fonction permet de lire un fichier .xyz exporte par l'EA400 en colonnes numpy.
+    Le fichier est lu par blocs de chunk_size octets : la memoire utilisee ne depend que de la taille du resultat.
+
+    Parametres
+    ----------
+    filepath : string
+        chemin vers le fichier .xyz
+    project : boolean
+        True pour ajouter les coordonnees projetees 'X' et 'Y' (Lambert93 par defaut, cf. ea400_proj.TARGET_CRS)
+    west : boolean
+        True si les longitudes sont a l'ouest de Greenwich : l'EA400 exporte les longitudes sans signe
+        (par ex : 4.4784677 pour 4°28'W a Brest)
+    chunk_size : int
+        taille des blocs lus (en octets)
+
+    Sortie
+    -------
+    xyz : dictionary
+        colonnes numpy : 'DateTime' (datetime64[ns]), 'lat', 'lon', 'depth', 'flag', et 'X', 'Y' si project=True
+
+    """
+    chunks = []
+    rest = b''
+    with open(filepath, 'rb') as f:
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            block = rest + block
+            # la derniere ligne, peut-etre incomplete, est reportee sur le bloc suivant
+            cut = block.rfind(b'\n') + 1
+            block, rest = block[:cut], block[cut:]
+            tokens = block.split()
+            if tokens:
+                chunks.append(parse_XYZ(tokens))
+    if rest.split():
+        chunks.append(parse_XYZ(rest.split()))
+
+    if chunks:
+        xyz = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+    else:
+        xyz = parse_XYZ([])
+    if west:
+        xyz['lon'] = -xyz['lon']
+    if project:
+        xyz['X'], xyz['Y'] = to_projected(xyz['lon'], xyz['lat'])
+    return xyz
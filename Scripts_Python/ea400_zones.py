@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Auteur : Aelaig COURNEZ - Flora GUES - Yann LAMBRECHTS - Romain SAFRAN
+
+# Librairies importee
+import numpy as np
+import shapely
+import os
+import struct
+import sqlite3
+
+#--------------------------------------------------------------------------------#
+#                      AFFECTATION DES PINGS AUX ZONES D'ETUDE                   #
+#                                                                                #
+#   Ce code permet d'affecter a chaque ping l'identifiant de la zone d'etude     #
+#   qui le contient, pour tous les pings d'une ligne en un seul calcul, sans     #
+#   parcourir les lignes de la table. Les coordonnees utilisees sont celles du   #
+#   navire (X, Y) ou celles de la tache insonifiee (X_Beam, Y_Beam).             #
+#   Les ensembles de zones sont definis une seule fois, par version nommee :     #
+#   sommets des polygones ou fichier QGIS (shapefile ou GeoPackage). Chaque      #
+#   version est chargee au premier usage et indexee par un STRtree : chaque      #
+#   point n'est teste que contre les polygones dont l'emprise le contient, ce    #
+#   qui permet d'utiliser des centaines de polygones (grilles...).               #
+#--------------------------------------------------------------------------------#
+
+# Colonnes des coordonnees utilisees pour l'affectation des zones
+ZONE_COORDS = {'ship': ('X', 'Y'), 'beam': ('X_Beam', 'Y_Beam')}
+
+# Repertoire des couches QGIS du projet
+QGIS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'QGIS_Shapefile')
+
+# Versions des zones d'etude definies par les sommets de leurs polygones (Lambert93), par identifiant de zone
+ZONE_POLYGONS = {
+    # zones d'etude initiales
+    'initiales': {1: [[147932, 6830864], [147826, 6830989], [148120, 6831205], [148214, 6831077]],
+                  2: [[148026, 6830005], [147945, 6830093], [148170, 6830312], [148255, 6830225]],
+                  3: [[147591, 6829582], [147512, 6829661], [147741, 6829883], [147819, 6829805]],
+                  4: [[147099, 6829122], [147027, 6829206], [147227, 6829382], [147299, 6829303]],
+                  5: [[146456, 6830591], [146434, 6830713], [146726, 6830760], [146754, 6830635]]},
+    # zones reduites
+    'reduites': {1: [[148111, 6831022], [148059, 6831120], [148137, 6831177], [148200, 6831088]],
+                 2: [[148097, 6830111], [148039, 6830173], [148119, 6830245], [148173, 6830177]],
+                 3: [[147665, 6829667], [147586, 6829740], [147663, 6829810], [147727, 6829746]],
+                 4: [[147197, 6829228], [147130, 6829306], [147200, 6829366], [147258, 6829301]],
+                 5: [[146527, 6830611], [146510, 6830712], [146694, 6830745], [146723, 6830635]]},
+    # zones reduites, zone 1 deplacee (zone1bis)
+    'reduites_zone1bis': {1: [[147909, 6831018], [147970, 6831058], [148045, 6830968], [147981, 6830911]],
+                          2: [[148097, 6830111], [148039, 6830173], [148119, 6830245], [148173, 6830177]],
+                          3: [[147665, 6829667], [147586, 6829740], [147663, 6829810], [147727, 6829746]],
+                          4: [[147197, 6829228], [147130, 6829306], [147200, 6829366], [147258, 6829301]],
+                          5: [[146527, 6830611], [146510, 6830712], [146694, 6830745], [146723, 6830635]]}}
+
+# Versions des zones d'etude lues dans un fichier QGIS : chemin (.shp ou .gpkg), champ identifiant, couche (GeoPackage)
+ZONE_FILES = {'qgis': (os.path.join(QGIS_PATH, 'zones.shp'), 'id', None)}
+
+# Nombre de zones a partir duquel les points sont affectes par le STRtree (en dessous, chaque polygone est teste)
+ZONE_TREE_MIN = 32
+
+# Versions deja chargees
+_ZONE_SETS = {}
+
+
+#-------- LECTURE DES FICHIERS QGIS --------
+
+def read_dbf(filepath):
+    """
+    Cette fonction permet de lire la table attributaire (.dbf) d'un shapefile.
+
+    Sortie
+    -------
+    records : list of dictionary
+        attributs de chaque entite (champs numeriques convertis en nombres, NaN si vides)
+
+    """
+    with open(filepath, 'rb') as f:
+        data = f.read()
+    n_record, header_length, record_length = struct.unpack('<IHH', data[4:12])
+    fields = []
+    offset = 1 # octet d'effacement de l'enregistrement
+    for i in range(32, header_length - 1, 32):
+        if data[i] == 0x0D:
+            break
+        name = data[i:i+11].split(b'\0')[0].decode('ascii')
+        fields.append((name, chr(data[i+11]), offset, data[i+16]))
+        offset += data[i+16]
+    records = []
+    for r in range(n_record):
+        record = data[header_length + r*record_length:header_length + (r+1)*record_length]
+        values = {}
+        for name, kind, start, length in fields:
+            text = record[start:start+length].decode('utf-8', errors='replace').strip()
+            if kind in 'NF':
+                value = float(text) if text else np.nan
+                values[name] = int(value) if value == value and value == int(value) else value
+            else:
+                values[name] = text
+        records.append(values)
+    return records
+
+
+def rings_to_geometry(rings):
+    """
+    Cette fonction construit un polygone (ou multipolygone) a partir des anneaux d'une entite shapefile :
+    les anneaux dans le sens horaire sont des contours exterieurs, les autres des trous du contour qui les contient.
+    """
+    rings = [shapely.linearrings(ring) for ring in rings]
+    exteriors = [ring for ring in rings if not shapely.is_ccw(ring)] or rings
+    holes = {i: [] for i in range(len(exteriors))}
+    for ring in rings:
+        if any(ring is exterior for exterior in exteriors):
+            continue
+        for i, exterior in enumerate(exteriors):
+            if shapely.contains(shapely.polygons(exterior), shapely.points(shapely.get_coordinates(ring)[0])):
+                holes[i].append(ring)
+                break
+    polygons = [shapely.polygons(exterior, holes[i] or None) for i, exterior in enumerate(exteriors)]
+    return polygons[0] if len(polygons) == 1 else shapely.multipolygons(polygons)
+
+
+def read_shapefile(filepath, id_field='id'):
+    """
+    Cette fonction permet de lire les polygones d'un shapefile (types Polygon, PolygonZ, PolygonM) sans librairie SIG.
+
+    Parametres
+    ----------
+    filepath : string
+        chemin vers le fichier .shp (la table attributaire .dbf est lue a cote)
+    id_field : string
+        champ de la table attributaire donnant l'identifiant de chaque zone ; numero de l'entite si absent
+
+    Sortie
+    -------
+    zones : dictionary
+        polygones shapely par identifiant, dans l'ordre du fichier
+
+    """
+    with open(filepath, 'rb') as f:
+        data = f.read()
+    dbf_path = os.path.splitext(filepath)[0] + '.dbf'
+    records = read_dbf(dbf_path) if os.path.exists(dbf_path) else []
+    zones = {}
+    offset, n = 100, 0
+    while offset + 8 <= len(data):
+        number, length = struct.unpack('>ii', data[offset:offset+8])
+        content = data[offset+8:offset+8+2*length]
+        offset += 8 + 2*length
+        n += 1
+        shape_type, = struct.unpack('<i', content[:4])
+        if shape_type not in (5, 15, 25): # entite vide ou non surfacique
+            continue
+        n_part, n_point = struct.unpack('<ii', content[36:44])
+        parts = np.frombuffer(content, dtype='<i4', count=n_part, offset=44)
+        points = np.frombuffer(content, dtype='<f8', count=2*n_point, offset=44 + 4*n_part).reshape(-1, 2)
+        rings = np.split(points, parts[1:])
+        record = records[number-1] if number-1 < len(records) else {}
+        zones[record.get(id_field, n)] = rings_to_geometry(rings)
+    return zones
+
+
+def read_geopackage(filepath, layer=None, id_field='id'):
+    """
+    Cette fonction permet de lire les polygones d'une couche GeoPackage (base SQLite) sans librairie SIG.
+
+    Parametres
+    ----------
+    filepath : string
+        chemin vers le fichier .gpkg
+    layer : string
+        nom de la couche ; None pour la premiere couche d'entites
+    id_field : string
+        champ donnant l'identifiant de chaque zone
+
+    Sortie
+    -------
+    zones : dictionary
+        polygones shapely par identifiant
+
+    """
+    with sqlite3.connect(filepath) as connection:
+        if layer is None:
+            layer, = connection.execute("SELECT table_name FROM gpkg_contents WHERE data_type='features'").fetchone()
+        column, = connection.execute('SELECT column_name FROM gpkg_geometry_columns WHERE table_name=?', (layer,)).fetchone()
+        rows = connection.execute('SELECT "%s", "%s" FROM "%s"' % (id_field, column, layer)).fetchall()
+    zones = {}
+    for zone_id, blob in rows:
+        if blob is None:
+            continue
+        # entete GeoPackage : 'GP', version, drapeaux (taille de l'enveloppe), srs_id, enveloppe ; puis geometrie WKB
+        envelope = (blob[3] >> 1) & 7
+        zones[zone_id] = shapely.from_wkb(bytes(blob[8 + (0, 32, 48, 48, 64)[envelope]:]))
+    return zones
+
+
+def read_zones(filepath, id_field='id', layer=None):
+    """
+    Cette fonction permet de lire les zones d'un fichier QGIS, shapefile (.shp) ou GeoPackage (.gpkg).
+    """
+    if os.path.splitext(filepath)[1].lower() == '.gpkg':
+        return read_geopackage(filepath, layer, id_field)
+    return read_shapefile(filepath, id_field)
+
+
+#-------- ENSEMBLES DE ZONES --------
+
+class ZoneSet:
+    """
+    Cette classe regroupe les polygones d'une version des zones d'etude, prepares et indexes par un STRtree :
+    au-dela de ZONE_TREE_MIN zones, l'affectation d'un point ne teste que les polygones dont l'emprise le contient.
+
+    Parametres
+    ----------
+    zones : dictionary
+        polygones shapely (ou listes de sommets) par identifiant ; en cas de recouvrement, la premiere zone l'emporte
+
+    """
+
+    def __init__(self, zones):
+        self.zones = {zone_id: polygon if isinstance(polygon, shapely.Geometry) else shapely.Polygon(polygon)
+                      for zone_id, polygon in zones.items()}
+        ids = list(self.zones)
+        dtype = next(t for t in (np.int8, np.int16, np.int32, np.int64) if max(ids, default=0) <= np.iinfo(t).max)
+        self.ids = np.array(ids, dtype=dtype)
+        self.geometries = np.array(list(self.zones.values()), dtype=object)
+        shapely.prepare(self.geometries)
+        self.tree = shapely.STRtree(self.geometries)
+
+
+    def __getitem__(self, zone_id):
+        return self.zones[zone_id]
+
+
+    def __iter__(self):
+        return iter(self.zones)
+
+
+    def __len__(self):
+        return len(self.zones)
+
+
+    def items(self):
+        return self.zones.items()
+
+
+    def values(self):
+        return self.zones.values()
+
+
+    def tag(self, x, y):
+        """
+        Cette fonction renvoie l'identifiant de la zone qui contient chaque point (0 hors des zones), cf. tag_zones.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        zone = np.zeros(x.shape, dtype=self.ids.dtype)
+        known = np.isfinite(x) & np.isfinite(y)
+        if len(self.ids) < ZONE_TREE_MIN: # peu de zones : chaque polygone est teste sur tous les points
+            for zone_id, polygon in zip(self.ids, self.geometries):
+                zone[(zone == 0) & known & shapely.contains_xy(polygon, x, y)] = zone_id
+            return zone
+        x, y = x[known], y[known]
+        # couples (point, zone) dont l'emprise contient le point, puis test exact sur ces seuls couples
+        i_point, i_zone = self.tree.query(shapely.points(x, y))
+        inside = shapely.contains_xy(self.geometries[i_zone], x[i_point], y[i_point])
+        first = np.full(len(x), len(self.ids))
+        np.minimum.at(first, i_point[inside], i_zone[inside]) # premiere zone contenant chaque point
+        found = first < len(self.ids)
+        tagged = np.zeros(len(x), dtype=self.ids.dtype)
+        tagged[found] = self.ids[first[found]]
+        zone[known] = tagged
+        return zone
+
+
+def register_zones(name, source, id_field='id', layer=None):
+    """
+    Cette fonction permet d'ajouter (ou de remplacer) une version des zones d'etude.
+
+    Parametres
+    ----------
+    name : string
+        nom de la version, par ex : 'grille_50m'
+    source : string or dictionary
+        chemin vers un fichier QGIS (.shp ou .gpkg), ou polygones (sommets ou geometries shapely) par identifiant
+    id_field : string
+        champ donnant l'identifiant de chaque zone (fichier QGIS)
+    layer : string
+        nom de la couche (GeoPackage)
+
+    """
+    ZONE_FILES.pop(name, None)
+    ZONE_POLYGONS.pop(name, None)
+    _ZONE_SETS.pop(name, None)
+    if isinstance(source, str):
+        ZONE_FILES[name] = (source, id_field, layer)
+    else:
+        ZONE_POLYGONS[name] = source
+    return None
+
+
+def get_zones(name):
+    """
+    Cette fonction renvoie une version des zones d'etude (ZoneSet), lue et indexee une seule fois par processus.
+
+    Parametres
+    ----------
+    name : string
+        nom de la version : 'initiales', 'reduites', 'reduites_zone1bis', 'qgis' (QGIS_Shapefile/zones.shp),
+        ou version ajoutee par register_zones
+
+    Sortie
+    -------
+    zones : ZoneSet
+        polygones des zones, par identifiant (zones[1] : polygone de la zone 1)
+
+    """
+    if name not in _ZONE_SETS:
+        if name in ZONE_FILES:
+            filepath, id_field, layer = ZONE_FILES[name]
+            _ZONE_SETS[name] = ZoneSet(read_zones(filepath, id_field, layer))
+        else:
+            _ZONE_SETS[name] = ZoneSet(ZONE_POLYGONS[name])
+    return _ZONE_SETS[name]
+
+
+def tag_zones(x, y, zones):
+    """
+    Cette fonction permet de trouver la zone qui contient chaque point, pour tous les points en un seul calcul.
+    Un point contenu dans plusieurs zones recoit l'identifiant de la premiere.
+
+    Parametres
+    ----------
+    x, y : np.array of float
+        coordonnees des points (meme systeme que les zones, Lambert93)
+    zones : string, ZoneSet or dictionary
+        nom d'une version des zones (cf. get_zones), ZoneSet, ou polygones shapely par identifiant entier
+        (par ex : {1: Polygon(...), 2: Polygon(...)})
+
+    Sortie
+    -------
+    zone : np.array of int8
+        identifiant de la zone de chaque point, 0 hors des zones (ou si les coordonnees sont inconnues) ;
+        entier plus long si les identifiants depassent 127
+
+    """
+    if isinstance(zones, str):
+        zones = get_zones(zones)
+    elif not isinstance(zones, ZoneSet):
+        zones = ZoneSet(zones)
+    return zones.tag(x, y)
+
+
+def add_zone(data, zones, coords='ship'):
+    """
+    Cette fonction permet d'ajouter a la table des pings d'une ligne l'attribut 'Zone' (int8), cf. tag_zones.
+
+    Parametres
+    ----------
+    data : DataFrame
+        donnees des pings d'une ligne
+    zones : string, ZoneSet or dictionary
+        zones d'etude : nom d'une version (cf. get_zones), ZoneSet, ou polygones shapely par identifiant
+    coords : string
+        coordonnees utilisees : 'ship' (X, Y : position du navire) ou 'beam' (X_Beam, Y_Beam : centre de la tache insonifiee)
+
+    Sortie
+    -------
+    data : DataFrame
+        table fournie en entree avec l'attribut 'Zone' (int8, 0 hors des zones)
+
+    """
+    x, y = ZONE_COORDS[coords]
+    data['Zone'] = tag_zones(data[x].values, data[y].values, zones)
+    return data